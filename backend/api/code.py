@@ -1,33 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Optional, Sequence
+import functools
+import hashlib
+import logging
+import os
 import time
 
-from ..database import get_db
+from ..container import ServiceContainer
+from ..dependencies import (
+    get_db, get_container, get_llm_service, get_analyzer, get_explanation_cache, get_analysis_cache,
+    get_incremental_explainer, get_near_duplicate_index, get_semantic_index
+)
 from ..models import CodeExplanationRequest, CodeExplanationResponse
+from ..serialization import dumps
 from ..services.llm_service import LLMService
 from ..services.code_analyzer import CodeAnalyzer
+from ..services.explanation_cache import COMPLEXITY_LEVELS, ExplanationCache, snippet_hash
+from ..services.incremental import IncrementalExplainer
+from ..services.mock_templates import render_mock_explanation
+from ..services.near_duplicates import NearDuplicateIndex
+from ..services.response_cache import etag_matches
+from ..services.semantic_index import SemanticIndex
+from ..services.shared_cache import TieredCache
+from ..services.tag_index import set_tags
+from ..services.metrics import EXPLAIN_STAGE_SECONDS, CACHE_REQUESTS, DB_WRITE_SECONDS
+from ..services.tracing import tracer
 from ..database import CodeExplanation
 
+# Фоновая генерация остальных уровней сложности после первого ответа
+PRECOMPUTE_OTHER_LEVELS = os.getenv("PRECOMPUTE_OTHER_LEVELS", "false").lower() == "true"
+# Объяснение почти такого же фрагмента отдаётся сразу; при включённой опции точное
+# объяснение генерируется в фоне и попадает в кэш для следующих запросов
+NEAR_DUPLICATE_REFRESH = os.getenv("NEAR_DUPLICATE_REFRESH", "false").lower() == "true"
+# Время кэширования справочников (/languages, /complexity-levels) клиентами и прокси, секунды
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "86400"))
+
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/code", tags=["code"])
 
+@contextmanager
+def explain_stage(name: str, timings: Dict[str, float] = None):
+    """
+    Замеряет этап /code/explain: гистограмма для /metrics, отрезок трассы
+    и (если передан словарь timings) длительность в мс для журнала трафика
+    """
+    start = time.perf_counter()
+    try:
+        with tracer.span(f"explain.{name}"), EXPLAIN_STAGE_SECONDS.labels(name).time():
+            yield
+    finally:
+        if timings is not None:
+            timings[name] = (time.perf_counter() - start) * 1000
+
 @router.post("/explain", response_model=CodeExplanationResponse)
 async def explain_code(
     request: CodeExplanationRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    llm_service: LLMService = Depends(get_llm_service),
+    analyzer: CodeAnalyzer = Depends(get_analyzer),
+    explanation_cache: ExplanationCache = Depends(get_explanation_cache),
+    analysis_cache: TieredCache = Depends(get_analysis_cache),
+    near_duplicates: NearDuplicateIndex = Depends(get_near_duplicate_index),
+    incremental: IncrementalExplainer = Depends(get_incremental_explainer),
+    semantic_index: SemanticIndex = Depends(get_semantic_index),
+    container: ServiceContainer = Depends(get_container)
 ):
     """
     Объяснение фрагмента кода с помощью анализа LLM
     """
     start_time = time.time()
+    container.explain_in_flight += 1
+    # Данные для журнала трафика
+    timings: Dict[str, float] = {}
+    detected_language = None
+    outcome = new_outcome()
+    status_code = 500
     
     try:
-        # Определяем или проверяем язык, если он указан
-        detected_language = CodeAnalyzer.detect_language(request.code_snippet, request.language)
-        
-        # Валидируем код
-        validation_info = CodeAnalyzer.validate_code(request.code_snippet, detected_language)
+        analysis = cached_analysis(analyzer, analysis_cache, request.code_snippet, request.language, timings)
+        detected_language = analysis["language"]
+        validation_info = analysis["validation"]
         
         if not validation_info["is_valid"]:
             raise HTTPException(
@@ -35,40 +92,49 @@ async def explain_code(
                 detail=f"Invalid code snippet: {', '.join(validation_info['errors'])}"
             )
         
-        # Получаем краткое описание кода ДО вызова LLM (для более точного объяснения)
-        code_summary = CodeAnalyzer.extract_code_summary(request.code_snippet, detected_language)
-        
-        # Инициализируем сервис LLM
-        llm_service = LLMService()
+        code_summary = analysis["summary"]
         
-        # Генерируем объяснение (передаём результаты анализа кода)
-        llm_result = llm_service.explain_code(
-            request.code_snippet,
+        resolve = functools.partial(
+            resolve_explanation,
+            request,
             detected_language,
-            request.complexity_level,
-            code_summary=code_summary,
-            validation_info=validation_info
+            code_summary,
+            validation_info,
+            db,
+            llm_service,
+            explanation_cache,
+            near_duplicates,
+            incremental,
+            background_tasks.add_task,
+            outcome,
+            timings
         )
-        
-        if not llm_result["success"]:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to generate explanation. Please try again."
-            )
+        if llm_service.use_mock:
+            resolve()
+        else:
+            # Вызов LLM блокирующий: в потоке он ждёт места в справедливой очереди, не задерживая
+            # остальные запросы воркера (контекст с клиентом и трассой копируется в поток)
+            await run_in_threadpool(resolve)
+        explanation = outcome["explanation"]
         
         # Вычисляем время обработки
         processing_time = time.time() - start_time
         
         # Формируем ответ
-        response = CodeExplanationResponse(
-            success=True,
-            explanation=llm_result["explanation"],
-            language=detected_language,
-            complexity_level=llm_result["complexity_level"],
-            code_summary=code_summary,
-            validation_info=validation_info,
-            processing_time=round(processing_time, 2)
-        )
+        with explain_stage("response", timings):
+            response = CodeExplanationResponse(
+                success=True,
+                explanation=explanation,
+                language=detected_language,
+                complexity_level=request.complexity_level,
+                code_summary=code_summary,
+                validation_info=validation_info,
+                processing_time=round(processing_time, 2),
+                explanations=outcome["explanations"],
+                cached=outcome["cached"],
+                near_duplicate=outcome["near_duplicate"],
+                incremental=outcome["incremental"]
+            )
         
         # Асинхронно сохраняем объяснение в базе данных
         background_tasks.add_task(
@@ -76,98 +142,463 @@ async def explain_code(
             db,
             request.code_snippet,
             detected_language,
-            llm_result["explanation"],
-            request.complexity_level
+            explanation,
+            request.complexity_level,
+            near_duplicates if outcome["index_explanation"] and near_duplicates.enabled else None,
+            semantic_index,
+            analyzer.suggest_tags(code_summary)
         )
         
+        status_code = 200
         return response
         
-    except HTTPException:
+    except HTTPException as e:
+        status_code = e.status_code
         raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"An error occurred while processing your request: {str(e)}"
         )
+    finally:
+        container.explain_in_flight -= 1
+        duration = time.time() - start_time
+        EXPLAIN_STAGE_SECONDS.labels("total").observe(duration)
+        if container.traffic_recorder.enabled:
+            container.traffic_recorder.record(
+                request.model_dump(),
+                detected_language,
+                status_code,
+                start_time,
+                duration * 1000,
+                timings,
+                outcome_cache_result(outcome)
+            )
 
-@router.get("/languages")
-async def get_supported_languages() -> Dict[str, Any]:
+def new_outcome() -> Dict[str, Any]:
+    return {
+        "explanation": None,
+        "explanations": None,
+        # None — до кэша дело не дошло (ошибка анализа или валидации)
+        "cached": None,
+        "near_duplicate": None,
+        # Объяснение собрано из предыдущей версии фрагмента и объяснений изменённых блоков
+        "incremental": None,
+        # Новое объяснение (не из кэша) добавляется в индекс почти одинаковых фрагментов
+        "index_explanation": False,
+        # LLM недоступен, объяснение — резервное мок-объяснение
+        "fallback": False
+    }
+
+def outcome_cache_result(outcome: Dict[str, Any]) -> Optional[str]:
     """
-    Возвращает список поддерживаемых языков программирования
+    Результат обращения к кэшу для журнала трафика
+    """
+    if outcome["near_duplicate"]:
+        return "near_duplicate"
+    if outcome["incremental"]:
+        return "incremental"
+    if outcome["cached"] is None:
+        return None
+    return "hit" if outcome["cached"] else "miss"
+
+def resolve_explanation(
+    request: CodeExplanationRequest,
+    detected_language: str,
+    code_summary: Dict[str, Any],
+    validation_info: Dict[str, Any],
+    db: Session,
+    llm_service: LLMService,
+    explanation_cache: ExplanationCache,
+    near_duplicates: NearDuplicateIndex,
+    incremental: IncrementalExplainer,
+    schedule: Callable[..., Any],
+    outcome: Dict[str, Any],
+    timings: Dict[str, float]
+):
     """
-    languages = [
-        {"name": "Python", "value": "python", "icon": "🐍"},
-        {"name": "JavaScript", "value": "javascript", "icon": "🟨"},
-        {"name": "Java", "value": "java", "icon": "☕"},
-        {"name": "C++", "value": "cpp", "icon": "⚡"},
-        {"name": "C#", "value": "csharp", "icon": "🔷"},
-        {"name": "PHP", "value": "php", "icon": "🐘"},
-        {"name": "Ruby", "value": "ruby", "icon": "💎"},
-        {"name": "Go", "value": "go", "icon": "🐹"},
-        {"name": "Rust", "value": "rust", "icon": "🦀"},
-        {"name": "TypeScript", "value": "typescript", "icon": "🔷"},
-        {"name": "HTML", "value": "html", "icon": "🌐"},
-        {"name": "CSS", "value": "css", "icon": "🎨"},
-        {"name": "SQL", "value": "sql", "icon": "🗄️"},
-        {"name": "Bash", "value": "bash", "icon": "🐚"}
-    ]
+    Находит объяснение в кэше, собирает его из объяснения предыдущей версии фрагмента
+    (request.previous_snippet_hash), берёт у почти такого же фрагмента либо генерирует в LLM.
+    Заполняет outcome по ходу работы (при исключении в нём остаётся то, что успели узнать);
+    schedule(func, *args) ставит фоновую работу (BackgroundTasks.add_task для HTTP-запроса).
+    """
+    if request.all_levels:
+        # Все уровни за один вызов LLM; если кэш уже содержит все уровни, LLM не нужен
+        with explain_stage("cache_lookup", timings):
+            explanations = explanation_cache.get_levels(request.code_snippet, detected_language)
+        outcome["cached"] = len(explanations) == len(COMPLEXITY_LEVELS)
+        CACHE_REQUESTS.labels("explanation", "hit" if outcome["cached"] else "miss").inc()
+        if not outcome["cached"]:
+            explanations = incremental_explanations(
+                request, detected_language, COMPLEXITY_LEVELS, llm_service, explanation_cache, incremental,
+                outcome, timings
+            )
+        if explanations is None:
+            with explain_stage("llm", timings):
+                llm_result = llm_service.explain_code_all_levels(
+                    request.code_snippet,
+                    detected_language,
+                    code_summary=code_summary,
+                    validation_info=validation_info
+                )
+            explanations = llm_result["explanations"]
+            incremental.remember(
+                request.code_snippet,
+                detected_language,
+                cache_explanations(explanation_cache, request.code_snippet, detected_language, llm_result)
+            )
+            outcome["fallback"] = request.complexity_level in llm_result.get("fallback_levels", [])
+            outcome["index_explanation"] = not outcome["fallback"]
+        outcome["explanations"] = explanations
+        outcome["explanation"] = explanations[request.complexity_level]
+        return
     
-    return {
-        "success": True,
-        "languages": languages,
-        "total_count": len(languages)
+    with explain_stage("cache_lookup", timings):
+        explanation = explanation_cache.get(request.code_snippet, detected_language, request.complexity_level)
+    outcome["cached"] = explanation is not None
+    CACHE_REQUESTS.labels("explanation", "hit" if outcome["cached"] else "miss").inc()
+    if not outcome["cached"]:
+        spliced = incremental_explanations(
+            request, detected_language, (request.complexity_level,), llm_service, explanation_cache, incremental,
+            outcome, timings
+        )
+        if spliced is not None:
+            explanation = spliced[request.complexity_level]
+    near_duplicate = None
+    if explanation is None and near_duplicates.enabled and request.allow_near_duplicate:
+        with explain_stage("near_duplicate", timings):
+            fingerprint = near_duplicates.fingerprint(request.code_snippet, detected_language)
+            if fingerprint is not None:
+                near_duplicate = near_duplicates.find(db, fingerprint, detected_language, request.complexity_level)
+        CACHE_REQUESTS.labels("near_duplicate", "hit" if near_duplicate else "miss").inc()
+    if near_duplicate is not None:
+        explanation = near_duplicate.pop("explanation")
+        outcome["near_duplicate"] = near_duplicate
+        if NEAR_DUPLICATE_REFRESH:
+            schedule(
+                refresh_explanation,
+                llm_service,
+                explanation_cache,
+                request.code_snippet,
+                detected_language,
+                request.complexity_level,
+                code_summary,
+                validation_info
+            )
+    elif explanation is None:
+        # Генерируем объяснение (передаём результаты анализа кода)
+        with explain_stage("llm", timings):
+            llm_result = llm_service.explain_code(
+                request.code_snippet,
+                detected_language,
+                request.complexity_level,
+                code_summary=code_summary,
+                validation_info=validation_info
+            )
+        
+        if not llm_result["success"]:
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to generate explanation. Please try again."
+            )
+        
+        explanation = llm_result["explanation"]
+        outcome["fallback"] = bool(llm_result.get("mock")) and not llm_service.use_mock
+        if not outcome["fallback"]:
+            explanation_cache.set(request.code_snippet, detected_language, request.complexity_level, explanation)
+            incremental.remember(request.code_snippet, detected_language, {request.complexity_level: explanation})
+            outcome["index_explanation"] = True
+    outcome["explanation"] = explanation
+    
+    # Спекулятивно готовим остальные уровни, чтобы переключение было мгновенным
+    if PRECOMPUTE_OTHER_LEVELS:
+        schedule(
+            precompute_other_levels,
+            llm_service,
+            explanation_cache,
+            request.code_snippet,
+            detected_language,
+            code_summary,
+            validation_info
+        )
+
+def incremental_explanations(
+    request: CodeExplanationRequest,
+    detected_language: str,
+    levels: Sequence[str],
+    llm_service: LLMService,
+    explanation_cache: ExplanationCache,
+    incremental: IncrementalExplainer,
+    outcome: Dict[str, Any],
+    timings: Dict[str, float]
+) -> Optional[Dict[str, str]]:
+    """
+    Объяснения уровней levels, собранные из предыдущей версии фрагмента, или None,
+    если предыдущая версия не указана, неизвестна или изменилась слишком сильно
+    """
+    previous_hash = request.previous_snippet_hash
+    if not incremental.enabled or previous_hash is None or previous_hash == snippet_hash(request.code_snippet):
+        return None
+    with explain_stage("incremental", timings):
+        result = incremental.explain(previous_hash, request.code_snippet, detected_language, levels, llm_service)
+    CACHE_REQUESTS.labels("incremental", "hit" if result else "miss").inc()
+    if result is None:
+        return None
+    outcome["incremental"] = result["info"]
+    explanation_cache.set_levels(request.code_snippet, detected_language, result["explanations"])
+    return result["explanations"]
+
+def _static_json(payload: Dict[str, Any]):
+    """
+    Сериализует неизменяемый ответ один раз при импорте и вычисляет для него ETag
+    """
+    body = dumps(payload)
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _static_response(request: Request, body: bytes, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={CATALOG_MAX_AGE}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+LANGUAGES = [
+    {"name": "Python", "value": "python", "icon": "🐍"},
+    {"name": "JavaScript", "value": "javascript", "icon": "🟨"},
+    {"name": "Java", "value": "java", "icon": "☕"},
+    {"name": "C++", "value": "cpp", "icon": "⚡"},
+    {"name": "C#", "value": "csharp", "icon": "🔷"},
+    {"name": "PHP", "value": "php", "icon": "🐘"},
+    {"name": "Ruby", "value": "ruby", "icon": "💎"},
+    {"name": "Go", "value": "go", "icon": "🐹"},
+    {"name": "Rust", "value": "rust", "icon": "🦀"},
+    {"name": "TypeScript", "value": "typescript", "icon": "🔷"},
+    {"name": "HTML", "value": "html", "icon": "🌐"},
+    {"name": "CSS", "value": "css", "icon": "🎨"},
+    {"name": "SQL", "value": "sql", "icon": "🗄️"},
+    {"name": "Bash", "value": "bash", "icon": "🐚"}
+]
+
+COMPLEXITY_LEVEL_CATALOG = [
+    {
+        "name": "Beginner",
+        "value": "beginner",
+        "description": "Simple explanations suitable for new programmers",
+        "icon": "🌱"
+    },
+    {
+        "name": "Intermediate",
+        "value": "intermediate",
+        "description": "Detailed explanations with best practices",
+        "icon": "🎯"
+    },
+    {
+        "name": "Advanced",
+        "value": "advanced",
+        "description": "Deep technical analysis with optimization tips",
+        "icon": "🚀"
     }
+]
+
+LANGUAGES_BODY, LANGUAGES_ETAG = _static_json({
+    "success": True,
+    "languages": LANGUAGES,
+    "total_count": len(LANGUAGES)
+})
+
+COMPLEXITY_LEVELS_BODY, COMPLEXITY_LEVELS_ETAG = _static_json({
+    "success": True,
+    "complexity_levels": COMPLEXITY_LEVEL_CATALOG
+})
+
+@router.get("/languages")
+async def get_supported_languages(request: Request) -> Response:
+    """
+    Возвращает список поддерживаемых языков программирования
+    """
+    return _static_response(request, LANGUAGES_BODY, LANGUAGES_ETAG)
 
 @router.get("/complexity-levels")
-async def get_complexity_levels() -> Dict[str, Any]:
+async def get_complexity_levels(request: Request) -> Response:
     """
     Возвращает доступные уровни сложности объяснений
     """
-    levels = [
-        {
-            "name": "Beginner",
-            "value": "beginner",
-            "description": "Simple explanations suitable for new programmers",
-            "icon": "🌱"
-        },
-        {
-            "name": "Intermediate", 
-            "value": "intermediate",
-            "description": "Detailed explanations with best practices",
-            "icon": "🎯"
-        },
-        {
-            "name": "Advanced",
-            "value": "advanced", 
-            "description": "Deep technical analysis with optimization tips",
-            "icon": "🚀"
-        }
-    ]
+    return _static_response(request, COMPLEXITY_LEVELS_BODY, COMPLEXITY_LEVELS_ETAG)
+
+def analysis_cache_key(code_snippet: str, language: Optional[str]) -> str:
+    """
+    Ключ кэша анализа; общий для /code/explain и живого анализа (/code/live)
+    """
+    return f"{snippet_hash(code_snippet)}:{language or ''}"
+
+def cached_analysis(analyzer: CodeAnalyzer, analysis_cache: TieredCache, code_snippet: str,
+                    language: Optional[str], timings: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Результаты анализа зависят только от кода и указанного языка,
+    поэтому для уже встречавшегося фрагмента берутся из кэша
+    """
+    analysis_key = analysis_cache_key(code_snippet, language)
+    with explain_stage("analysis_cache", timings):
+        analysis = analysis_cache.get(analysis_key)
+    CACHE_REQUESTS.labels("analysis", "hit" if analysis else "miss").inc()
+    if analysis is None:
+        analysis = analyze_snippet(analyzer, code_snippet, language, timings)
+        analysis_cache.set(analysis_key, analysis)
+    return analysis
+
+def warm_cached_explanation(analyzer: CodeAnalyzer, analysis_cache: TieredCache, explanation_cache: ExplanationCache,
+                            llm_service: LLMService, entry: Dict[str, Any]) -> bool:
+    """
+    Прогрев после запуска (services/cache_warmup.py): кладёт в кэши объяснение фрагмента
+    из истории и результаты его анализа — под ключом запроса с языком и, если язык
+    определяется так же, без него. Некорректный код и резервные мок-объяснения,
+    сохранённые, пока LLM был недоступен, пропускаются. Метрики этапов не пишутся.
+    """
+    code_snippet, level = entry["code_snippet"], entry["complexity_level"]
+    language = analyzer.detect_language(code_snippet, entry["language"])
+    validation_info = analyzer.validate_code(code_snippet, language)
+    if not validation_info["is_valid"]:
+        return False
+    code_summary = analyzer.extract_code_summary(code_snippet, language)
+    if not llm_service.use_mock and entry["explanation"] == render_mock_explanation(
+        code_snippet, language, level, code_summary
+    ):
+        return False
+    analysis = {"language": language, "validation": validation_info, "summary": code_summary}
+    keys = [analysis_cache_key(code_snippet, language)]
+    if analyzer.detect_language(code_snippet) == language:
+        keys.append(analysis_cache_key(code_snippet, None))
+    analysis_cache.set_many({key: analysis for key in keys})
+    # get_levels поднимает в память уже записанное в общий кэш другим воркером
+    if level not in explanation_cache.get_levels(code_snippet, language):
+        explanation_cache.set(code_snippet, language, level, entry["explanation"])
+    return True
+
+def analyze_snippet(analyzer: CodeAnalyzer, code_snippet: str, language: str, timings: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Определяет язык, валидирует код и (для корректного кода) строит краткое описание
+    """
+    # Определяем или проверяем язык, если он указан
+    with explain_stage("detect", timings):
+        detected_language = analyzer.detect_language(code_snippet, language)
     
-    return {
-        "success": True,
-        "complexity_levels": levels
+    # Валидируем код
+    with explain_stage("validate", timings):
+        validation_info = analyzer.validate_code(code_snippet, detected_language)
+    
+    # Получаем краткое описание кода ДО вызова LLM (для более точного объяснения)
+    code_summary = None
+    if validation_info["is_valid"]:
+        with explain_stage("summary", timings):
+            code_summary = analyzer.extract_code_summary(code_snippet, detected_language)
+    
+    return {"language": detected_language, "validation": validation_info, "summary": code_summary}
+
+def cache_explanations(explanation_cache: ExplanationCache, code_snippet: str, language: str,
+                       llm_result: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Кладёт в кэш уровни, полученные от LLM (резервные мок-объяснения не кэшируются),
+    и возвращает их
+    """
+    explanations = {
+        level: text for level, text in llm_result["explanations"].items()
+        if level not in llm_result.get("fallback_levels", [])
     }
+    explanation_cache.set_levels(code_snippet, language, explanations)
+    return explanations
+
+def precompute_other_levels(
+    llm_service: LLMService,
+    explanation_cache: ExplanationCache,
+    code_snippet: str,
+    language: str,
+    code_summary: Dict[str, Any],
+    validation_info: Dict[str, Any]
+):
+    """
+    Заполняет кэш объяснениями остальных уровней сложности одним вызовом LLM
+    """
+    if len(explanation_cache.get_levels(code_snippet, language)) == len(COMPLEXITY_LEVELS):
+        return
+    try:
+        llm_result = llm_service.explain_code_all_levels(
+            code_snippet,
+            language,
+            code_summary=code_summary,
+            validation_info=validation_info
+        )
+        cache_explanations(explanation_cache, code_snippet, language, llm_result)
+    except Exception as e:
+        logger.warning("Error precomputing explanation levels: %s", e)
+
+def refresh_explanation(
+    llm_service: LLMService,
+    explanation_cache: ExplanationCache,
+    code_snippet: str,
+    language: str,
+    complexity_level: str,
+    code_summary: Dict[str, Any],
+    validation_info: Dict[str, Any]
+):
+    """
+    Генерирует точное объяснение фрагмента, на который был дан ответ почти таким же
+    """
+    try:
+        llm_result = llm_service.explain_code(
+            code_snippet,
+            language,
+            complexity_level,
+            code_summary=code_summary,
+            validation_info=validation_info
+        )
+        if llm_result["success"] and (not llm_result.get("mock") or llm_service.use_mock):
+            explanation_cache.set(code_snippet, language, complexity_level, llm_result["explanation"])
+    except Exception as e:
+        logger.warning("Error refreshing near-duplicate explanation: %s", e)
 
 def save_explanation_to_db(
     db: Session,
     code_snippet: str,
     language: str,
     explanation: str,
-    complexity_level: str
-):
+    complexity_level: str,
+    near_duplicates: Optional[NearDuplicateIndex] = None,
+    semantic_index: Optional[SemanticIndex] = None,
+    tags: Sequence[str] = ()
+) -> Optional[int]:
     """
-    Сохраняет объяснение в базе данных
+    Сохраняет объяснение с тегами в базе данных (и при необходимости в индексе почти одинаковых
+    фрагментов и векторном индексе поиска по смыслу). Возвращает id записи или None при ошибке.
     """
     try:
-        db_explanation = CodeExplanation(
-            code_snippet=code_snippet,
-            language=language,
-            explanation=explanation,
-            complexity_level=complexity_level
-        )
-        db.add(db_explanation)
-        db.commit()
+        with tracer.span("db.save_explanation"), DB_WRITE_SECONDS.time():
+            db_explanation = CodeExplanation(
+                code_snippet=code_snippet,
+                language=language,
+                explanation=explanation,
+                complexity_level=complexity_level
+            )
+            db.add(db_explanation)
+            db.flush()
+            explanation_id = db_explanation.id
+            set_tags(db, explanation_id, tags)
+            db.commit()
     except Exception as e:
-        print(f"Error saving to database: {e}")
-        db.rollback()
\ No newline at end of file
+        logger.error("Error saving to database: %s", e)
+        db.rollback()
+        return None
+    if near_duplicates is not None:
+        try:
+            with tracer.span("db.index_near_duplicate"):
+                fingerprint = near_duplicates.fingerprint(code_snippet, language)
+                if fingerprint is not None:
+                    near_duplicates.add(db, explanation_id, fingerprint, language, complexity_level)
+        except Exception as e:
+            logger.warning("Error indexing near-duplicate fingerprint: %s", e)
+    if semantic_index is not None:
+        try:
+            semantic_index.note_write(db)
+        except Exception as e:
+            logger.warning("Error updating semantic index: %s", e)
+    return explanation_id
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from typing import Optional
+import asyncio
+import time
+
+from ..dependencies import require_admin_token
+from ..services.profiler import ProfilerBusyError, request_profiles, sampling_profiler
+from ..services.tracing import tracer
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+# Профилирование: подключается отдельно (ENABLE_PROFILING) и только с токеном администратора
+profiling_router = APIRouter(prefix="/debug/profile", tags=["debug"], dependencies=[Depends(require_admin_token)])
+
+@router.get("/traces")
+async def get_recent_traces(
+    limit: int = Query(50, ge=1, le=1000, description="Максимальное количество трасс"),
+    trace_id: Optional[str] = Query(None, description="Идентификатор конкретной трассы"),
+    min_duration_ms: float = Query(0, ge=0, description="Минимальная длительность трассы, мс")
+):
+    """
+    Последние экспортированные трассы из кольцевого буфера
+    """
+    traces = tracer.exporter.recent(tracer.exporter.buffer.maxlen)
+    if trace_id:
+        traces = [t for t in traces if t["trace_id"] == trace_id.lower()]
+    if min_duration_ms:
+        traces = [t for t in traces if (t["duration_ms"] or 0) >= min_duration_ms]
+    return {
+        "success": True,
+        "sample_rate": tracer.sample_rate,
+        "traces": traces[:limit]
+    }
+
+@profiling_router.get("", response_class=PlainTextResponse)
+async def sample_profile(
+    seconds: float = Query(10, gt=0, le=60, description="Длительность профилирования, секунд"),
+    interval_ms: float = Query(5, ge=1, le=100, description="Интервал между снимками стеков, мс"),
+    include_idle: bool = Query(False, description="Учитывать потоки в ожидании")
+):
+    """
+    Сэмплирующее профилирование воркера; результат в формате collapsed stacks для flamegraph
+    """
+    try:
+        collapsed = await asyncio.to_thread(sampling_profiler.profile, seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    filename = f"profile-{int(time.time())}.collapsed"
+    return PlainTextResponse(collapsed, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@profiling_router.get("/requests/{profile_id}")
+async def get_request_profile(
+    profile_id: str,
+    format: str = Query("text", pattern="^(text|pstats)$", description="text — отчёт pstats, pstats — бинарный файл"),
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|ncalls)$", description="Порядок сортировки отчёта"),
+    limit: int = Query(50, ge=1, le=1000, description="Количество строк отчёта")
+):
+    """
+    Статистика cProfile для запроса, выполненного с заголовком X-Profile
+    """
+    stats = request_profiles.get(profile_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "pstats":
+        return Response(
+            request_profiles.render_pstats(stats),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'}
+        )
+    return PlainTextResponse(request_profiles.render_text(stats, sort, limit))
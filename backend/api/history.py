@@ -1,94 +1,315 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from typing import Optional, List
+from sqlalchemy import or_, and_, func, select, type_coerce, String
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Optional, List, Sequence
+import heapq
+import time
 
-from ..database import get_db, CodeExplanation
-from ..models import HistoryResponse, HistoryFilter, FavoriteRequest
+from ..database import CodeExplanation, get_table_version
+from ..dependencies import get_explanation_db, get_history_responses, get_semantic_indexes, get_shard_sessions
+from ..models import HistoryResponse, HistoryFilter, FavoriteRequest, SemanticSearchResponse, TagsRequest
+from ..serialization import dumps
+from ..services.history_shards import HistoryShards
+from ..services.metrics import HISTORY_QUERY_SECONDS
+from ..services.response_cache import VersionedResponseCache
+from ..services.semantic_index import SemanticIndex
+from ..services.tag_index import explanation_tags, merge_facets, normalize_tag, set_tags, tag_facets, tag_filter
 
-router = APIRouter(prefix="/history", tags=["history"])
+async def track_query_duration(request: Request):
+    """
+    Замеряет длительность каждого запроса к истории для /metrics
+    """
+    start = time.perf_counter()
+    yield
+    route = request.scope.get("route")
+    endpoint = f"{request.method} {route.path if route else request.url.path}"
+    HISTORY_QUERY_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+
+router = APIRouter(prefix="/history", tags=["history"], dependencies=[Depends(track_query_duration)])
+
+# Столбцы элемента истории (HistoryItem). Ответы истории собираются из кортежей строк
+# сразу в JSON, без объектов ORM и проверки моделями Pydantic (модели описывают схему
+# ответа в OpenAPI); created_at читается строкой SQLite, без разбора в datetime
+ITEM_COLUMNS = (
+    CodeExplanation.id,
+    CodeExplanation.code_snippet,
+    CodeExplanation.language,
+    CodeExplanation.explanation,
+    CodeExplanation.complexity_level,
+    type_coerce(CodeExplanation.created_at, String),
+    CodeExplanation.is_favorite
+)
+
+def iso_timestamp(value: Optional[str]) -> Optional[str]:
+    """
+    Время SQLite «ГГГГ-ММ-ДД ЧЧ:ММ:СС[.ffffff]» в формате datetime.isoformat()
+    (как в прежних ответах: нулевые микросекунды не выводятся)
+    """
+    if value is None:
+        return None
+    if value.endswith(".000000"):
+        value = value[:-7]
+    return value.replace(" ", "T", 1)
+
+def explanation_items(db: Session, rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """
+    Элементы истории из строк ITEM_COLUMNS одного шарда; теги всех строк — одним запросом
+    """
+    rows = list(rows)
+    tags = explanation_tags(db, [row[0] for row in rows])
+    return [
+        {
+            "id": explanation_id,
+            "code_snippet": code_snippet,
+            "language": language,
+            "explanation": explanation,
+            "complexity_level": complexity_level,
+            "created_at": iso_timestamp(created_at),
+            "is_favorite": is_favorite,
+            "tags": tags.get(explanation_id, [])
+        }
+        for explanation_id, code_snippet, language, explanation, complexity_level, created_at, is_favorite in rows
+    ]
+
+def explanation_items_by_id(db: Session, ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+    return {
+        item["id"]: item
+        for item in explanation_items(db, db.execute(select(*ITEM_COLUMNS).where(CodeExplanation.id.in_(ids))))
+    }
+
+def explanation_item(db: Session, explanation_id: int) -> Dict[str, Any]:
+    """
+    Элемент истории по id; 404, если объяснения нет
+    """
+    item = explanation_items_by_id(db, [explanation_id]).get(explanation_id)
+    if item is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Explanation with ID {explanation_id} not found"
+        )
+    return item
+
+def conditional_response(request: Request, version: int, cache: VersionedResponseCache,
+                         build: Callable[[], bytes]) -> Response:
+    """
+    Ответ с ETag по версии таблицы (одного шарда или суммы шардов): 304 при совпадении
+    If-None-Match без запроса к данным, иначе сериализованное тело из кэша или от build()
+    """
+    # Версия читается до данных: тело может оказаться новее версии, но не старее,
+    # поэтому устаревший ответ не получит актуальный ETag
+    key = request.url.path + "?" + "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    etag, body = cache.resolve(key, version, request.headers.get("if-none-match"), build)
+    # no-cache: браузер хранит ответ, но перед каждым использованием переспрашивает сервер
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.get("/explanations", response_model=HistoryResponse)
 async def get_explanations(
+    request: Request,
     language: Optional[str] = Query(None, description="Фильтр по языку программирования"),
     complexity_level: Optional[str] = Query(None, description="Фильтр по уровню сложности"),
     is_favorite: Optional[bool] = Query(None, description="Фильтр по признаку избранного"),
-    search_term: Optional[str] = Query(None, description="Поиск по коду или объяснению"),
+    search_term: Optional[str] = Query(None, description="Поиск по коду, объяснению или точному имени тега"),
+    tag: Optional[List[str]] = Query(None, description="Фильтр по тегам (можно несколько: объяснение должно иметь все)"),
+    facets: bool = Query(False, description="Добавить в ответ счётчики тегов отфильтрованных объяснений"),
     page: int = Query(1, ge=1, description="Номер страницы"),
     per_page: int = Query(10, ge=1, le=100, description="Количество элементов на странице"),
-    db: Session = Depends(get_db)
+    sessions: List[Session] = Depends(get_shard_sessions),
+    responses: VersionedResponseCache = Depends(get_history_responses)
 ):
     """
     Получить постраничный список объяснений кода с фильтрацией
     """
     try:
-        # Формируем запрос
-        query = db.query(CodeExplanation)
-        
-        # Применяем фильтры
-        if language:
-            query = query.filter(CodeExplanation.language == language.lower())
-        
-        if complexity_level:
-            query = query.filter(CodeExplanation.complexity_level == complexity_level.lower())
+        return conditional_response(request, HistoryShards.version(sessions), responses, lambda: query_explanations(
+            sessions, language, complexity_level, is_favorite, search_term, page, per_page, tag, facets
+        ))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving explanations: {str(e)}"
+        )
+
+def filter_explanations(db: Session, language: Optional[str], complexity_level: Optional[str],
+                        is_favorite: Optional[bool], search_term: Optional[str], tags: Optional[List[str]]):
+    """
+    Запрос объяснений одного шарда с фильтрами истории
+    """
+    # Формируем запрос
+    query = db.query(CodeExplanation)
+    
+    # Применяем фильтры
+    if language:
+        query = query.filter(CodeExplanation.language == language.lower())
+    
+    if complexity_level:
+        query = query.filter(CodeExplanation.complexity_level == complexity_level.lower())
+    
+    if is_favorite is not None:
+        query = query.filter(CodeExplanation.is_favorite == is_favorite)
+    
+    for name in tags or []:
+        query = query.filter(tag_filter(CodeExplanation.id, normalize_tag(name) or ""))
+    
+    if search_term:
+        search_filter = or_(
+            CodeExplanation.code_snippet.contains(search_term),
+            CodeExplanation.explanation.contains(search_term),
+            tag_filter(CodeExplanation.id, normalize_tag(search_term) or "")
+        )
+        query = query.filter(search_filter)
+    
+    return query
+
+def query_explanations(sessions: Sequence[Session], language: Optional[str], complexity_level: Optional[str],
+                       is_favorite: Optional[bool], search_term: Optional[str], page: int, per_page: int,
+                       tags: Optional[List[str]] = None, facets: bool = False) -> bytes:
+    """
+    Выполняет запрос страницы истории по всем шардам (и при facets — счётчиков тегов)
+    и сериализует ответ
+    """
+    filtered = bool(language or complexity_level or is_favorite is not None or search_term or tags)
+    offset = (page - 1) * per_page
+    total_count = 0
+    shard_keys, shard_facets = [], []
+    for shard, db in enumerate(sessions):
+        query = filter_explanations(db, language, complexity_level, is_favorite, search_term, tags)
         
-        if is_favorite is not None:
-            query = query.filter(CodeExplanation.is_favorite == is_favorite)
+        # Получаем общее количество записей
+        total_count += query.count()
         
-        if search_term:
-            search_filter = or_(
-                CodeExplanation.code_snippet.contains(search_term),
-                CodeExplanation.explanation.contains(search_term),
-                CodeExplanation.tags.contains(search_term)
+        ordered = query.order_by(CodeExplanation.created_at.desc(), CodeExplanation.id.desc())
+        if len(sessions) == 1:
+            # Один шард: пагинация в базе
+            explanations = explanation_items(db, ordered.with_entities(*ITEM_COLUMNS).offset(offset).limit(per_page))
+        else:
+            # Несколько шардов: ключи сортировки первых offset + per_page записей каждого шарда
+            shard_keys.append([
+                (created_at or datetime.min, explanation_id, shard)
+                for created_at, explanation_id in ordered.with_entities(
+                    CodeExplanation.created_at, CodeExplanation.id
+                ).limit(offset + per_page)
+            ])
+        if facets:
+            shard_facets.append(tag_facets(
+                db, query.with_entities(CodeExplanation.id) if filtered else None,
+                limit=20 if len(sessions) == 1 else None
+            ))
+    
+    if len(sessions) > 1:
+        # Слияние по дате создания, затем чтение строк страницы из их шардов
+        page_keys = list(islice(heapq.merge(*shard_keys, reverse=True), offset, offset + per_page))
+        items = {}
+        for shard, db in enumerate(sessions):
+            ids = [explanation_id for _, explanation_id, key_shard in page_keys if key_shard == shard]
+            if ids:
+                items.update(explanation_items_by_id(db, ids))
+        explanations = [items[explanation_id] for _, explanation_id, _ in page_keys if explanation_id in items]
+    
+    # Рассчитываем параметры пагинации
+    total_pages = (total_count + per_page - 1) // per_page
+    
+    # Поля в порядке HistoryResponse
+    return dumps({
+        "success": True,
+        "explanations": explanations,
+        "total_count": total_count,
+        "page": page,
+        "per_page": per_page,
+        "total_pages": total_pages,
+        "tag_facets": merge_facets(shard_facets) if facets else None
+    })
+
+@router.get("/tags")
+async def get_tags(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000, description="Количество тегов"),
+    sessions: List[Session] = Depends(get_shard_sessions),
+    responses: VersionedResponseCache = Depends(get_history_responses)
+):
+    """
+    Теги истории с числом объяснений, от самых частых
+    """
+    try:
+        return conditional_response(request, HistoryShards.version(sessions), responses, lambda: dumps({
+            "success": True,
+            "tags": merge_facets(
+                [tag_facets(db, limit=limit if len(sessions) == 1 else None) for db in sessions], limit
             )
-            query = query.filter(search_filter)
-        
-        # Получаем общее количество записей
-        total_count = query.count()
-        
-        # Применяем пагинацию
-        offset = (page - 1) * per_page
-        explanations = query.order_by(CodeExplanation.created_at.desc()).offset(offset).limit(per_page).all()
-        
-        # Рассчитываем параметры пагинации
-        total_pages = (total_count + per_page - 1) // per_page
-        
-        return HistoryResponse(
-            success=True,
-            explanations=explanations,
-            total_count=total_count,
-            page=page,
-            per_page=per_page,
-            total_pages=total_pages
+        }))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving tags: {str(e)}"
         )
-        
+
+@router.get("/semantic-search", response_model=SemanticSearchResponse)
+async def semantic_search(
+    q: str = Query(..., min_length=1, max_length=1000, description="Запрос на естественном языке"),
+    language: Optional[str] = Query(None, description="Фильтр по языку программирования"),
+    complexity_level: Optional[str] = Query(None, description="Фильтр по уровню сложности"),
+    limit: int = Query(10, ge=1, le=50, description="Количество результатов"),
+    sessions: List[Session] = Depends(get_shard_sessions),
+    indexes: List[SemanticIndex] = Depends(get_semantic_indexes)
+):
+    """
+    Поиск объяснений по смыслу: ближайшие к запросу по локальным векторам кода и объяснения.
+    Ответ не кэшируется по версии таблицы: индекс может догонять историю в фоне.
+    """
+    if not indexes[0].enabled:
+        raise HTTPException(status_code=404, detail="Semantic search is disabled")
+    try:
+        body = query_semantic(sessions, indexes, q, language, complexity_level, limit)
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Error retrieving explanations: {str(e)}"
+            detail=f"Error searching explanations: {str(e)}"
         )
 
+def query_semantic(sessions: Sequence[Session], indexes: Sequence[SemanticIndex], q: str, language: Optional[str],
+                   complexity_level: Optional[str], limit: int) -> bytes:
+    """
+    Ищет ближайшие объяснения в векторных индексах шардов и сериализует ответ
+    (limit лучших результатов среди всех шардов)
+    """
+    results = []
+    for db, index in zip(sessions, indexes):
+        matches = index.search(db, q, limit, language, complexity_level)
+        items = explanation_items_by_id(db, [i for i, _ in matches])
+        results.extend(dict(items[i], score=round(score, 4)) for i, score in matches if i in items)
+    results.sort(key=lambda result: result["score"], reverse=True)
+    # Поля в порядке SemanticSearchResponse
+    return dumps({
+        "success": True,
+        "query": q,
+        "results": results[:limit],
+        "indexed_count": sum(len(index) for index in indexes)
+    })
+
 @router.get("/explanations/{explanation_id}")
 async def get_explanation_by_id(
     explanation_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: Session = Depends(get_explanation_db),
+    responses: VersionedResponseCache = Depends(get_history_responses)
 ):
     """
     Получить конкретное объяснение по ID
     """
-    try:
-        explanation = db.query(CodeExplanation).filter(CodeExplanation.id == explanation_id).first()
-        
-        if not explanation:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Explanation with ID {explanation_id} not found"
-            )
-        
-        return {
+    def build() -> bytes:
+        return dumps({
             "success": True,
-            "explanation": explanation.to_dict()
-        }
+            "explanation": explanation_item(db, explanation_id)
+        })
+    
+    try:
+        return conditional_response(request, get_table_version(db), responses, build)
         
     except HTTPException:
         raise
@@ -102,28 +323,29 @@ async def get_explanation_by_id(
 async def toggle_favorite(
     explanation_id: int,
     request: FavoriteRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_explanation_db)
 ):
     """
     Переключить статус избранного для объяснения
     """
     try:
-        explanation = db.query(CodeExplanation).filter(CodeExplanation.id == explanation_id).first()
+        updated = db.query(CodeExplanation).filter(CodeExplanation.id == explanation_id).update(
+            {CodeExplanation.is_favorite: request.is_favorite}, synchronize_session=False
+        )
         
-        if not explanation:
+        if not updated:
             raise HTTPException(
                 status_code=404,
                 detail=f"Explanation with ID {explanation_id} not found"
             )
         
-        explanation.is_favorite = request.is_favorite
         db.commit()
         
-        return {
+        return Response(content=dumps({
             "success": True,
             "message": f"Explanation {'added to' if request.is_favorite else 'removed from'} favorites",
-            "explanation": explanation.to_dict()
-        }
+            "explanation": explanation_item(db, explanation_id)
+        }), media_type="application/json")
         
     except HTTPException:
         raise
@@ -134,10 +356,41 @@ async def toggle_favorite(
             detail=f"Error updating favorite status: {str(e)}"
         )
 
+@router.put("/explanations/{explanation_id}/tags")
+async def update_tags(
+    explanation_id: int,
+    request: TagsRequest,
+    db: Session = Depends(get_explanation_db)
+):
+    """
+    Заменить теги объяснения (теги приводятся к нижнему регистру, слова — через дефис)
+    """
+    try:
+        # Проверка существования до изменения тегов
+        explanation_item(db, explanation_id)
+        
+        set_tags(db, explanation_id, request.tags, source="user", replace=True)
+        db.commit()
+        
+        return Response(content=dumps({
+            "success": True,
+            "message": "Tags updated",
+            "explanation": explanation_item(db, explanation_id)
+        }), media_type="application/json")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error updating tags: {str(e)}"
+        )
+
 @router.delete("/explanations/{explanation_id}")
 async def delete_explanation(
     explanation_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_explanation_db)
 ):
     """
     Удалить объяснение из истории
@@ -169,42 +422,57 @@ async def delete_explanation(
         )
 
 @router.get("/stats")
-async def get_history_stats(db: Session = Depends(get_db)):
+async def get_history_stats(
+    request: Request,
+    sessions: List[Session] = Depends(get_shard_sessions),
+    responses: VersionedResponseCache = Depends(get_history_responses)
+):
     """
     Получить статистику по объяснениям кода
     """
     try:
-        total_explanations = db.query(CodeExplanation).count()
-        favorite_explanations = db.query(CodeExplanation).filter(CodeExplanation.is_favorite == True).count()
+        return conditional_response(request, HistoryShards.version(sessions), responses, lambda: query_stats(sessions))
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving statistics: {str(e)}"
+        )
+
+def query_stats(sessions: Sequence[Session]) -> bytes:
+    """
+    Считает статистику истории по всем шардам и сериализует ответ
+    """
+    total_explanations = 0
+    favorite_explanations = 0
+    language_counts = Counter()
+    complexity_counts = Counter()
+    for db in sessions:
+        total_explanations += db.query(CodeExplanation).count()
+        favorite_explanations += db.query(CodeExplanation).filter(CodeExplanation.is_favorite == True).count()
         
         # Распределение по языкам
-        language_stats = db.query(
+        language_counts.update(dict(db.query(
             CodeExplanation.language,
-            db.func.count(CodeExplanation.id).label('count')
-        ).group_by(CodeExplanation.language).all()
+            func.count(CodeExplanation.id).label('count')
+        ).group_by(CodeExplanation.language).all()))
         
         # Распределение по уровням сложности
-        complexity_stats = db.query(
+        complexity_counts.update(dict(db.query(
             CodeExplanation.complexity_level,
-            db.func.count(CodeExplanation.id).label('count')
-        ).group_by(CodeExplanation.complexity_level).all()
-        
-        return {
-            "success": True,
-            "stats": {
-                "total_explanations": total_explanations,
-                "favorite_explanations": favorite_explanations,
-                "language_distribution": [
-                    {"language": lang, "count": count} for lang, count in language_stats
-                ],
-                "complexity_distribution": [
-                    {"complexity": level, "count": count} for level, count in complexity_stats
-                ]
-            }
+            func.count(CodeExplanation.id).label('count')
+        ).group_by(CodeExplanation.complexity_level).all()))
+    
+    return dumps({
+        "success": True,
+        "stats": {
+            "total_explanations": total_explanations,
+            "favorite_explanations": favorite_explanations,
+            "language_distribution": [
+                {"language": lang, "count": count} for lang, count in sorted(language_counts.items(), key=lambda item: str(item[0]))
+            ],
+            "complexity_distribution": [
+                {"complexity": level, "count": count} for level, count in sorted(complexity_counts.items(), key=lambda item: str(item[0]))
+            ]
         }
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error retrieving statistics: {str(e)}"
-        )
\ No newline at end of file
+    })
@@ -0,0 +1,197 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Any, Dict
+import asyncio
+import functools
+import os
+import time
+
+from ..container import ServiceContainer
+from ..dependencies import get_container, get_job_queue, get_primary_db
+from ..models import CodeExplanationRequest, CodeExplanationResponse, ExplainJobRequest, ExplainJobResponse
+from ..serialization import dumps
+from ..services.fair_queue import client_context, current_client
+from ..services.job_queue import CallbackURLError, JobError, JobQueue, QueueFullError, TERMINAL_STATUSES
+from ..services.llm_service import llm_deadline
+from .code import cached_analysis, new_outcome, resolve_explanation, save_explanation_to_db
+
+# Как часто поток событий перечитывает задачу и шлёт комментарий-пульс, секунд
+JOB_EVENTS_POLL_INTERVAL = float(os.getenv("JOB_EVENTS_POLL_INTERVAL", "0.5"))
+JOB_EVENTS_HEARTBEAT = 15.0
+
+router = APIRouter(prefix="/code/jobs", tags=["jobs"])
+
+@router.post("", response_model=ExplainJobResponse, status_code=202)
+async def create_job(
+    request: ExplainJobRequest,
+    response: Response,
+    http_request: Request,
+    db: Session = Depends(get_primary_db),
+    job_queue: JobQueue = Depends(get_job_queue),
+    container: ServiceContainer = Depends(get_container)
+):
+    """
+    Ставит объяснение в очередь и сразу возвращает задачу; результат — GET /code/jobs/{id},
+    поток событий /code/jobs/{id}/events или POST на callback_url
+    """
+    if request.callback_url:
+        # Проверка адреса выполняет DNS-запрос, поэтому вне цикла событий
+        try:
+            await run_in_threadpool(job_queue.check_callback_url, request.callback_url)
+        except CallbackURLError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    payload = request.model_dump(exclude={"callback_url", "deadline_seconds", "max_attempts"})
+    # Клиент запоминается в задаче: объяснение сохраняется в его шард истории
+    tenant = container.shards.tenant_of(http_request.headers)
+    if tenant:
+        payload["tenant"] = tenant
+    # И клиент справедливой очереди к LLM (ключ API или IP)
+    payload["client"] = current_client()
+    try:
+        job = job_queue.enqueue(db, payload, request.callback_url, request.deadline_seconds, request.max_attempts)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    response.headers["Location"] = f"/code/jobs/{job['id']}"
+    return ExplainJobResponse(success=True, job=job)
+
+@router.get("/{job_id}", response_model=ExplainJobResponse)
+async def get_job(
+    job_id: str,
+    db: Session = Depends(get_primary_db),
+    job_queue: JobQueue = Depends(get_job_queue)
+):
+    """
+    Состояние задачи; после успешного завершения в result — ответ как у /code/explain
+    """
+    job = job_queue.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return ExplainJobResponse(success=True, job=job)
+
+@router.get("/{job_id}/events")
+async def job_events(
+    job_id: str,
+    request: Request,
+    job_queue: JobQueue = Depends(get_job_queue)
+):
+    """
+    Server-Sent Events: событие job при каждом изменении статуса или числа попыток,
+    поток закрывается после завершения задачи
+    """
+    with job_queue.session_factory() as db:
+        if job_queue.get(db, job_id) is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    async def events():
+        last_state = None
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            # Задачу может выполнять другой воркер, поэтому состояние читается из базы
+            with job_queue.session_factory() as db:
+                job = job_queue.get(db, job_id)
+            state = (job["status"], job["attempts"])
+            if state != last_state:
+                last_state = state
+                last_sent = time.monotonic()
+                yield b"event: job\ndata: " + dumps(job) + b"\n\n"
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+            elif time.monotonic() - last_sent >= JOB_EVENTS_HEARTBEAT:
+                last_sent = time.monotonic()
+                yield b": keep-alive\n\n"
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def run_explain_job(container: ServiceContainer, job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Выполняет задачу объяснения в потоке воркера очереди: тот же конвейер, что у /code/explain,
+    но объяснение сохраняется в историю до завершения задачи, а фоновая работа (досчёт уровней,
+    уточнение почти дубликата) выполняется после него.
+    Резервное мок-объяснение (LLM недоступен) принимается только на последней попытке.
+    Вызовы LLM ограничены сроком задачи; после срока объяснение не сохраняется: задача
+    уже считается проваленной, и запись в истории осталась бы без неё.
+    """
+    start_time = time.time()
+    payload = dict(job["payload"])
+    shard = container.shards.shard_for_tenant(payload.pop("tenant", None))
+    client = payload.pop("client", None)
+    request = CodeExplanationRequest(**payload)
+    timings: Dict[str, float] = {}
+    deferred = []
+    db = container.shards.session(shard)
+    try:
+        analysis = cached_analysis(container.analyzer, container.analysis_cache, request.code_snippet,
+                                   request.language, timings)
+        validation_info = analysis["validation"]
+        if not validation_info["is_valid"]:
+            raise JobError(f"Invalid code snippet: {', '.join(validation_info['errors'])}", retryable=False)
+
+        outcome = new_outcome()
+        try:
+            with client_context(client), llm_deadline(job["deadline_at"]):
+                resolve_explanation(
+                    request,
+                    analysis["language"],
+                    analysis["summary"],
+                    validation_info,
+                    db,
+                    container.llm_service,
+                    container.explanation_cache,
+                    container.near_duplicates,
+                    container.incremental,
+                    lambda func, *args: deferred.append((func, args)),
+                    outcome,
+                    timings
+                )
+        except HTTPException as e:
+            raise JobError(e.detail)
+        if outcome["fallback"] and job["attempts"] < job["max_attempts"]:
+            raise JobError("LLM service unavailable")
+        if time.time() >= job["deadline_at"]:
+            raise JobError("Deadline exceeded", retryable=False)
+
+        near_duplicates = container.near_duplicates
+        explanation_id = save_explanation_to_db(
+            db,
+            request.code_snippet,
+            analysis["language"],
+            outcome["explanation"],
+            request.complexity_level,
+            near_duplicates if outcome["index_explanation"] and near_duplicates.enabled else None,
+            container.semantic_indexes[shard],
+            container.analyzer.suggest_tags(analysis["summary"])
+        )
+        if explanation_id is None:
+            raise JobError("Failed to save explanation")
+
+        result = CodeExplanationResponse(
+            success=True,
+            explanation=outcome["explanation"],
+            language=analysis["language"],
+            complexity_level=request.complexity_level,
+            code_summary=analysis["summary"],
+            validation_info=validation_info,
+            processing_time=round(time.time() - start_time, 2),
+            explanations=outcome["explanations"],
+            cached=outcome["cached"],
+            near_duplicate=outcome["near_duplicate"],
+            incremental=outcome["incremental"]
+        )
+        return {
+            "result": result.model_dump(mode="json"),
+            "explanation_id": explanation_id,
+            "after": [functools.partial(_call_as_client, client, func, *args) for func, args in deferred]
+        }
+    finally:
+        db.close()
+
+def _call_as_client(client, func, *args):
+    with client_context(client):
+        return func(*args)
@@ -0,0 +1,137 @@
+from fastapi import APIRouter, BackgroundTasks, HTTPException, WebSocket, WebSocketDisconnect
+from typing import Any, Dict
+import json
+import logging
+import math
+import time
+
+from ..container import ServiceContainer
+from ..models import CodeExplanationRequest
+from ..serialization import dumps
+from ..services.fair_queue import client_context, current_client
+from ..services.live_analysis import LiveAnalysis
+from ..services.metrics import LIVE_ANALYSIS_SECONDS
+from .code import analysis_cache_key, explain_code
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/code", tags=["code"])
+
+@router.websocket("/live")
+async def live_analysis(websocket: WebSocket):
+    """
+    Постоянное соединение редактора. Клиент присылает текст целиком (reset), затем
+    только правки (edit) и смену языка (language); на каждое сообщение сервер отвечает
+    событием analysis с языком, результатами validate_code и кратким описанием.
+    Сообщение explain объясняет текущий текст так же, как POST /code/explain,
+    используя уже выполненный анализ.
+    """
+    container: ServiceContainer = websocket.app.state.container
+    # Клиента соединения определяет RateLimitMiddleware (ключ API или IP)
+    client = current_client()
+    await websocket.accept()
+    state = LiveAnalysis()
+    container.live_connections += 1
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                kind = message.get("type")
+                if kind == "explain":
+                    await explain_live(websocket, container, state, message, client)
+                    continue
+                if kind == "reset":
+                    state.reset(str(message.get("code") or ""), message.get("language"), int(message.get("version", 0)))
+                elif kind == "edit":
+                    try:
+                        state.apply(message.get("changes") or [], int(message.get("version", 0)))
+                    except (ValueError, KeyError, TypeError) as e:
+                        # Текст клиента и сервера разошёлся: клиент должен прислать его целиком
+                        await send_event(websocket, {"type": "error", "version": state.version, "detail": str(e), "resync": True})
+                        continue
+                elif kind == "language":
+                    state.set_language(message.get("language"))
+                else:
+                    raise ValueError(f"Unknown message type: {kind}")
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                await send_event(websocket, {"type": "error", "version": state.version, "detail": str(e)})
+                continue
+
+            start = time.perf_counter()
+            analysis = state.analyze()
+            elapsed = time.perf_counter() - start
+            LIVE_ANALYSIS_SECONDS.observe(elapsed)
+            await send_event(websocket, {
+                "type": "analysis",
+                "version": state.version,
+                **analysis,
+                "server_ms": round(elapsed * 1000, 3)
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        container.live_connections -= 1
+
+async def send_event(websocket: WebSocket, payload: Dict[str, Any]):
+    await websocket.send_text(dumps(payload).decode("utf-8"))
+
+async def explain_live(websocket: WebSocket, container: ServiceContainer, state: LiveAnalysis,
+                       message: Dict[str, Any], client: str):
+    """
+    Объясняет текущий текст соединения через обработчик /code/explain. Анализ, выполненный
+    по правкам, кладётся в кэш анализа, поэтому повторно код не анализируется.
+    Каждое сообщение расходует маркер группы explain клиента, а вызов LLM идёт
+    в справедливой очереди от имени клиента — как у POST /code/explain.
+    """
+    version = state.version
+    allowed, _, retry_after = container.rate_limiter.acquire(client, "explain")
+    if not allowed:
+        await send_event(websocket, {
+            "type": "error",
+            "version": version,
+            "status": 429,
+            "detail": "Rate limit exceeded",
+            "retry_after": max(1, math.ceil(retry_after))
+        })
+        return
+    try:
+        request = CodeExplanationRequest(
+            code_snippet=state.code,
+            language=state.language,
+            complexity_level=message.get("complexity_level", "intermediate"),
+            all_levels=bool(message.get("all_levels", False)),
+            allow_near_duplicate=bool(message.get("allow_near_duplicate", True)),
+            previous_snippet_hash=message.get("previous_snippet_hash")
+        )
+    except ValueError as e:
+        await send_event(websocket, {"type": "error", "version": version, "status": 422, "detail": str(e)})
+        return
+
+    container.analysis_cache.set(analysis_cache_key(request.code_snippet, request.language), state.analyze())
+    background_tasks = BackgroundTasks()
+    shard = container.tenant_shard(websocket.headers)
+    db = container.shards.session(shard)
+    try:
+        try:
+            with client_context(client):
+                response = await explain_code(
+                    request,
+                    background_tasks,
+                    db=db,
+                    llm_service=container.llm_service,
+                    analyzer=container.analyzer,
+                    explanation_cache=container.explanation_cache,
+                    analysis_cache=container.analysis_cache,
+                    near_duplicates=container.near_duplicates,
+                    incremental=container.incremental,
+                    semantic_index=container.semantic_indexes[shard],
+                    container=container
+                )
+        except HTTPException as e:
+            await send_event(websocket, {"type": "error", "version": version, "status": e.status_code, "detail": e.detail})
+            return
+        await send_event(websocket, {"type": "explanation", "version": version, "result": response.model_dump(mode="json")})
+        # Сохранение в историю — после ответа, как у BackgroundTasks HTTP-запроса
+        await background_tasks()
+    finally:
+        db.close()
@@ -0,0 +1,219 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Dict, Optional, Tuple
+import os
+import posixpath
+import shutil
+import tempfile
+
+import aiofiles
+from multipart.multipart import MultipartParser, parse_options_header
+
+from ..dependencies import get_explanation_cache, get_llm_service, get_upload_analyzer
+from ..serialization import dumps
+from ..services.explanation_cache import ExplanationCache
+from ..services.llm_service import LLMService
+from ..services.upload_analysis import UploadAnalyzer
+
+# Загрузка пишется на диск частями не меньше этого размера
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Запас Content-Length сверх UPLOAD_MAX_MB на заголовки частей и поле complexity_level
+UPLOAD_MULTIPART_OVERHEAD = 64 * 1024
+# Имя файла загрузки в её каталоге: имя от клиента на диске не используется
+UPLOAD_STORED_NAME = "upload"
+# Комментарий-пульс, если событий нет дольше заданного времени (ожидание LLM), секунд
+UPLOAD_EVENTS_HEARTBEAT = 15.0
+
+router = APIRouter(prefix="/code", tags=["code"])
+
+# Тело разбирается вручную по мере чтения, поэтому схема формы описывается для OpenAPI явно
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {
+                            "type": "string",
+                            "format": "binary",
+                            "description": "Файл исходного кода или архив .zip/.tar(.gz, .bz2, .xz)"
+                        },
+                        "complexity_level": {"type": "string", "default": "intermediate"}
+                    }
+                }
+            }
+        }
+    }
+}
+
+@router.post("/upload", openapi_extra=UPLOAD_OPENAPI)
+async def upload_code(
+    request: Request,
+    llm_service: LLMService = Depends(get_llm_service),
+    explanation_cache: ExplanationCache = Depends(get_explanation_cache),
+    uploads: UploadAnalyzer = Depends(get_upload_analyzer)
+):
+    """
+    Объяснение загруженного файла или архива проекта: каждый исходный файл объясняется
+    отдельно, для архива — ещё и проект целиком. Ход работы передаётся потоком
+    Server-Sent Events (file, skipped, overview, done или error).
+    """
+    path, filename, complexity_level = await receive_upload(request, uploads)
+    directory = os.path.dirname(path)
+
+    async def events():
+        # Пока обрабатывается большой архив, события идут по мере готовности файлов
+        async for event in uploads.run(path, filename, complexity_level, llm_service, explanation_cache,
+                                       heartbeat=UPLOAD_EVENTS_HEARTBEAT):
+            if event is None:
+                yield b": keep-alive\n\n"
+            else:
+                yield b"event: " + event["type"].encode() + b"\ndata: " + dumps(event) + b"\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Каталог удаляется и тогда, когда клиент отключился до начала потока событий
+        background=BackgroundTask(shutil.rmtree, directory, ignore_errors=True)
+    )
+
+async def receive_upload(request: Request, uploads: UploadAnalyzer) -> Tuple[str, str, str]:
+    """
+    Разбирает multipart/form-data по мере чтения тела: поле file пишется частями прямо
+    в отдельный каталог загрузки (без промежуточного временного файла и без сборки в памяти),
+    размер проверяется по Content-Length до чтения и по фактическим байтам во время него.
+    Файл хранится под постоянным именем UPLOAD_STORED_NAME; имя от клиента служит только для
+    определения архива и языка и для путей в событиях.
+    Возвращает путь к файлу, имя файла и уровень сложности.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=422, detail="Body must be multipart/form-data with a file field")
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Upload is larger than {uploads.max_upload_bytes // (1024 * 1024)} MB"
+    )
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > uploads.max_upload_bytes + UPLOAD_MULTIPART_OVERHEAD:
+        raise too_large
+
+    os.makedirs(uploads.upload_dir, exist_ok=True)
+    directory = tempfile.mkdtemp(prefix="upload_", dir=uploads.upload_dir)
+    form = _UploadForm(uploads.max_upload_bytes)
+    parser = MultipartParser(boundary, form.callbacks())
+    path = None
+    out = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if form.error is not None:
+                raise too_large if form.error == "too_large" else HTTPException(status_code=422, detail=form.error)
+            if form.filename is not None and out is None:
+                path = os.path.join(directory, UPLOAD_STORED_NAME)
+                out = await aiofiles.open(path, "wb")
+            if out is not None and (form.pending_size >= UPLOAD_CHUNK_SIZE or form.file_done):
+                await out.write(form.take())
+        parser.finalize()
+        if out is None:
+            raise HTTPException(status_code=422, detail="Field file is required")
+        await out.write(form.take())
+    except BaseException:
+        if out is not None:
+            await out.close()
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    await out.close()
+
+    complexity_level = (form.fields.get("complexity_level") or "intermediate").lower()
+    if complexity_level not in ("beginner", "intermediate", "advanced"):
+        shutil.rmtree(directory, ignore_errors=True)
+        raise HTTPException(status_code=422, detail="complexity_level must be beginner, intermediate or advanced")
+    return path, form.filename, complexity_level
+
+class _UploadForm:
+    """
+    Состояние разбора формы загрузки для обработчиков MultipartParser (синхронных):
+    байты поля file копятся в pending и пишутся в файл после каждой порции тела,
+    короткие текстовые поля собираются целиком
+    """
+
+    MAX_FIELD_BYTES = 1024
+
+    def __init__(self, max_file_bytes: int):
+        self.max_file_bytes = max_file_bytes
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.file_done = False
+        self.error: Optional[str] = None
+        self.pending = []
+        self.pending_size = 0
+        self._file_size = 0
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._name: Optional[str] = None
+        self._value = b""
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": lambda data, start, end: self._append_header("_header_field", data[start:end]),
+            "on_header_value": lambda data, start, end: self._append_header("_header_value", data[start:end]),
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end
+        }
+
+    def take(self) -> bytes:
+        data = b"".join(self.pending)
+        self.pending, self.pending_size = [], 0
+        return data
+
+    def _append_header(self, attribute: str, data: bytes):
+        setattr(self, attribute, getattr(self, attribute) + data)
+
+    def _on_part_begin(self):
+        self._headers, self._name, self._value = {}, None, b""
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        if self._name == "file" and self.filename is None and b"filename" in options:
+            name = options[b"filename"].decode("utf-8", "replace")
+            name = posixpath.basename(name.replace("\\", "/"))
+            if name in ("", ".", ".."):
+                self.error = "Field file must have a file name"
+                return
+            self.filename = name
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self.error is not None:
+            return
+        if self._name == "file" and not self.file_done and self.filename is not None:
+            self._file_size += end - start
+            if self._file_size > self.max_file_bytes:
+                self.error = "too_large"
+                return
+            self.pending.append(data[start:end])
+            self.pending_size += end - start
+        elif self._name and self._name != "file":
+            self._value += data[start:end]
+            if len(self._value) > self.MAX_FIELD_BYTES:
+                self.error = f"Field {self._name} is too long"
+
+    def _on_part_end(self):
+        if self._name == "file" and self.filename is not None:
+            self.file_done = True
+        elif self._name and self._name != "file":
+            self.fields[self._name] = self._value.decode("utf-8", "replace").strip()
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, Query
+
+from ..container import ServiceContainer
+from ..dependencies import get_container, require_admin_token
+from ..services.fair_queue import current_client
+
+router = APIRouter(prefix="/usage", tags=["usage"])
+
+@router.get("")
+async def get_own_usage(container: ServiceContainer = Depends(get_container)):
+    """
+    Счётчики использования и лимиты клиента, выполняющего запрос
+    """
+    limiter = container.rate_limiter
+    return {
+        "success": True,
+        "client": current_client(),
+        "usage": container.client_usage.get(current_client()),
+        "limits": {
+            group: {"rate": rate, "burst": burst}
+            for group, (rate, burst) in limiter.limits.items()
+        } if limiter.enabled else {}
+    }
+
+@router.get("/clients", dependencies=[Depends(require_admin_token)])
+async def get_clients_usage(
+    limit: int = Query(100, ge=1, le=10000, description="Максимальное количество клиентов"),
+    sort: str = Query(
+        "last_seen",
+        pattern="^(last_seen|explain_requests|explain_limited|history_requests|history_limited|llm_calls|llm_seconds|llm_queue_seconds)$",
+        description="Счётчик, по убыванию которого упорядочены клиенты"
+    ),
+    container: ServiceContainer = Depends(get_container)
+):
+    """
+    Счётчики использования по клиентам (только с токеном администратора)
+    """
+    fair_queue = container.llm_service.fair_queue
+    return {
+        "success": True,
+        "tracked_clients": len(container.client_usage),
+        "llm_queue": {
+            "max_concurrency": fair_queue.max_concurrency,
+            "in_service": fair_queue.in_service,
+            "waiting": fair_queue.waiting
+        } if fair_queue else None,
+        "clients": container.client_usage.snapshot(limit, sort)
+    }
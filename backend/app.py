@@ -1,28 +1,79 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
+import logging
 import os
-import time
 
-from .database import create_tables
-from .api import code, history
+from .api import code, history, jobs, live, upload, usage
+from .container import ServiceContainer
+from .dependencies import get_container
 from .models import APIHealthResponse
+from .middleware import CompressionMiddleware, ProfilingMiddleware, RateLimitMiddleware, TracingMiddleware
+from .prestart import prestart_done
+from .serialization import DefaultJSONResponse
+from .services.metrics import REGISTRY, QUEUE_DEPTH, CACHE_SIZE
+from .services.tracing import TraceIdLogFilter
 
-# Создание таблиц базы данных при запуске приложения
+# Журналирование с идентификатором трассы текущего запроса
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s [trace=%(trace_id)s] %(name)s: %(message)s"
+)
+for handler in logging.getLogger().handlers:
+    handler.addFilter(TraceIdLogFilter())
+
+# Служебные эндпойнты (трассы) включаются только явно
+ENABLE_DEBUG_ENDPOINTS = os.getenv("ENABLE_DEBUG_ENDPOINTS", "false").lower() == "true"
+# Профилирование по запросу администратора (требует ADMIN_TOKEN)
+ENABLE_PROFILING = os.getenv("ENABLE_PROFILING", "false").lower() == "true"
+# Сжатие ответов (br при установленном пакете brotli, иначе gzip) не меньше заданного размера
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Создание таблиц базы данных и сервисов при запуске, освобождение при остановке
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_tables()
-    yield
+    container = ServiceContainer()
+    # В продуктивном режиме таблицы создаёт prestart один раз до запуска воркеров
+    if not prestart_done():
+        container.shards.create_tables()
+    await container.start()
+    container.job_queue.start(lambda job: jobs.run_explain_job(container, job))
+    # Прогрев кэшей в фоне: готовность (/health/ready) его не ждёт
+    container.cache_warmer.start(container.shards.session_factories, lambda entry: code.warm_cached_explanation(
+        container.analyzer, container.analysis_cache, container.explanation_cache, container.llm_service, entry
+    ))
+    app.state.container = container
+    try:
+        yield
+    finally:
+        await container.stop()
 
 # Инициализация экземпляра FastAPI
 app = FastAPI(
     title="Code Explainer API",
     description="AI-powered code explanation service for developers",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=DefaultJSONResponse
 )
 
+# Сжатие ответов (внутри CORS и трассировки: время сжатия входит в трассу запроса)
+if COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=COMPRESSION_MIN_SIZE,
+        gzip_level=COMPRESSION_GZIP_LEVEL,
+        brotli_quality=COMPRESSION_BROTLI_QUALITY
+    )
+
+# Клиент запроса и лимиты запросов (внутри CORS: ответ 429 получает заголовки CORS)
+app.add_middleware(RateLimitMiddleware)
+
 # Настройка CORS
 app.add_middleware(
     CORSMiddleware,
@@ -30,45 +81,73 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "X-Profile-Id", "X-Profile-Status", "Retry-After",
+                    "X-RateLimit-Limit", "X-RateLimit-Remaining"],
 )
 
+# Профилирование отдельных запросов (внутри трассировки, чтобы использовать trace_id)
+if ENABLE_PROFILING:
+    app.add_middleware(ProfilingMiddleware)
+
+# Трассировка запросов
+app.add_middleware(TracingMiddleware)
+
 # Подключение роутеров API
 app.include_router(code.router)
+app.include_router(live.router)
+app.include_router(upload.router)
+app.include_router(jobs.router)
 app.include_router(history.router)
+app.include_router(usage.router)
+# Отладочные модули импортируются только при включённых флагах, чтобы не замедлять запуск
+if ENABLE_DEBUG_ENDPOINTS or ENABLE_PROFILING:
+    from .api import debug
+    if ENABLE_DEBUG_ENDPOINTS:
+        app.include_router(debug.router)
+    if ENABLE_PROFILING:
+        app.include_router(debug.profiling_router)
 
 # Эндпойнт проверки состояния
 @app.get("/health", response_model=APIHealthResponse)
-async def health_check():
+async def health_check(container: ServiceContainer = Depends(get_container)):
     """
-    Эндпойнт проверки состояния API
+    Эндпойнт проверки состояния API.
+    Возвращает последний снимок фоновой проверки без обращения к зависимостям.
     """
-    from .services.llm_service import LLMService
-    from .database import engine
-    from sqlalchemy import text
-    
-    # Проверяем соединение с базой данных
-    try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        db_status = "healthy"
-    except Exception:
-        db_status = "unhealthy"
-    
-    # Проверяем доступность сервиса LLM
-    try:
-        llm_service = LLMService()
-        # Мок-сервис всегда доступен
-        llm_status = "healthy" if hasattr(llm_service, 'use_mock') else "unhealthy"
-    except Exception:
-        llm_status = "unhealthy"
-    
-    return APIHealthResponse(
-        status="healthy" if db_status == "healthy" and llm_status == "healthy" else "degraded",
-        timestamp=time.time(),
-        version="1.0.0",
-        llm_service_status=llm_status,
-        database_status=db_status
-    )
+    return Response(content=container.health_prober.snapshot_json, media_type="application/json")
+
+@app.get("/health/live")
+async def liveness_check():
+    """
+    Проверка живости процесса для оркестратора
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check(container: ServiceContainer = Depends(get_container)):
+    """
+    Проверка готовности принимать трафик (база данных доступна)
+    """
+    if not container.health_prober.is_ready:
+        return Response(
+            content=container.health_prober.snapshot_json,
+            media_type="application/json",
+            status_code=503
+        )
+    return Response(content=container.health_prober.snapshot_json, media_type="application/json")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(container: ServiceContainer = Depends(get_container)):
+    """
+    Метрики в текстовом формате Prometheus
+    """
+    for queue, depth in container.queue_depths().items():
+        QUEUE_DEPTH.labels(queue).set(depth)
+    CACHE_SIZE.labels("explanation").set(container.explanation_cache.stats()["size"])
+    CACHE_SIZE.labels("analysis").set(container.analysis_cache.stats()["size"])
+    CACHE_SIZE.labels("history").set(len(container.history_responses))
+    QUEUE_DEPTH.labels("jobs_pending").set(container.job_queue.pending_count())
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Корневой эндпойнт
 @app.get("/")
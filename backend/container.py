@@ -0,0 +1,115 @@
+import os
+from typing import Dict, Mapping
+
+from .services.cache_warmup import CacheWarmer
+from .services.code_analyzer import CodeAnalyzer
+from .services.explanation_cache import ExplanationCache
+from .services.fair_queue import FairQueue
+from .services.health_prober import HealthProber
+from .services.history_shards import HistoryShards
+from .services.incremental import IncrementalExplainer
+from .services.job_queue import JobQueue
+from .services.llm_service import LLMService
+from .services.near_duplicates import NearDuplicateIndex
+from .services.rate_limiter import ClientUsage, RateLimiter
+from .services.response_cache import VersionedResponseCache
+from .services.semantic_index import SemanticIndex
+from .services.shared_cache import TieredCache
+from .services.traffic_capture import TrafficRecorder
+from .services.upload_analysis import UploadAnalyzer
+
+# Интервал фоновой проверки зависимостей для /health, секунд
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+
+
+class ServiceContainer:
+    """
+    Контейнер долгоживущих сервисов приложения.
+    Создаётся один раз в lifespan и передаётся в обработчики через Depends.
+    """
+
+    def __init__(self):
+        # Шарды истории; в шарде 0 (основная база) хранится и очередь задач
+        self.shards = HistoryShards.from_env()
+        self.engine = self.shards.engines[0]
+        self.session_factory = self.shards.session_factories[0]
+        self.analyzer = CodeAnalyzer()
+        # Счётчики использования по клиентам (ключ API или IP) и лимиты запросов
+        self.client_usage = ClientUsage(int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000")))
+        self.rate_limiter = RateLimiter.from_env(self.client_usage)
+        # Вызовы LLM распределяются между клиентами справедливой очередью
+        self.llm_service = LLMService(FairQueue.from_env(self.client_usage))
+        self.explanation_cache = ExplanationCache.from_env()
+        # Результаты CodeAnalyzer (язык, валидация, краткое описание) по хэшу фрагмента
+        self.analysis_cache = TieredCache.from_env("analysis", int(os.getenv("ANALYSIS_CACHE_SIZE", "1024")))
+        # Прогрев кэшей частыми фрагментами истории после запуска
+        self.cache_warmer = CacheWarmer.from_env(self.explanation_cache.max_size)
+        # Поиск ранее объяснённых почти одинаковых фрагментов
+        self.near_duplicates = NearDuplicateIndex.from_env()
+        # Блоки объяснённых фрагментов для повторного объяснения только изменённых частей
+        self.incremental = IncrementalExplainer.from_env()
+        # Векторные индексы шардов истории для поиска по смыслу
+        self.semantic_indexes = [SemanticIndex.from_env(shard) for shard in range(len(self.shards))]
+        # Сериализованные ответы истории, привязанные к версии таблицы (ETag и 304)
+        self.history_responses = VersionedResponseCache(
+            "history", int(os.getenv("HISTORY_RESPONSE_CACHE_SIZE", "256"))
+        )
+        # Долговечная очередь задач объяснения (POST /code/jobs) и её пул воркеров
+        self.job_queue = JobQueue.from_env(self.session_factory)
+        self.traffic_recorder = TrafficRecorder.from_env()
+        # Конвейер объяснения загруженных файлов и архивов (POST /code/upload)
+        self.uploads = UploadAnalyzer.from_env()
+        # Число запросов на объяснение, которые сейчас обрабатываются
+        self.explain_in_flight = 0
+        # Открытые соединения живого анализа редактора (/code/live)
+        self.live_connections = 0
+        self.health_prober = HealthProber(
+            self.shards.engines,
+            self.llm_service,
+            self.explanation_cache,
+            self.queue_depths,
+            interval=HEALTH_PROBE_INTERVAL
+        )
+
+    def queue_depths(self) -> Dict[str, int]:
+        fair_queue = self.llm_service.fair_queue
+        return {
+            "explain_in_flight": self.explain_in_flight,
+            "llm_in_service": fair_queue.in_service if fair_queue else 0,
+            "llm_waiting": fair_queue.waiting if fair_queue else 0,
+            "jobs_running": self.job_queue.running,
+            "live_connections": self.live_connections
+        }
+
+    def tenant_shard(self, headers: Mapping[str, str]) -> int:
+        """
+        Шард истории, в который пишет клиент запроса (HTTP или WebSocket)
+        """
+        return self.shards.shard_for_tenant(self.shards.tenant_of(headers))
+
+    async def start(self):
+        self.traffic_recorder.start()
+        for index, session_factory in zip(self.semantic_indexes, self.shards.session_factories):
+            index.start_catch_up(session_factory)
+        await self.health_prober.start()
+
+    async def stop(self):
+        self.cache_warmer.stop()
+        await self.job_queue.stop()
+        await self.health_prober.stop()
+        self.traffic_recorder.stop()
+        self.close()
+
+    def close(self):
+        """
+        Освобождает ресурсы при остановке приложения
+        """
+        self.llm_service.close()
+        self.explanation_cache.clear()
+        self.explanation_cache.close()
+        self.analysis_cache.clear()
+        self.analysis_cache.close()
+        self.incremental.close()
+        self.uploads.close()
+        self.history_responses.clear()
+        self.shards.dispose()
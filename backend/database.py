@@ -1,24 +1,53 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean
+from sqlalchemy import create_engine, event, text, inspect, Column, ForeignKey, Integer, Float, String, Text, DateTime, Boolean, LargeBinary, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 import os
 
+from .services.tracing import install_sqlalchemy_tracing
+
 # Создаём каталог для базы данных, если его нет
 # Поддержка переменной окружения для Docker
 db_dir = os.getenv('DATABASE_DIR', os.path.dirname(os.path.abspath(__file__)))
 os.makedirs(db_dir, exist_ok=True)
 db_path = os.path.join(db_dir, 'code_explainer.db')
 
-# Настройка базы данных
+# Несколько воркеров пишут в один файл SQLite: WAL позволяет читать во время записи,
+# а busy_timeout заставляет ждать блокировку вместо ошибки "database is locked"
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    if SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.close()
+
+def create_sqlite_engine(path: str):
+    """
+    Движок файла SQLite с прагмами WAL и busy_timeout и трассировкой запросов
+    (основная база и шарды истории)
+    """
+    sqlite_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    install_sqlalchemy_tracing(sqlite_engine)
+    event.listen(sqlite_engine, "connect", _configure_sqlite_connection)
+    return sqlite_engine
+
+# Настройка базы данных (основной шард истории)
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{db_path}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_sqlite_engine(db_path)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 class CodeExplanation(Base):
     __tablename__ = "code_explanations"
     
+    # AUTOINCREMENT: id не переиспользуются после удаления, а в шардах истории
+    # начинаются со своего смещения (см. services/history_shards.py)
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id = Column(Integer, primary_key=True, index=True)
     code_snippet = Column(Text, nullable=False)
     language = Column(String(50), nullable=False)
@@ -26,26 +55,202 @@ class CodeExplanation(Base):
     complexity_level = Column(String(20), default="intermediate")
     created_at = Column(DateTime, default=datetime.utcnow)
     is_favorite = Column(Boolean, default=False)
-    tags = Column(String(500), default="")
-    
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "code_snippet": self.code_snippet,
-            "language": self.language,
-            "explanation": self.explanation,
-            "complexity_level": self.complexity_level,
-            "created_at": self.created_at.isoformat(),
-            "is_favorite": self.is_favorite,
-            "tags": self.tags
-        }
-
-def create_tables():
-    Base.metadata.create_all(bind=engine)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+    # Теги — через таблицу связей explanation_tags; в ответы API объяснения попадают
+    # столбцами и тегами страницы одним запросом (api/history.py: explanation_items)
+
+class Tag(Base):
+    """
+    Тег объяснений. explanation_count поддерживается триггерами на explanation_tags,
+    поэтому счётчики тегов всей истории читаются без подсчёта связей
+    """
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False, unique=True)
+    explanation_count = Column(Integer, nullable=False, default=0)
+
+class ExplanationTag(Base):
+    """
+    Связь объяснения с тегом; source — auto (предложен по краткому описанию кода) или user
+    """
+    __tablename__ = "explanation_tags"
+
+    # Первичный ключ (тег, объяснение) служит индексом фильтра по тегу
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+    explanation_id = Column(Integer, ForeignKey("code_explanations.id"), primary_key=True)
+    source = Column(String(10), nullable=False, default="auto")
+
+    __table_args__ = (Index("ix_explanation_tags_explanation", "explanation_id"),)
+
+class TableVersion(Base):
+    """
+    Счётчик изменений таблицы: увеличивается триггерами SQLite при каждой вставке,
+    изменении и удалении строки, в том числе из других воркеров. Служит дешёвой
+    версией данных для ETag ответов истории.
+    """
+    __tablename__ = "table_versions"
+
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class SnippetFingerprint(Base):
+    """
+    MinHash-сигнатура нормализованного фрагмента для поиска почти одинаковых запросов
+    """
+    __tablename__ = "snippet_fingerprints"
+
+    explanation_id = Column(Integer, primary_key=True)
+    language = Column(String(50), nullable=False)
+    complexity_level = Column(String(20), nullable=False)
+    token_count = Column(Integer, nullable=False)
+    digest = Column(String(32), nullable=False)
+    signature = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (Index("ix_snippet_fingerprints_digest", "digest"),)
+
+class SnippetLSHBucket(Base):
+    """
+    Корзины LSH: ключ полосы сигнатуры → объяснение (кандидаты для сравнения сигнатур)
+    """
+    __tablename__ = "snippet_lsh_buckets"
+
+    band_key = Column(Integer, primary_key=True)
+    explanation_id = Column(Integer, primary_key=True)
+
+    __table_args__ = (Index("ix_snippet_lsh_buckets_explanation", "explanation_id"),)
+
+class DeletedExplanation(Base):
+    """
+    Журнал удалённых объяснений (заполняется триггером). По нему векторный индекс истории
+    убирает строки удалённых записей: в таблице без AUTOINCREMENT SQLite снова выдаёт
+    освободившийся максимальный id, и без журнала новая запись получила бы чужой вектор
+    """
+    __tablename__ = "deleted_explanations"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True)
+    explanation_id = Column(Integer, nullable=False)
+
+class ExplainJob(Base):
+    """
+    Задача объяснения в очереди: переживает перезапуск, выполняется пулом воркеров приложения.
+    Время хранится в секундах Unix, чтобы выбирать готовые к запуску задачи одним сравнением.
+    """
+    __tablename__ = "explain_jobs"
+
+    id = Column(String(32), primary_key=True)
+    # queued -> running -> succeeded | failed (running снова становится queued при повторе)
+    status = Column(String(16), nullable=False, default="queued")
+    payload = Column(Text, nullable=False)
+    callback_url = Column(String(2000))
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    error = Column(Text)
+    result = Column(Text)
+    explanation_id = Column(Integer)
+    # Воркер, взявший задачу, и срок аренды: после него задачу может забрать другой воркер
+    worker = Column(String(100))
+    locked_until = Column(Float)
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+    deadline_at = Column(Float, nullable=False)
+    next_attempt_at = Column(Float, nullable=False)
+    finished_at = Column(Float)
+    callback_status = Column(String(16))
+
+    __table_args__ = (Index("ix_explain_jobs_status_next_attempt", "status", "next_attempt_at"),)
+
+# Таблицы, для которых ведётся счётчик изменений
+VERSIONED_TABLES = ("code_explanations",)
+
+def _version_triggers(table: str):
+    bump = f"UPDATE table_versions SET version = version + 1 WHERE name = '{table}';"
+    for operation in ("INSERT", "UPDATE", "DELETE"):
+        yield (
+            f"CREATE TRIGGER IF NOT EXISTS {table}_version_{operation.lower()} "
+            f"AFTER {operation} ON {table} BEGIN {bump} END"
+        )
+
+# Индекс почти одинаковых фрагментов и теги удаляются вместе с объяснением,
+# удаление записывается в журнал для векторного индекса
+CLEANUP_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS code_explanations_fingerprint_delete AFTER DELETE ON code_explanations "
+    "BEGIN DELETE FROM snippet_fingerprints WHERE explanation_id = OLD.id; "
+    "DELETE FROM snippet_lsh_buckets WHERE explanation_id = OLD.id; "
+    "DELETE FROM explanation_tags WHERE explanation_id = OLD.id; END",
+    "CREATE TRIGGER IF NOT EXISTS code_explanations_deleted_log AFTER DELETE ON code_explanations "
+    "BEGIN INSERT INTO deleted_explanations (explanation_id) VALUES (OLD.id); END",
+)
+
+# Счётчики тегов; изменение тегов меняет и версию истории (ETag ответов /history)
+TAG_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS explanation_tags_insert AFTER INSERT ON explanation_tags BEGIN "
+    "UPDATE tags SET explanation_count = explanation_count + 1 WHERE id = NEW.tag_id; "
+    "UPDATE table_versions SET version = version + 1 WHERE name = 'code_explanations'; END",
+    "CREATE TRIGGER IF NOT EXISTS explanation_tags_delete AFTER DELETE ON explanation_tags BEGIN "
+    "UPDATE tags SET explanation_count = explanation_count - 1 WHERE id = OLD.tag_id; "
+    "UPDATE table_versions SET version = version + 1 WHERE name = 'code_explanations'; END",
+)
+
+def get_table_version(db, table: str = "code_explanations") -> int:
+    """
+    Текущая версия таблицы (одно чтение по первичному ключу)
+    """
+    return db.execute(text("SELECT version FROM table_versions WHERE name = :name"), {"name": table}).scalar() or 0
+
+def create_tables(bind=None, id_base: int = 0):
+    """
+    Создаёт таблицы, триггеры и переносит данные прежних схем в базе bind (по умолчанию —
+    основной). id_base — начало диапазона id объяснений шарда истории.
+    """
+    bind = bind if bind is not None else engine
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        if id_base:
+            _reserve_id_range(conn, id_base)
+        for table in VERSIONED_TABLES:
+            conn.execute(text("INSERT OR IGNORE INTO table_versions (name, version) VALUES (:name, 0)"), {"name": table})
+            for statement in _version_triggers(table):
+                conn.execute(text(statement))
+        # Триггер удаления из прежней схемы (без очистки тегов) пересоздаётся
+        cleanup_sql = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'code_explanations_fingerprint_delete'"
+        )).scalar()
+        if cleanup_sql and "explanation_tags" not in cleanup_sql:
+            conn.execute(text("DROP TRIGGER code_explanations_fingerprint_delete"))
+        for statement in CLEANUP_TRIGGERS + TAG_TRIGGERS:
+            conn.execute(text(statement))
+        _migrate_legacy_tags(conn)
+
+def _reserve_id_range(conn, id_base: int):
+    """
+    Сдвигает счётчик AUTOINCREMENT code_explanations к началу диапазона шарда, чтобы id
+    объяснений разных шардов не пересекались
+    """
+    table_sql = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'code_explanations'"
+    )).scalar()
+    if "AUTOINCREMENT" not in table_sql.upper():
+        raise RuntimeError("code_explanations without AUTOINCREMENT cannot be used as a history shard")
+    seq = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'code_explanations'")).scalar()
+    if seq is None:
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('code_explanations', :seq)"),
+                     {"seq": id_base})
+    elif seq < id_base:
+        conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'code_explanations'"),
+                     {"seq": id_base})
+
+def _migrate_legacy_tags(conn):
+    """
+    Переносит теги из прежнего столбца code_explanations.tags (строка через запятую)
+    в таблицы tags и explanation_tags; перенесённые строки очищаются
+    """
+    if "tags" not in {column["name"] for column in inspect(conn).get_columns("code_explanations")}:
+        return
+    from .services.tag_index import set_tags
+
+    rows = conn.execute(text("SELECT id, tags FROM code_explanations WHERE tags IS NOT NULL AND tags != ''")).all()
+    for explanation_id, legacy in rows:
+        set_tags(conn, explanation_id, legacy.split(","), source="user")
+    if rows:
+        conn.execute(text("UPDATE code_explanations SET tags = NULL WHERE tags IS NOT NULL"))
\ No newline at end of file
@@ -0,0 +1,125 @@
+import os
+import secrets
+from typing import List, Optional
+
+from fastapi import Depends, Header, HTTPException, Request
+
+from .container import ServiceContainer
+from .services.code_analyzer import CodeAnalyzer
+from .services.explanation_cache import ExplanationCache
+from .services.incremental import IncrementalExplainer
+from .services.job_queue import JobQueue
+from .services.llm_service import LLMService
+from .services.near_duplicates import NearDuplicateIndex
+from .services.response_cache import VersionedResponseCache
+from .services.semantic_index import SemanticIndex
+from .services.shared_cache import TieredCache
+from .services.upload_analysis import UploadAnalyzer
+
+# Токен администратора для служебных эндпойнтов; пока не задан, они недоступны
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def get_container(request: Request) -> ServiceContainer:
+    return request.app.state.container
+
+
+def get_db(request: Request, container: ServiceContainer = Depends(get_container)):
+    """
+    Сессия шарда истории клиента запроса (заголовок X-Tenant-Id): в него сохраняются объяснения
+    """
+    db = container.shards.session(container.tenant_shard(request.headers))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_primary_db(container: ServiceContainer = Depends(get_container)):
+    """
+    Сессия основной базы (шард 0): очередь задач и другие данные вне истории
+    """
+    db = container.session_factory()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_explanation_db(explanation_id: int, container: ServiceContainer = Depends(get_container)):
+    """
+    Сессия шарда, в котором хранится объяснение explanation_id (параметр пути)
+    """
+    db = container.shards.session(container.shards.shard_for_id(explanation_id))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_shard_sessions(container: ServiceContainer = Depends(get_container)):
+    """
+    Сессии всех шардов истории для запросов по всей истории (списки, поиск, статистика)
+    """
+    sessions = container.shards.sessions()
+    try:
+        yield sessions
+    finally:
+        for db in sessions:
+            db.close()
+
+
+def get_llm_service(container: ServiceContainer = Depends(get_container)) -> LLMService:
+    return container.llm_service
+
+
+def get_analyzer(container: ServiceContainer = Depends(get_container)) -> CodeAnalyzer:
+    return container.analyzer
+
+
+def get_explanation_cache(container: ServiceContainer = Depends(get_container)) -> ExplanationCache:
+    return container.explanation_cache
+
+
+def get_analysis_cache(container: ServiceContainer = Depends(get_container)) -> TieredCache:
+    return container.analysis_cache
+
+
+def get_near_duplicate_index(container: ServiceContainer = Depends(get_container)) -> NearDuplicateIndex:
+    return container.near_duplicates
+
+
+def get_incremental_explainer(container: ServiceContainer = Depends(get_container)) -> IncrementalExplainer:
+    return container.incremental
+
+
+def get_semantic_index(request: Request, container: ServiceContainer = Depends(get_container)) -> SemanticIndex:
+    """
+    Векторный индекс шарда истории клиента запроса (туда же, куда get_db, пишутся объяснения)
+    """
+    return container.semantic_indexes[container.tenant_shard(request.headers)]
+
+
+def get_semantic_indexes(container: ServiceContainer = Depends(get_container)) -> List[SemanticIndex]:
+    return container.semantic_indexes
+
+
+def get_job_queue(container: ServiceContainer = Depends(get_container)) -> JobQueue:
+    return container.job_queue
+
+
+def get_upload_analyzer(container: ServiceContainer = Depends(get_container)) -> UploadAnalyzer:
+    return container.uploads
+
+
+def get_history_responses(container: ServiceContainer = Depends(get_container)) -> VersionedResponseCache:
+    return container.history_responses
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and secrets.compare_digest(token, ADMIN_TOKEN)
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
@@ -0,0 +1,304 @@
+import cProfile
+import math
+import os
+import re
+import zlib
+from typing import Optional
+
+from .dependencies import is_admin_token
+from .services.fair_queue import set_current_client
+from .services.rate_limiter import API_KEY_HEADER, client_id, route_group
+from .services.tracing import current_trace_id, tracer
+
+# brotli — необязательная зависимость: без неё клиенты получают gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# W3C traceparent: версия-trace_id-parent_id-флаги
+TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class TracingMiddleware:
+    """
+    ASGI-middleware, открывающее трассу на каждый HTTP-запрос.
+    Принимает идентификатор трассы из traceparent или X-Trace-Id и возвращает его в X-Trace-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = None
+        traceparent = _header(scope, b"traceparent")
+        if traceparent:
+            match = TRACEPARENT_RE.match(traceparent.strip().lower())
+            if match:
+                trace_id = match.group(1)
+        if trace_id is None:
+            incoming = _header(scope, b"x-trace-id")
+            if incoming and re.fullmatch(r"[0-9a-fA-F]{8,32}", incoming):
+                trace_id = incoming.lower()
+
+        with tracer.start_trace(f"{scope['method']} {scope['path']}", trace_id=trace_id,
+                                method=scope["method"], path=scope["path"]) as trace:
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    trace.root.set_attribute("status_code", message["status"])
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-trace-id", trace.trace_id.encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI-middleware для профилирования одного запроса через cProfile по заголовку X-Profile: 1
+    (только вместе с верным X-Admin-Token). Идентификатор результата возвращается в X-Profile-Id,
+    статистика доступна по /debug/profile/requests/{profile_id}.
+    cProfile видит поток цикла событий целиком, поэтому в статистику попадают и
+    параллельные запросы этого воркера; профилируйте на стенде без постороннего трафика.
+    """
+
+    def __init__(self, app):
+        # Профилировщик нужен только при включённом ENABLE_PROFILING
+        from .services.profiler import request_profiles
+        self.app = app
+        self.profiles = request_profiles
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (_header(scope, b"x-profile") or "").lower() not in ("1", "true"):
+            await self.app(scope, receive, send)
+            return
+
+        if not is_admin_token(_header(scope, b"x-admin-token")):
+            status = b"forbidden"
+        elif not self.profiles.active.acquire(blocking=False):
+            status = b"busy"
+        else:
+            status = None
+        if status is not None:
+            await self.app(scope, receive, _with_headers(send, [(b"x-profile-status", status)]))
+            return
+
+        profile_id = current_trace_id() or os.urandom(16).hex()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, _with_headers(send, [(b"x-profile-id", profile_id.encode("latin-1"))]))
+        finally:
+            profiler.disable()
+            self.profiles.active.release()
+            self.profiles.add(profile_id, profiler)
+
+
+def _with_headers(send, extra_headers):
+    async def send_with_headers(message):
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": list(message.get("headers", [])) + extra_headers}
+        await send(message)
+    return send_with_headers
+
+
+class RateLimitMiddleware:
+    """
+    ASGI-middleware, определяющее клиента запроса (ключ API из X-API-Key или IP-адрес) и
+    применяющее лимиты его группы маршрутов (explain, history). Клиент запоминается
+    в контексте запроса: по нему справедливая очередь распределяет вызовы LLM.
+    Превысившие лимит получают 429 с Retry-After, не доходя до обработчика.
+    Для WebSocket клиент только определяется: лимит применяется к каждому сообщению
+    explain в api/live.py, а не к установке соединения.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.api_key_header = API_KEY_HEADER.encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        client = client_id(
+            _header(scope, self.api_key_header),
+            _header(scope, b"x-forwarded-for"),
+            scope["client"][0] if scope.get("client") else None
+        )
+        set_current_client(client)
+        if scope["type"] == "websocket":
+            await self.app(scope, receive, send)
+            return
+        group = route_group(scope["method"], scope["path"])
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = scope["app"].state.container.rate_limiter
+        allowed, remaining, retry_after = limiter.acquire(client, group)
+        if remaining is None:
+            await self.app(scope, receive, send)
+            return
+        headers = [(b"x-ratelimit-limit", str(int(limiter.limits[group][1])).encode("latin-1")),
+                   (b"x-ratelimit-remaining", str(int(remaining)).encode("latin-1"))]
+        if allowed:
+            await self.app(scope, receive, _with_headers(send, headers))
+            return
+
+        body = b'{"detail":"Rate limit exceeded"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": headers + [
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1"))
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# Типы содержимого, которые имеет смысл сжимать (SSE не сжимается: события должны уходить сразу)
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/css", "text/plain", "text/markdown",
+                      "application/javascript", "text/javascript", "application/x-ndjson", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding: Optional[str], allow_brotli: bool = True) -> Optional[str]:
+    """
+    Выбирает кодировку по Accept-Encoding с учётом q-значений: br (если доступен), затем gzip
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = (["br"] if allow_brotli and brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda name: weights.get(name, wildcard))
+    return best if weights.get(best, wildcard) > 0 else None
+
+
+class _Encoder:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31: формат gzip (заголовок и контрольная сумма)
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._compressor.process(data)
+            return out + (self._compressor.finish() if final else self._compressor.flush())
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    ASGI-middleware сжатия ответов (br или gzip по Accept-Encoding).
+    Ответы меньше minimum_size, уже сжатые и несжимаемых типов передаются как есть.
+    Потоковые ответы сжимаются по частям со сбросом буфера после каждой части.
+    Сжатое представление отличается побайтно, поэтому сильный ETag становится слабым.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        encoding = None
+        if scope["type"] == "http" and scope["method"] != "HEAD":
+            encoding = choose_encoding(_header(scope, b"accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                headers = dict((k.lower(), v) for k, v in message.get("headers", []))
+                content_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip()
+                if (message["status"] in (204, 304) or b"content-encoding" in headers
+                        or content_type not in COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Заголовки отправляются вместе с первой частью тела, когда известен размер
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                start, start_message = start_message, None
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(_vary_accept_encoding(start))
+                    await send(message)
+                    return
+                encoder = _Encoder(encoding, self.gzip_level, self.brotli_quality)
+                body = encoder.compress(body, final=not more_body)
+                await send(_compressed_start(start, encoding, None if more_body else len(body)))
+            else:
+                body = encoder.compress(body, final=not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _vary_accept_encoding(message):
+    headers = list(message.get("headers", []))
+    for i, (key, value) in enumerate(headers):
+        if key.lower() == b"vary":
+            if b"accept-encoding" not in value.lower():
+                headers[i] = (key, value + b", Accept-Encoding")
+            break
+    else:
+        headers.append((b"vary", b"Accept-Encoding"))
+    return {**message, "headers": headers}
+
+
+def _compressed_start(message, encoding: str, content_length: Optional[int]):
+    headers = []
+    for key, value in _vary_accept_encoding(message)["headers"]:
+        name = key.lower()
+        if name == b"content-length":
+            continue
+        if name == b"etag" and not value.startswith(b"W/"):
+            value = b"W/" + value
+        headers.append((key, value))
+    headers.append((b"content-encoding", encoding.encode("latin-1")))
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode("latin-1")))
+    return {**message, "headers": headers}
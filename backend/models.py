@@ -1,3 +1,5 @@
+import re
+
 from pydantic import BaseModel, Field, validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
@@ -6,6 +8,9 @@ class CodeExplanationRequest(BaseModel):
     code_snippet: str = Field(..., description="Фрагмент кода, который нужно объяснить", min_length=1)
     language: Optional[str] = Field(None, description="Язык программирования (null/пусто для автоопределения)")
     complexity_level: str = Field(default="intermediate", description="Целевой уровень сложности объяснения")
+    all_levels: bool = Field(default=False, description="Сгенерировать объяснения сразу для всех уровней сложности")
+    allow_near_duplicate: bool = Field(default=True, description="Разрешить мгновенный ответ объяснением почти такого же фрагмента")
+    previous_snippet_hash: Optional[str] = Field(None, description="SHA-256 предыдущей версии фрагмента: объяснить заново только изменённые блоки")
     
     @validator('language')
     def validate_language(cls, v):
@@ -23,6 +28,30 @@ class CodeExplanationRequest(BaseModel):
         if v.lower() not in allowed_levels:
             raise ValueError(f'Уровень сложности должен быть одним из: {", ".join(allowed_levels)}')
         return v.lower()
+    
+    @validator('previous_snippet_hash')
+    def validate_previous_snippet_hash(cls, v):
+        if v is None:
+            return None
+        v = v.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', v):
+            raise ValueError('previous_snippet_hash должен быть SHA-256 в шестнадцатеричном виде')
+        return v
+
+class ExplainJobRequest(CodeExplanationRequest):
+    callback_url: Optional[str] = Field(None, description="URL, на который будет отправлен POST с итогом задачи", max_length=2000)
+    deadline_seconds: Optional[int] = Field(None, ge=1, le=86400, description="Срок выполнения задачи, секунд")
+    max_attempts: Optional[int] = Field(None, ge=1, le=10, description="Число попыток при ошибках LLM")
+    
+    @validator('callback_url')
+    def validate_callback_url(cls, v):
+        if v is not None and not v.startswith(('http://', 'https://')):
+            raise ValueError('callback_url должен начинаться с http:// или https://')
+        return v
+
+class ExplainJobResponse(BaseModel):
+    success: bool
+    job: Dict[str, Any]
 
 class CodeExplanationResponse(BaseModel):
     success: bool
@@ -32,6 +61,10 @@ class CodeExplanationResponse(BaseModel):
     code_summary: Optional[Dict[str, Any]] = None
     validation_info: Optional[Dict[str, Any]] = None
     processing_time: Optional[float] = None
+    explanations: Optional[Dict[str, str]] = None
+    cached: bool = False
+    near_duplicate: Optional[Dict[str, Any]] = None
+    incremental: Optional[Dict[str, Any]] = None
 
 class HistoryItem(BaseModel):
     id: int
@@ -41,7 +74,7 @@ class HistoryItem(BaseModel):
     complexity_level: str
     created_at: datetime
     is_favorite: bool = False
-    tags: Optional[str] = None
+    tags: List[str] = []
     
     class Config:
         from_attributes = True
@@ -53,15 +86,30 @@ class HistoryResponse(BaseModel):
     page: int
     per_page: int
     total_pages: int
+    # Самые частые теги среди отфильтрованных объяснений (тег и число объяснений)
+    tag_facets: Optional[List[Dict[str, Any]]] = None
+
+class SemanticSearchItem(HistoryItem):
+    score: float
+
+class SemanticSearchResponse(BaseModel):
+    success: bool
+    query: str
+    results: List[SemanticSearchItem]
+    indexed_count: int
 
 class HistoryFilter(BaseModel):
     language: Optional[str] = None
     complexity_level: Optional[str] = None
     is_favorite: Optional[bool] = None
     search_term: Optional[str] = None
+    tags: Optional[List[str]] = None
     page: int = Field(default=1, ge=1)
     per_page: int = Field(default=10, ge=1, le=100)
 
+class TagsRequest(BaseModel):
+    tags: List[str] = Field(..., description="Теги объяснения; заменяют прежние", max_length=20)
+
 class FavoriteRequest(BaseModel):
     explanation_id: int
     is_favorite: bool
@@ -71,4 +119,9 @@ class APIHealthResponse(BaseModel):
     timestamp: datetime
     version: str
     llm_service_status: str
-    database_status: str
\ No newline at end of file
+    database_status: str
+    database_latency_ms: Optional[float] = None
+    llm_latency_ms: Optional[float] = None
+    llm_mode: Optional[str] = None
+    queue_depth: Optional[Dict[str, int]] = None
+    cache_hit_rate: Optional[float] = None
\ No newline at end of file
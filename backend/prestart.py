@@ -0,0 +1,47 @@
+"""
+Однократная подготовка перед запуском воркеров.
+
+Выполняется главным процессом лаунчера (run.py --prod) до создания воркеров:
+создаёт таблицы во всех шардах истории, переводит SQLite в режим WAL и удаляет из общего кэша
+записи другого режима LLM и старых версий формата. Воркеры видят PRESTART_DONE_ENV
+и пропускают эти шаги, поэтому не конкурируют за схему базы при старте.
+DEPLOY_ID_ENV — идентификатор запуска, общий для всех воркеров (и перезапущенных мастером):
+по нему прогрев кэшей выполняет один воркер.
+
+Запуск вручную: python -m backend.prestart
+"""
+
+import os
+import uuid
+from typing import Optional
+
+PRESTART_DONE_ENV = "CODE_EXPLAINER_PRESTART_DONE"
+DEPLOY_ID_ENV = "CODE_EXPLAINER_DEPLOY_ID"
+
+
+def prestart_done() -> bool:
+    return os.getenv(PRESTART_DONE_ENV) == "1"
+
+
+def deploy_id() -> Optional[str]:
+    return os.getenv(DEPLOY_ID_ENV)
+
+
+def run_prestart():
+    from .services.history_shards import HistoryShards
+    from .services.shared_cache import drop_stale_namespaces
+
+    shards = HistoryShards.from_env()
+    shards.create_tables()
+    # Соединение открывается с прагмами из database.py (WAL, busy_timeout)
+    with shards.engines[0].connect() as connection:
+        journal_mode = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+    shards.dispose()
+    drop_stale_namespaces()
+    os.environ[PRESTART_DONE_ENV] = "1"
+    os.environ[DEPLOY_ID_ENV] = uuid.uuid4().hex
+    return journal_mode
+
+
+if __name__ == "__main__":
+    print(f"Подготовка завершена, режим журнала SQLite: {run_prestart()}")
@@ -0,0 +1,22 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+# orjson — необязательная зависимость: без неё используется стандартный json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Класс ответа по умолчанию для всех эндпойнтов приложения
+DefaultJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+
+def dumps(payload: Any) -> bytes:
+    """
+    Сериализует ответ в компактный JSON (UTF-8 без экранирования не-ASCII символов)
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
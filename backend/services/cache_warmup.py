@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from ..prestart import deploy_id
+from .metrics import CACHE_WARMUP_ENTRIES
+from .shared_cache import SharedSQLiteCache
+
+logger = logging.getLogger(__name__)
+
+# Частые фрагменты среди последних scan_rows записей шарда: число запросов и самое свежее
+# объяснение (в SQLite остальные столбцы группы берутся из строки с max(id))
+HOT_SNIPPETS_SQL = text(
+    "SELECT code_snippet, language, complexity_level, explanation, created_at, "
+    "count(*) AS requests, max(id) AS last_id "
+    "FROM (SELECT id, code_snippet, language, complexity_level, explanation, created_at "
+    "      FROM code_explanations ORDER BY id DESC LIMIT :scan_rows) "
+    "GROUP BY code_snippet, language, complexity_level "
+    "ORDER BY requests DESC, last_id DESC LIMIT :limit"
+)
+
+
+class CacheWarmer:
+    """
+    Прогрев кэшей после запуска. История объяснений — журнал запросов, поэтому самые
+    частые и свежие (фрагмент, язык, уровень) в последних записях — те, что придут первыми
+    после перезапуска. Их объяснения и результаты анализа кладутся в кэши в фоновом потоке
+    с ограничением по времени: готовность приложения не ждёт прогрева.
+
+    При нескольких воркерах с общим кэшем прогревает один из них: первый, кому удалось
+    записать отметку run_id в marker (общий кэш). Остальные не повторяют ни выборку,
+    ни анализ — их промахи в памяти процесса находят прогретые записи в общем кэше.
+    Без общего кэша (или без run_id, т.е. без prestart) каждый процесс греет свою память.
+    """
+
+    def __init__(self, enabled: bool = True, max_entries: int = 256, scan_rows: int = 20000,
+                 time_budget: float = 20.0, marker: Optional[SharedSQLiteCache] = None,
+                 run_id: Optional[str] = None):
+        self.enabled = enabled and max_entries > 0
+        self.max_entries = max_entries
+        self.scan_rows = scan_rows
+        self.time_budget = time_budget
+        self.marker = marker if run_id else None
+        self.run_id = run_id
+        self.stats: Dict[str, Any] = {"status": "disabled" if not self.enabled else "pending"}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, cache_size: int) -> "CacheWarmer":
+        """
+        cache_size — размер кэша объяснений в памяти: прогревать больше записей бессмысленно
+        """
+        return cls(
+            enabled=os.getenv("WARMUP_ENABLED", "true").lower() == "true",
+            max_entries=min(int(os.getenv("WARMUP_MAX_ENTRIES", "256")), cache_size),
+            scan_rows=int(os.getenv("WARMUP_SCAN_ROWS", "20000")),
+            time_budget=float(os.getenv("WARMUP_TIME_BUDGET_SECONDS", "20")),
+            marker=SharedSQLiteCache.from_env("warmup") if cache_size > 0 else None,
+            run_id=deploy_id()
+        )
+
+    def claim(self) -> bool:
+        """
+        True, если прогрев этого запуска выполняет текущий процесс
+        """
+        if self.marker is None:
+            return True
+        return self.marker.add(self.run_id, {"status": "running", "pid": os.getpid(), "started_at": time.time()})
+
+    def hot_snippets(self, session_factories: List[Callable[[], Any]]) -> List[Dict[str, Any]]:
+        """
+        Кандидаты прогрева из всех шардов истории: по числу запросов, затем по свежести
+        """
+        entries = []
+        for session_factory in session_factories:
+            with session_factory() as db:
+                rows = db.execute(HOT_SNIPPETS_SQL, {"scan_rows": self.scan_rows, "limit": self.max_entries})
+                entries.extend(dict(row._mapping) for row in rows)
+        entries.sort(key=lambda entry: (entry["requests"], str(entry["created_at"])), reverse=True)
+        return entries[:self.max_entries]
+
+    def warm(self, session_factories: List[Callable[[], Any]], warm_entry: Callable[[Dict[str, Any]], bool]) -> Dict[str, Any]:
+        """
+        Прогревает кэши до исчерпания кандидатов или time_budget секунд.
+        warm_entry(entry) кладёт запись в кэши и возвращает False, если запись пропущена.
+        """
+        start = time.monotonic()
+        if not self.claim():
+            self.stats = {"status": "shared", "warmed": 0, "skipped": 0, "candidates": 0, "seconds": 0.0}
+            return self.stats
+        self.stats = {"status": "running", "warmed": 0, "skipped": 0}
+        entries = self.hot_snippets(session_factories)
+        self.stats["candidates"] = len(entries)
+        for entry in entries:
+            if self._stop.is_set() or time.monotonic() - start >= self.time_budget:
+                self.stats["status"] = "stopped" if self._stop.is_set() else "budget_exhausted"
+                break
+            try:
+                result = "warmed" if warm_entry(entry) else "skipped"
+            except Exception as e:
+                logger.warning("Cache warmup entry failed: %s", e)
+                result = "skipped"
+            self.stats[result] += 1
+            CACHE_WARMUP_ENTRIES.labels(result).inc()
+        else:
+            self.stats["status"] = "done"
+        self.stats["seconds"] = round(time.monotonic() - start, 3)
+        if self.marker is not None:
+            self.marker.set(self.run_id, dict(self.stats, pid=os.getpid()))
+        return self.stats
+
+    def start(self, session_factories: List[Callable[[], Any]], warm_entry: Callable[[Dict[str, Any]], bool]):
+        """
+        Прогрев в фоновом потоке (не задерживает старт и готовность приложения)
+        """
+        if not self.enabled or self._thread is not None:
+            return
+
+        def run():
+            try:
+                stats = self.warm(session_factories, warm_entry)
+                if stats["status"] == "shared":
+                    logger.info("Cache warmup is done by another worker, using the shared cache")
+                    return
+                logger.info("Cache warmup %s: %d of %d hot snippets warmed in %.1fs",
+                            stats["status"], stats["warmed"], stats["candidates"], stats["seconds"])
+            except Exception as e:
+                self.stats["status"] = "failed"
+                logger.warning("Cache warmup failed: %s", e)
+
+        self._thread = threading.Thread(target=run, name="cache-warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.marker is not None:
+            self.marker.close()
@@ -1,6 +1,8 @@
 import re
 from typing import Dict, Optional, List, Any
 
+from .tracing import tracer
+
 class CodeAnalyzer:
     """
     Утилитный класс для анализа и валидации фрагментов кода
@@ -71,13 +73,110 @@ class CodeAnalyzer:
         'bash': 'bash'
     }
     
+    # Языки, в которых # начинает комментарий (в C/C++ это директива препроцессора)
+    HASH_COMMENT_LANGUAGES = {'python', 'ruby', 'bash', 'php'}
+    
+    # Ключевые слова сохраняются при нормализации, остальные идентификаторы переименовываются
+    KEYWORDS = frozenset({
+        'if', 'else', 'elif', 'for', 'while', 'do', 'switch', 'case', 'default', 'break', 'continue',
+        'return', 'yield', 'def', 'class', 'function', 'fn', 'func', 'lambda', 'const', 'let', 'var',
+        'import', 'from', 'as', 'package', 'using', 'namespace', 'include', 'public', 'private',
+        'protected', 'static', 'final', 'void', 'int', 'long', 'float', 'double', 'char', 'bool',
+        'boolean', 'string', 'struct', 'enum', 'interface', 'extends', 'implements', 'new', 'delete',
+        'try', 'catch', 'except', 'finally', 'throw', 'throws', 'raise', 'with', 'in', 'not', 'and',
+        'or', 'is', 'None', 'null', 'nullptr', 'nil', 'true', 'false', 'True', 'False', 'this', 'self',
+        'async', 'await', 'pass', 'end', 'then', 'fi', 'select', 'where', 'group', 'by', 'order',
+        'del', 'assert', 'global', 'nonlocal', 'typeof', 'instanceof', 'sizeof', 'unsigned', 'short',
+        'byte', 'echo', 'impl', 'pub', 'mut', 'match', 'defer', 'go', 'chan', 'type', 'auto',
+        'SELECT', 'FROM', 'WHERE', 'GROUP', 'BY', 'ORDER', 'JOIN', 'ON', 'AS', 'AND', 'OR', 'NOT'
+    })
+    
+    # Имя после этих слов объявляется в самом фрагменте и нормализуется как переменная
+    DECLARATION_KEYWORDS = frozenset({'def', 'class', 'function', 'func', 'fn', 'struct', 'interface', 'enum'})
+    
+    _TOKEN_PATTERNS: Dict[str, "re.Pattern"] = {}
+    
+    @staticmethod
+    def _token_pattern(language: Optional[str]) -> "re.Pattern":
+        pattern = CodeAnalyzer._TOKEN_PATTERNS.get(language)
+        if pattern is None:
+            comments = [r'//[^\n]*', r'/\*.*?\*/']
+            if language in CodeAnalyzer.HASH_COMMENT_LANGUAGES:
+                comments.append(r'\#[^\n]*')
+            if language == 'sql':
+                comments.append(r'--[^\n]*')
+            pattern = re.compile(
+                r'(?P<comment>' + '|'.join(comments) + r')'
+                r'|(?P<string>"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`)'
+                r'|(?P<number>\d[\w.]*)'
+                r'|(?P<ident>[A-Za-z_$][\w$]*)'
+                r'|(?P<op>\S)',
+                re.S
+            )
+            CodeAnalyzer._TOKEN_PATTERNS[language] = pattern
+        return pattern
+    
     @staticmethod
+    def normalize_tokens(code_snippet: str, language: Optional[str] = None) -> List[str]:
+        """
+        Нормализованный поток токенов для поиска почти одинаковых фрагментов:
+        без пробелов и комментариев, литералы заменены на STR/NUM, имена переменных —
+        на v0, v1, ... в порядке появления (как и имена объявленных во фрагменте функций
+        и классов). Ключевые слова, имена внешних функций и атрибутов (перед «(» или
+        после «.») сохраняются: они определяют смысл кода.
+        """
+        tokens: List[str] = []
+        renamed: Dict[str, str] = {}
+        matches = list(CodeAnalyzer._token_pattern(language).finditer(code_snippet))
+        for i, match in enumerate(matches):
+            kind = match.lastgroup
+            if kind == 'comment':
+                continue
+            if kind == 'string':
+                # Соседние литералы (тройные кавычки Python, 'it''s' в SQL) считаются одним
+                if not tokens or tokens[-1] != 'STR':
+                    tokens.append('STR')
+            elif kind == 'number':
+                tokens.append('NUM')
+            elif kind == 'ident':
+                name = match.group()
+                previous = tokens[-1] if tokens else ''
+                following = matches[i + 1].group() if i + 1 < len(matches) else ''
+                if name in CodeAnalyzer.KEYWORDS:
+                    tokens.append(name)
+                elif name in renamed or previous in CodeAnalyzer.DECLARATION_KEYWORDS:
+                    tokens.append(renamed.setdefault(name, f"v{len(renamed)}"))
+                elif following == '(' or previous == '.':
+                    tokens.append(name)
+                else:
+                    tokens.append(renamed.setdefault(name, f"v{len(renamed)}"))
+            else:
+                tokens.append(match.group())
+        return tokens
+    
+    @staticmethod
+    @tracer.traced("analyzer.detect_language")
     def detect_language(code_snippet: str, suggested_language: str = None) -> str:
         """
         Определяет язык программирования на основе фрагмента кода
         """
         code_snippet = code_snippet.strip()
+        explicit = CodeAnalyzer.explicit_language(code_snippet, suggested_language)
+        if explicit:
+            return explicit
         
+        # Оценка по набранным очкам — надёжнее, чем первое совпадение
+        language_scores = CodeAnalyzer.merge_language_scores([
+            CodeAnalyzer.language_scores(chunk) for chunk in CodeAnalyzer.split_chunks(code_snippet)
+        ])
+        return CodeAnalyzer.language_from_scores(language_scores)
+    
+    @staticmethod
+    def explicit_language(code_snippet: str, suggested_language: str = None) -> Optional[str]:
+        """
+        Язык, указанный пользователем или комментарием с расширением в первой строке
+        (код без начальных пробелов); None — язык нужно определять по очкам
+        """
         # Обрабатываем режим автоопределения или пустое значение
         if not suggested_language or suggested_language.lower() in ('auto', 'auto-detect', ''):
             suggested_language = None
@@ -92,12 +191,16 @@ class CodeAnalyzer:
             ext = extension_match.group(1).lower()
             if ext in CodeAnalyzer.EXTENSION_MAPPING:
                 return CodeAnalyzer.EXTENSION_MAPPING[ext]
-        
-        # Оценка по набранным очкам — надёжнее, чем первое совпадение
-        language_scores = {}
-        
+        return None
+    
+    @staticmethod
+    def language_scores(code_snippet: str) -> List[int]:
+        """
+        Очки языков (в порядке LANGUAGE_PATTERNS) для части кода
+        """
+        scores = []
         # Подсчитываем очки для каждого языка на основе совпадений
-        for language, patterns in CodeAnalyzer.LANGUAGE_PATTERNS.items():
+        for patterns in CodeAnalyzer.LANGUAGE_PATTERNS.values():
             score = 0
             for pattern in patterns:
                 matches = re.findall(pattern, code_snippet, re.MULTILINE)
@@ -108,9 +211,16 @@ class CodeAnalyzer:
                     # Шаблоны с ::, * или # — более показательные
                     weight = 2 if ('::' in pattern or '*' in pattern or '#' in pattern) else 1
                     score += len(matches) * weight
-            if score > 0:
-                language_scores[language] = score
-        
+            scores.append(score)
+        return scores
+    
+    @staticmethod
+    def merge_language_scores(parts: List[List[int]]) -> Dict[str, int]:
+        totals = [sum(column) for column in zip(*parts)]
+        return {language: score for language, score in zip(CodeAnalyzer.LANGUAGE_PATTERNS, totals) if score > 0}
+    
+    @staticmethod
+    def language_from_scores(language_scores: Dict[str, int]) -> str:
         # Возвращаем язык с максимальным количеством баллов, иначе python
         if language_scores:
             detected = max(language_scores.items(), key=lambda x: x[1])[0]
@@ -120,6 +230,7 @@ class CodeAnalyzer:
         return "python"
     
     @staticmethod
+    @tracer.traced("analyzer.validate_code")
     def validate_code(code_snippet: str, language: str) -> Dict[str, any]:
         """
         Базовая валидация фрагмента кода
@@ -219,95 +330,171 @@ class CodeAnalyzer:
         
         return result
     
+    # Управляющие конструкции, которые учитываются в кратком описании
+    CONTROL_PATTERNS = {
+        'if': r'\bif\s*\(',
+        'for': r'\bfor\s*\(',
+        'while': r'\bwhile\s*\(',
+        'switch': r'\bswitch\s*\(',
+        'try': r'\btry\s*\{'
+    }
+    
+    # Объявления ключевых переменных
+    VARIABLE_PATTERNS = {
+        'python': r'(?:self\.)?(\w+)\s*=',
+        'javascript': r'(?:const|let|var)\s+(\w+)',
+        'java': r'(?:int|String|boolean|float|double)\s+(\w+)',
+        'cpp': r'(?:int|string|bool|float|double|char)\s+(\w+)'
+    }
+    
+    # Используемые операции: шаблон, название, флаги
+    OPERATION_PATTERNS = [
+        (r'\+\+|\-\-|[\+\-\*/%=]', "арифметические операции", 0),
+        (r'(?:==|!=|<=|>=|<|>|&&|\|\|)', "операции сравнения", 0),
+        (r'(?:\.(?:add|remove|push|pop|insert|delete|find|get|set))', "операции с структурами данных", re.IGNORECASE),
+        (r'(?:new\s+\w+|malloc|calloc)', "выделение памяти", 0),
+        (r'(?:delete|free|delete\[\])', "освобождение памяти", 0),
+    ]
+    
+    # Назначение кода по ключевым словам: правила проверяются по порядку, срабатывает первое
+    PURPOSE_RULES = [
+        # Управление памятью
+        (('delete', 'free', 'clear', 'release', 'nullptr'), "Управление памятью и очистка"),
+        (('new', 'malloc', 'allocate'), "Выделение памяти"),
+        # Структуры данных
+        (('sort', 'order', 'arrange', 'sorted'), "Сортировка или упорядочивание данных"),
+        (('search', 'find', 'lookup', 'contains'), "Поиск элементов"),
+        (('insert', 'add', 'push', 'append'), "Добавление элементов в структуры данных"),
+        (('remove', 'delete', 'pop'), "Удаление элементов из структур данных"),
+        # Алгоритмы
+        (('calculate', 'compute', 'sum', 'count', 'total'), "Математические вычисления"),
+        (('fibonacci', 'factorial', 'recursive'), "Реализация рекурсивного алгоритма"),
+        # Ввод/вывод
+        (('input', 'output', 'read', 'write', 'print', 'cout', 'cin'), "Операции ввода-вывода"),
+    ]
+    
     @staticmethod
+    @tracer.traced("analyzer.extract_code_summary")
     def extract_code_summary(code_snippet: str, language: str) -> Dict[str, Any]:
         """
         Формирует подробное описание того, что делает код
         """
-        summary = {
-            "purpose": "Неизвестная функциональность",
-            "complexity": "Простая",
-            "key_functions": [],
-            "control_structures": [],
-            "key_variables": [],
-            "operations": [],
-            "patterns": []
-        }
-        
-        lines = code_snippet.split('\n')
-        non_empty_lines = [line.strip() for line in lines if line.strip() and not line.strip().startswith(('//', '/*', '#', '*'))]
+        facts = CodeAnalyzer.merge_summary_facts([
+            CodeAnalyzer.summary_facts(chunk, language) for chunk in CodeAnalyzer.split_chunks(code_snippet)
+        ])
+        return CodeAnalyzer.summary_from_facts(facts, len(code_snippet.split('\n')))
+    
+    @staticmethod
+    def split_chunks(code_snippet: str) -> List[str]:
+        """
+        Делит код на части, каждая из которых заканчивается пустой строкой (или концом кода).
+        Очки языков и признаки краткого описания считаются по частям и складываются:
+        шаблоны не захватывают соседние абзацы кода, а при правке в редакторе
+        пересчитываются только изменённые части (см. LiveAnalysis).
+        """
+        chunks = []
+        current = []
+        for line in code_snippet.split('\n'):
+            current.append(line)
+            if not line.strip():
+                chunks.append('\n'.join(current))
+                current = []
+        chunks.append('\n'.join(current))
+        return chunks
+    
+    @staticmethod
+    def summary_facts(code_snippet: str, language: str) -> Dict[str, Any]:
+        """
+        Признаки части кода для краткого описания (складываются через merge_summary_facts)
+        """
+        functions: List[str] = []
+        # Стрелочные функции JavaScript идут в списке после обычных
+        arrow_functions: List[str] = []
+        classes: List[str] = []
         
         # Извлекаем имена функций в зависимости от языка
         if language == "python":
             functions = re.findall(r'def\s+(\w+)\s*\(', code_snippet)
-            classes = re.findall(r'class\s+(\w+)', code_snippet)
-            summary["key_functions"] = functions[:5]
-            if classes:
-                summary["patterns"].append(f"Определяет {len(classes)} класс(ов): {', '.join(classes)}")
         elif language == "javascript":
             functions = re.findall(r'function\s+(\w+)\s*\(', code_snippet)
             arrow_functions = re.findall(r'(?:const|let|var)\s+(\w+)\s*=\s*[^(]*=>', code_snippet)
-            classes = re.findall(r'class\s+(\w+)', code_snippet)
-            summary["key_functions"] = (functions + arrow_functions)[:5]
-            if classes:
-                summary["patterns"].append(f"Определяет {len(classes)} класс(ов): {', '.join(classes)}")
         elif language == "java":
-            classes = re.findall(r'class\s+(\w+)', code_snippet)
-            methods = re.findall(r'(?:public|private|protected)?\s*\w+\s+(\w+)\s*\(', code_snippet)
-            summary["key_functions"] = methods[:5]
-            if classes:
-                summary["patterns"].append(f"Определяет {len(classes)} класс(ов): {', '.join(classes)}")
+            functions = re.findall(r'(?:public|private|protected)?\s*\w+\s+(\w+)\s*\(', code_snippet)
         elif language == "cpp":
             functions = re.findall(r'(?:void|int|bool|string|char|float|double|\w+)\s+(\w+)\s*\(', code_snippet)
+        if language in ("python", "javascript", "java", "cpp"):
             classes = re.findall(r'class\s+(\w+)', code_snippet)
-            summary["key_functions"] = functions[:5]
-            if classes:
-                summary["patterns"].append(f"Определяет {len(classes)} класс(ов): {', '.join(classes)}")
-        
-        # Определяем используемые управляющие конструкции
-        control_patterns = {
-            'if': r'\bif\s*\(',
-            'for': r'\bfor\s*\(',
-            'while': r'\bwhile\s*\(',
-            'switch': r'\bswitch\s*\(',
-            'try': r'\btry\s*\{'
-        }
-        for struct_name, pattern in control_patterns.items():
-            matches = re.findall(pattern, code_snippet, re.IGNORECASE)
-            if matches:
-                summary["control_structures"].append(f"{len(matches)} конструкций {struct_name}")
-        
-        # Извлекаем ключевые переменные (объявления)
-        var_patterns = {
-            'python': r'(?:self\.)?(\w+)\s*=',
-            'javascript': r'(?:const|let|var)\s+(\w+)',
-            'java': r'(?:int|String|boolean|float|double)\s+(\w+)',
-            'cpp': r'(?:int|string|bool|float|double|char)\s+(\w+)'
-        }
-        pattern = var_patterns.get(language)
+        
+        # Извлекаем ключевые переменные (объявления) без ключевых слов
+        variables = []
+        pattern = CodeAnalyzer.VARIABLE_PATTERNS.get(language)
         if pattern:
-            variables = re.findall(pattern, code_snippet)
-            # Убираем ключевые слова и имена функций
             keywords = {'if', 'for', 'while', 'return', 'def', 'class', 'import', 'from'}
-            key_vars = [v for v in variables if v not in keywords and len(v) > 2][:8]
-            summary["key_variables"] = key_vars
-        
-        # Определяем используемые операции
-        operations = []
-        if re.search(r'\+\+|\-\-|[\+\-\*/%=]', code_snippet):
-            operations.append("арифметические операции")
-        if re.search(r'(?:==|!=|<=|>=|<|>|&&|\|\|)', code_snippet):
-            operations.append("операции сравнения")
-        if re.search(r'(?:\.(?:add|remove|push|pop|insert|delete|find|get|set))', code_snippet, re.IGNORECASE):
-            operations.append("операции с структурами данных")
-        if re.search(r'(?:new\s+\w+|malloc|calloc)', code_snippet):
-            operations.append("выделение памяти")
-        if re.search(r'(?:delete|free|delete\[\])', code_snippet):
-            operations.append("освобождение памяти")
-        summary["operations"] = operations
+            variables = [v for v in re.findall(pattern, code_snippet) if v not in keywords and len(v) > 2]
+        
+        code_lower = code_snippet.lower()
+        return {
+            "functions": functions,
+            "arrow_functions": arrow_functions,
+            "classes": classes,
+            "controls": [
+                len(re.findall(pattern, code_snippet, re.IGNORECASE))
+                for pattern in CodeAnalyzer.CONTROL_PATTERNS.values()
+            ],
+            "variables": variables,
+            "operations": [
+                bool(re.search(pattern, code_snippet, flags))
+                for pattern, _, flags in CodeAnalyzer.OPERATION_PATTERNS
+            ],
+            "purposes": [any(word in code_lower for word in words) for words, _ in CodeAnalyzer.PURPOSE_RULES],
+            "loops": len(re.findall(r'\bfor\s*\(|\bwhile\s*\(', code_snippet))
+        }
+    
+    @staticmethod
+    def merge_summary_facts(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Складывает признаки частей фрагмента в порядке их следования
+        """
+        merged = {
+            "functions": [], "arrow_functions": [], "classes": [], "variables": [],
+            "controls": [0] * len(CodeAnalyzer.CONTROL_PATTERNS),
+            "operations": [False] * len(CodeAnalyzer.OPERATION_PATTERNS),
+            "purposes": [False] * len(CodeAnalyzer.PURPOSE_RULES),
+            "loops": 0
+        }
+        for facts in parts:
+            for key in ("functions", "arrow_functions", "classes", "variables"):
+                merged[key].extend(facts[key])
+            merged["controls"] = [a + b for a, b in zip(merged["controls"], facts["controls"])]
+            merged["operations"] = [a or b for a, b in zip(merged["operations"], facts["operations"])]
+            merged["purposes"] = [a or b for a, b in zip(merged["purposes"], facts["purposes"])]
+            merged["loops"] += facts["loops"]
+        return merged
+    
+    @staticmethod
+    def summary_from_facts(facts: Dict[str, Any], line_count: int) -> Dict[str, Any]:
+        """
+        Собирает краткое описание из признаков кода
+        """
+        summary = {
+            "purpose": "Неизвестная функциональность",
+            "complexity": "Простая",
+            "key_functions": (facts["functions"] + facts["arrow_functions"])[:5],
+            "control_structures": [
+                f"{count} конструкций {name}"
+                for name, count in zip(CodeAnalyzer.CONTROL_PATTERNS, facts["controls"]) if count
+            ],
+            "key_variables": facts["variables"][:8],
+            "operations": [
+                name for (_, name, _), found in zip(CodeAnalyzer.OPERATION_PATTERNS, facts["operations"]) if found
+            ],
+            "patterns": []
+        }
+        classes = facts["classes"]
+        if classes:
+            summary["patterns"].append(f"Определяет {len(classes)} класс(ов): {', '.join(classes)}")
         
         # Определяем уровень сложности
-        line_count = len(lines)
         function_count = len(summary["key_functions"])
         control_count = len(summary["control_structures"])
         
@@ -319,37 +506,13 @@ class CodeAnalyzer:
             summary["complexity"] = "Простая"
         
         # Дополнительное определение назначения кода
-        code_lower = code_snippet.lower()
-        
-        # Управление памятью
-        if any(word in code_lower for word in ['delete', 'free', 'clear', 'release', 'nullptr']):
-            summary["purpose"] = "Управление памятью и очистка"
-        elif any(word in code_lower for word in ['new', 'malloc', 'allocate']):
-            summary["purpose"] = "Выделение памяти"
-        
-        # Структуры данных
-        elif any(word in code_lower for word in ['sort', 'order', 'arrange', 'sorted']):
-            summary["purpose"] = "Сортировка или упорядочивание данных"
-        elif any(word in code_lower for word in ['search', 'find', 'lookup', 'contains']):
-            summary["purpose"] = "Поиск элементов"
-        elif any(word in code_lower for word in ['insert', 'add', 'push', 'append']):
-            summary["purpose"] = "Добавление элементов в структуры данных"
-        elif any(word in code_lower for word in ['remove', 'delete', 'pop']):
-            summary["purpose"] = "Удаление элементов из структур данных"
-        
-        # Алгоритмы
-        elif any(word in code_lower for word in ['calculate', 'compute', 'sum', 'count', 'total']):
-            summary["purpose"] = "Математические вычисления"
-        elif any(word in code_lower for word in ['fibonacci', 'factorial', 'recursive']):
-            summary["purpose"] = "Реализация рекурсивного алгоритма"
-        
-        # Ввод/вывод
-        elif any(word in code_lower for word in ['input', 'output', 'read', 'write', 'print', 'cout', 'cin']):
-            summary["purpose"] = "Операции ввода-вывода"
-        
-        # Итерации
-        elif re.search(r'\bfor\s*\(|\bwhile\s*\(', code_snippet):
-            if len([m for m in re.finditer(r'\bfor\s*\(|\bwhile\s*\(', code_snippet)]) > 1:
+        for (_, purpose), found in zip(CodeAnalyzer.PURPOSE_RULES, facts["purposes"]):
+            if found:
+                summary["purpose"] = purpose
+                break
+        else:
+            # Итерации
+            if facts["loops"] > 1:
                 summary["purpose"] = "Итерационная обработка с циклами"
         
         # Если цель всё ещё неизвестна, пробуем определить по именам функций
@@ -362,4 +525,226 @@ class CodeAnalyzer:
             elif any(word in func_names for word in ['clear', 'clean', 'reset']):
                 summary["purpose"] = "Сброс или очистка данных"
         
-        return summary
\ No newline at end of file
+        return summary
+    
+    # Теги, которые предлагаются по назначению кода из краткого описания
+    PURPOSE_TAGS = {
+        "Управление памятью и очистка": "memory-management",
+        "Выделение памяти": "memory-allocation",
+        "Сортировка или упорядочивание данных": "sorting",
+        "Поиск элементов": "search",
+        "Добавление элементов в структуры данных": "data-structures",
+        "Удаление элементов из структур данных": "data-structures",
+        "Математические вычисления": "math",
+        "Реализация рекурсивного алгоритма": "recursion",
+        "Операции ввода-вывода": "io",
+        "Итерационная обработка с циклами": "iteration",
+        "Получение данных": "data-access",
+        "Изменение данных": "data-access",
+        "Сброс или очистка данных": "cleanup"
+    }
+    
+    # Теги по операциям; арифметика и сравнения есть почти в любом коде и не помечаются
+    OPERATION_TAGS = {
+        "операции с структурами данных": "data-structures",
+        "выделение памяти": "memory-allocation",
+        "освобождение памяти": "memory-management"
+    }
+    
+    @staticmethod
+    def suggest_tags(code_summary: Optional[Dict[str, Any]]) -> List[str]:
+        """
+        Теги объяснения по краткому описанию кода: назначение, операции, шаблоны
+        (классы) и обработка ошибок
+        """
+        if not code_summary:
+            return []
+        tags = []
+        purpose_tag = CodeAnalyzer.PURPOSE_TAGS.get(code_summary.get("purpose"))
+        if purpose_tag:
+            tags.append(purpose_tag)
+        for operation in code_summary.get("operations", []):
+            if operation in CodeAnalyzer.OPERATION_TAGS:
+                tags.append(CodeAnalyzer.OPERATION_TAGS[operation])
+        if any(pattern.startswith("Определяет") for pattern in code_summary.get("patterns", [])):
+            tags.append("classes")
+        if any(control.endswith(" try") for control in code_summary.get("control_structures", [])):
+            tags.append("error-handling")
+        if code_summary.get("complexity") == "Сложная":
+            tags.append("complex")
+        return list(dict.fromkeys(tags))
+    
+    # Языки, в которых блоки кода выделяются фигурными скобками
+    BRACE_LANGUAGES = {'javascript', 'typescript', 'java', 'cpp', 'c', 'csharp', 'go', 'rust', 'php'}
+    
+    # Объявления, с которых начинается отдельный блок (имя — первая группа)
+    BLOCK_DECLARATIONS = [
+        (re.compile(r'\b(?:class|struct|interface|enum|trait|impl)\s+(\w+)'), 'class'),
+        (re.compile(r'\bfunction\s*\*?\s*(\w+)\s*\('), 'function'),
+        (re.compile(r'\b(?:const|let|var)\s+(\w+)\s*=.*=>'), 'function'),
+        (re.compile(r'\bfunc\s+(?:\([^)]*\)\s*)?(\w+)\s*\('), 'function'),
+        (re.compile(r'\bfn\s+(\w+)'), 'function'),
+        # Метод или функция C-подобного языка: «тип имя(параметры) {»
+        (re.compile(r'^\s*(?:[\w<>\[\],*&:~]+\s+)*(\w+)\s*\([^;]*\)\s*(?:const\s*)?(?:throws\s+[\w.,\s]+)?\{?\s*$'), 'function'),
+    ]
+    BLOCK_CONTROL_WORDS = frozenset({'if', 'for', 'while', 'switch', 'catch', 'return', 'else', 'do', 'try', 'sizeof', 'new'})
+    # Строковые литералы и однострочные комментарии не учитываются при подсчёте скобок
+    _BRACE_NOISE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`|//.*$')
+    _PYTHON_DECLARATION = re.compile(r'\s*(?:async\s+def|def|class)\s+(\w+)')
+    
+    @staticmethod
+    def split_blocks(code_snippet: str, language: str) -> List[Dict[str, Any]]:
+        """
+        Делит фрагмент на блоки верхнего уровня — функции и классы (методы класса
+        выделяются в отдельные блоки «Класс.метод»); остальной код верхнего уровня
+        собирается в блок <module>. Блоки возвращаются в порядке появления:
+        name, kind (function, class, module), start_line (с 1) и code.
+        Для остальных языков весь фрагмент — один блок <module>.
+        """
+        lines = code_snippet.split('\n')
+        if language == 'python':
+            blocks = CodeAnalyzer._split_python_blocks(lines)
+        elif language in CodeAnalyzer.BRACE_LANGUAGES:
+            blocks = CodeAnalyzer._split_brace_blocks(lines)
+        else:
+            blocks = [{"name": "<module>", "kind": "module", "start_line": 1, "lines": lines}]
+        
+        result = []
+        names = set()
+        for block in sorted(blocks, key=lambda b: b["start_line"]):
+            code = '\n'.join(block["lines"]).strip('\n')
+            if not code.strip():
+                continue
+            # Перегрузки и повторные объявления различаются порядковым номером
+            name = block["name"]
+            suffix = 2
+            while name in names:
+                name = f"{block['name']}#{suffix}"
+                suffix += 1
+            names.add(name)
+            result.append({"name": name, "kind": block["kind"], "start_line": block["start_line"], "code": code})
+        return result
+    
+    @staticmethod
+    def _split_python_blocks(lines: List[str]) -> List[Dict[str, Any]]:
+        module = {"name": "<module>", "kind": "module", "start_line": 0, "lines": []}
+        blocks = [module]
+        current = None      # открытая функция или метод
+        container = None    # открытый класс верхнего уровня
+        member_indent = None
+        pending: List[str] = []  # декораторы и комментарии перед объявлением
+        pending_start = 0
+        
+        def add_line(target, number, line):
+            if not target["lines"] and target is module:
+                target["start_line"] = number
+            target["lines"].append(line)
+        
+        for number, line in enumerate(lines, 1):
+            stripped = line.strip()
+            indent = len(line) - len(line.lstrip())
+            if not stripped:
+                add_line(current or container or module, number, line)
+                continue
+            
+            if indent == 0:
+                current, container, member_indent = None, None, None
+            elif container is not None:
+                if member_indent is None:
+                    member_indent = indent
+                if indent < member_indent:
+                    current, container = None, None
+                elif indent == member_indent:
+                    current = None
+            
+            if current is not None:
+                current["lines"].append(line)
+                continue
+            
+            at_member_level = container is not None and indent == member_indent
+            if indent == 0 or at_member_level:
+                if stripped.startswith(('@', '#')):
+                    if not pending:
+                        pending_start = number
+                    pending.append(line)
+                    continue
+                match = CodeAnalyzer._PYTHON_DECLARATION.match(line)
+                if match:
+                    is_class = stripped.startswith('class')
+                    name = f"{container['name']}.{match.group(1)}" if at_member_level else match.group(1)
+                    block = {
+                        "name": name,
+                        "kind": "class" if is_class else "function",
+                        "start_line": pending_start if pending else number,
+                        "lines": pending + [line]
+                    }
+                    pending = []
+                    blocks.append(block)
+                    if is_class and indent == 0:
+                        container, member_indent = block, None
+                    else:
+                        current = block
+                    continue
+            
+            target = container if container is not None else module
+            for i, pending_line in enumerate(pending):
+                add_line(target, pending_start + i, pending_line)
+            pending = []
+            add_line(target, number, line)
+        
+        for i, pending_line in enumerate(pending):
+            add_line(container or module, pending_start + i, pending_line)
+        return blocks
+    
+    @staticmethod
+    def _block_declaration(line: str):
+        for pattern, kind in CodeAnalyzer.BLOCK_DECLARATIONS:
+            match = pattern.search(line)
+            if match and match.group(1) not in CodeAnalyzer.BLOCK_CONTROL_WORDS:
+                return match.group(1), kind
+        return None
+    
+    @staticmethod
+    def _split_brace_blocks(lines: List[str]) -> List[Dict[str, Any]]:
+        module = {"name": "<module>", "kind": "module", "start_line": 0, "lines": []}
+        blocks = [module]
+        current = None      # открытая функция или метод
+        container = None    # открытый класс верхнего уровня
+        depth = 0
+        
+        for number, line in enumerate(lines, 1):
+            cleaned = CodeAnalyzer._BRACE_NOISE.sub('', line)
+            
+            if current is None and cleaned.strip() and depth == (1 if container is not None else 0):
+                declaration = CodeAnalyzer._block_declaration(cleaned)
+                if declaration is not None:
+                    name, kind = declaration
+                    if container is not None:
+                        name = f"{container['name']}.{name}"
+                    block = {"name": name, "kind": kind, "start_line": number, "lines": [],
+                             "depth": depth, "opened": False}
+                    blocks.append(block)
+                    if kind == 'class' and container is None:
+                        container = block
+                    else:
+                        current = block
+            
+            target = current or container or module
+            if not target["lines"] and target is module:
+                module["start_line"] = number
+            target["lines"].append(line)
+            depth += cleaned.count('{') - cleaned.count('}')
+            
+            if target is not module:
+                if '{' in cleaned:
+                    target["opened"] = True
+                closed = target["opened"] and depth <= target["depth"]
+                # Объявление без тела в одну строку: const f = x => x * 2;
+                one_liner = not target["opened"] and cleaned.rstrip().endswith(';')
+                if closed or one_liner:
+                    if target is current:
+                        current = None
+                    else:
+                        container = None
+        
+        return blocks
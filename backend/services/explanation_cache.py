@@ -0,0 +1,64 @@
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+from .shared_cache import LocalLRUCache, SharedSQLiteCache, TieredCache
+
+# Уровни сложности, для которых кэшируются объяснения
+COMPLEXITY_LEVELS = ("beginner", "intermediate", "advanced")
+
+
+def snippet_hash(code_snippet: str) -> str:
+    """
+    Возвращает стабильный хэш фрагмента кода для использования в ключах кэша
+    """
+    return hashlib.sha256(code_snippet.encode("utf-8")).hexdigest()
+
+
+class ExplanationCache:
+    """
+    Потокобезопасный LRU-кэш объяснений с разбивкой по уровням сложности.
+    Ключ записи — (хэш фрагмента, язык, уровень сложности).
+    Поверх LRU в памяти процесса может работать общий для воркеров SQLite-кэш.
+    """
+
+    def __init__(self, max_size: int = 512, shared: Optional[SharedSQLiteCache] = None):
+        self.max_size = max_size
+        self._cache = TieredCache(LocalLRUCache(max_size), shared)
+
+    @classmethod
+    def from_env(cls) -> "ExplanationCache":
+        max_size = int(os.getenv("EXPLANATION_CACHE_SIZE", "512"))
+        return cls(max_size, SharedSQLiteCache.from_env("explanations") if max_size > 0 else None)
+
+    @staticmethod
+    def make_key(code_snippet: str, language: str, complexity_level: str) -> str:
+        return f"{snippet_hash(code_snippet)}:{language}:{complexity_level}"
+
+    def get(self, code_snippet: str, language: str, complexity_level: str) -> Optional[str]:
+        return self._cache.get(self.make_key(code_snippet, language, complexity_level))
+
+    def set(self, code_snippet: str, language: str, complexity_level: str, explanation: str) -> None:
+        self._cache.set(self.make_key(code_snippet, language, complexity_level), explanation)
+
+    def get_levels(self, code_snippet: str, language: str) -> Dict[str, str]:
+        """
+        Возвращает все закэшированные уровни для фрагмента (без учёта в статистике)
+        """
+        digest = snippet_hash(code_snippet)
+        keys = {f"{digest}:{language}:{level}": level for level in COMPLEXITY_LEVELS}
+        found = self._cache.get_many(keys, count_stats=False)
+        return {keys[key]: explanation for key, explanation in found.items()}
+
+    def set_levels(self, code_snippet: str, language: str, explanations: Dict[str, str]) -> None:
+        digest = snippet_hash(code_snippet)
+        self._cache.set_many({f"{digest}:{language}:{level}": text for level, text in explanations.items()})
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def close(self) -> None:
+        self._cache.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
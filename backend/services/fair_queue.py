@@ -0,0 +1,172 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from .metrics import LLM_QUEUE_WAIT_SECONDS
+from .rate_limiter import ClientUsage
+
+# Клиент текущего запроса (задаётся middleware и воркером задач); вызовы LLM без клиента —
+# фоновая работа самого сервиса
+_current_client: ContextVar[Optional[str]] = ContextVar("current_client", default=None)
+INTERNAL_CLIENT = "internal"
+
+
+def current_client() -> str:
+    return _current_client.get() or INTERNAL_CLIENT
+
+
+@contextmanager
+def client_context(client: Optional[str]):
+    """
+    Выполняет блок от имени клиента (например, задачу очереди в потоке воркера)
+    """
+    token = _current_client.set(client)
+    try:
+        yield
+    finally:
+        _current_client.reset(token)
+
+
+def set_current_client(client: str):
+    """
+    Задаёт клиента до конца текущего контекста (запроса в middleware)
+    """
+    _current_client.set(client)
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """
+    Разбирает LLM_FAIR_WEIGHTS: «key:1a2b3c=4,ip:10.0.0.7=0.5» — веса клиентов (по умолчанию 1)
+    """
+    weights = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        client, _, weight = item.rpartition("=")
+        try:
+            weights[client.strip()] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid LLM_FAIR_WEIGHTS entry: {item.strip()!r}")
+        if not client.strip() or weights[client.strip()] <= 0:
+            raise ValueError(f"Invalid LLM_FAIR_WEIGHTS entry: {item.strip()!r}")
+    return weights
+
+
+class FairQueueTimeout(Exception):
+    pass
+
+
+class _Waiter:
+    __slots__ = ("event", "granted", "cancelled")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class FairQueue:
+    """
+    Взвешенная справедливая очередь к LLM (start-time fair queueing).
+    Одновременно выполняется не больше max_concurrency вызовов; ожидающие получают
+    освободившееся место в порядке виртуального времени начала. У каждого клиента своё
+    виртуальное время: вызов стоимостью cost сдвигает его на cost / вес клиента, поэтому
+    клиент с сотней вызовов в очереди не отодвигает вызов другого клиента больше чем на
+    один вызов на место, а доли мест между активными клиентами пропорциональны весам.
+    Вызовы LLM синхронные и выполняются в разных потоках, поэтому ожидание — на threading.Event.
+    """
+
+    def __init__(self, max_concurrency: int = 4, usage: Optional[ClientUsage] = None,
+                 weights: Optional[Dict[str, float]] = None, timeout: float = 120.0):
+        self.max_concurrency = max_concurrency
+        self.usage = usage
+        self.weights = weights or {}
+        self.timeout = timeout
+        self.in_service = 0
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._sequence = itertools.count()
+        # Виртуальное время — время начала последнего допущенного вызова
+        self._virtual_time = 0.0
+        # Виртуальное время окончания последнего вызова клиента
+        self._finish: Dict[str, float] = {}
+
+    @classmethod
+    def from_env(cls, usage: Optional[ClientUsage] = None) -> Optional["FairQueue"]:
+        max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+        if max_concurrency <= 0:
+            return None
+        return cls(
+            max_concurrency,
+            usage,
+            parse_weights(os.getenv("LLM_FAIR_WEIGHTS", "")),
+            float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "120"))
+        )
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, waiter in self._waiters if not waiter.cancelled)
+
+    @contextmanager
+    def slot(self, cost: float = 1.0, timeout: Optional[float] = None):
+        """
+        Место для одного вызова LLM от имени текущего клиента.
+        FairQueueTimeout, если место не освободилось за timeout секунд (по умолчанию self.timeout).
+        """
+        client = current_client()
+        queued = time.perf_counter()
+        self._acquire(client, cost, self.timeout if timeout is None else timeout)
+        started = time.perf_counter()
+        LLM_QUEUE_WAIT_SECONDS.observe(started - queued)
+        try:
+            yield
+        finally:
+            self._release()
+            if self.usage is not None:
+                self.usage.add(client, llm_calls=1, llm_queue_seconds=started - queued,
+                               llm_seconds=time.perf_counter() - started)
+
+    def _acquire(self, client: str, cost: float, timeout: float):
+        with self._lock:
+            start = max(self._virtual_time, self._finish.get(client, 0.0))
+            self._finish[client] = start + cost / self.weights.get(client, 1.0)
+            if self.in_service < self.max_concurrency and not self._waiters:
+                self.in_service += 1
+                self._virtual_time = start
+                return
+            waiter = _Waiter()
+            heapq.heappush(self._waiters, (start, next(self._sequence), waiter))
+
+        waiter.event.wait(timeout)
+        with self._lock:
+            if waiter.granted:
+                return
+            # Место так и не досталось: освобождающий вызов пропустит эту запись
+            waiter.cancelled = True
+        if self.usage is not None:
+            self.usage.add(client, llm_queue_timeouts=1)
+        raise FairQueueTimeout(f"No LLM slot within {timeout:g}s")
+
+    def _release(self):
+        with self._lock:
+            while self._waiters:
+                start, _, waiter = heapq.heappop(self._waiters)
+                if waiter.cancelled:
+                    continue
+                # Место переходит ожидающему напрямую, in_service не меняется
+                self._virtual_time = max(self._virtual_time, start)
+                waiter.granted = True
+                waiter.event.set()
+                return
+            self.in_service -= 1
+            # Клиенты, чьё время окончания позади, начнут с текущего виртуального времени
+            # и без записи: удаляем их, чтобы словарь не рос
+            if len(self._finish) > 1000:
+                self._finish = {
+                    client: finish for client, finish in self._finish.items() if finish > self._virtual_time
+                }
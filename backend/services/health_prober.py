@@ -0,0 +1,103 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+class HealthProber:
+    """
+    Фоновая задача, которая периодически проверяет зависимости сервиса
+    и хранит последний снимок состояния для /health.
+    """
+
+    def __init__(self, engines, llm_service, explanation_cache,
+                 queue_depths: Callable[[], Dict[str, int]], interval: float = 15.0, version: str = "1.0.0"):
+        # Движки всех шардов истории: база здорова, только если доступен каждый
+        self.engines = engines
+        self.llm_service = llm_service
+        self.explanation_cache = explanation_cache
+        self.queue_depths = queue_depths
+        self.interval = interval
+        self.version = version
+        self.snapshot: Dict[str, Any] = {}
+        # Снимок, заранее сериализованный в JSON, чтобы /health не тратил время на сериализацию
+        self.snapshot_json = b"{}"
+        self._task: Optional[asyncio.Task] = None
+
+    def probe_database(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            for engine in self.engines:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+            status = "healthy"
+        except Exception:
+            status = "unhealthy"
+        return {"status": status, "latency_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+    def probe_llm(self) -> Dict[str, Any]:
+        # Мок-сервис всегда доступен и не требует сетевой проверки
+        if self.llm_service.use_mock:
+            return {"status": "healthy", "latency_ms": None}
+        latency = self.llm_service.ping()
+        return {
+            "status": "healthy" if latency is not None else "unhealthy",
+            "latency_ms": round(latency * 1000, 3) if latency is not None else None
+        }
+
+    def probe_once(self, include_llm: bool = True) -> Dict[str, Any]:
+        """
+        Выполняет все проверки и обновляет снимок состояния.
+        Без include_llm состояние LLM помечается как unknown (проверка при старте)
+        """
+        database = self.probe_database()
+        llm = self.probe_llm() if include_llm else {"status": "unknown", "latency_ms": None}
+        self.snapshot = {
+            "status": "healthy" if database["status"] == "healthy" and llm["status"] == "healthy" else "degraded",
+            "timestamp": time.time(),
+            "version": self.version,
+            "llm_service_status": llm["status"],
+            "database_status": database["status"],
+            "database_latency_ms": database["latency_ms"],
+            "llm_latency_ms": llm["latency_ms"],
+            "llm_mode": "mock" if self.llm_service.use_mock else "remote",
+            "queue_depth": self.queue_depths(),
+            "cache_hit_rate": self.explanation_cache.stats()["hit_rate"]
+        }
+        self.snapshot_json = json.dumps(self.snapshot).encode("utf-8")
+        return self.snapshot
+
+    @property
+    def is_ready(self) -> bool:
+        # Недоступный LLM не мешает готовности: сервис откатывается на мок-объяснения
+        return self.snapshot.get("database_status") == "healthy"
+
+    async def _run(self, delay: float):
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.interval
+            try:
+                await asyncio.to_thread(self.probe_once)
+            except Exception as e:
+                logger.warning("Error probing service health: %s", e)
+
+    async def start(self):
+        # Для готовности достаточно базы данных: проверка удалённого LLM (до таймаута ping)
+        # не задерживает запуск и выполняется сразу следом в фоне
+        remote_llm = not self.llm_service.use_mock
+        await asyncio.to_thread(self.probe_once, not remote_llm)
+        self._task = asyncio.create_task(self._run(0 if remote_llm else self.interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
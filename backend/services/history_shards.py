@@ -0,0 +1,114 @@
+import os
+import zlib
+from typing import Dict, List, Mapping, Optional
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..database import SessionLocal, create_sqlite_engine, create_tables, db_dir, db_path, engine, get_table_version
+
+# id объяснения = (номер шарда << SHARD_ID_BITS) + номер записи в шарде: шард находится
+# по id без обращения к базам. Точные целые JavaScript (2**53) допускают до 8192 шардов
+SHARD_ID_BITS = 40
+MAX_SHARDS = 1 << (53 - SHARD_ID_BITS)
+# Заголовок с идентификатором клиента (команды), по которому выбирается шард записи
+TENANT_HEADER = os.getenv("TENANT_HEADER", "X-Tenant-Id").lower()
+MAX_TENANT_LENGTH = 100
+
+
+def parse_tenant_map(value: str) -> Dict[str, int]:
+    """
+    Разбирает HISTORY_SHARD_MAP: «team-a=1,team-b=2» — клиенты, закреплённые за шардами
+    """
+    tenant_map = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        tenant, _, shard = item.partition("=")
+        if not tenant.strip() or not shard.strip().isdigit():
+            raise ValueError(f"Invalid HISTORY_SHARD_MAP entry: {item.strip()!r}")
+        tenant_map[tenant.strip()] = int(shard)
+    return tenant_map
+
+
+class HistoryShards:
+    """
+    Шарды истории объяснений: отдельные файлы SQLite, у каждого своя блокировка записи,
+    поэтому массовая запись одного клиента не задерживает остальных.
+    Объяснение сохраняется в шард клиента (заголовок X-Tenant-Id): номер шарда задаётся
+    картой HISTORY_SHARD_MAP или хэшем имени клиента; запросы без клиента идут в шард 0 —
+    прежний code_explainer.db. Запись по id читается из шарда, указанного в старших битах id;
+    списки, поиск, теги и статистика опрашивают все шарды и объединяют результаты.
+    """
+
+    def __init__(self, paths: List[str], tenant_map: Optional[Dict[str, int]] = None):
+        if not 1 <= len(paths) <= MAX_SHARDS:
+            raise ValueError(f"History shard count must be between 1 and {MAX_SHARDS}")
+        self.tenant_map = tenant_map or {}
+        for tenant, shard in self.tenant_map.items():
+            if shard >= len(paths):
+                raise ValueError(f"Tenant {tenant!r} is mapped to shard {shard}, but there are {len(paths)} shards")
+        self.paths = paths
+        # Основной файл обслуживается движком и фабрикой сессий из database.py
+        self.engines = [engine if path == db_path else create_sqlite_engine(path) for path in paths]
+        self.session_factories = [
+            SessionLocal if shard_engine is engine else sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+            for shard_engine in self.engines
+        ]
+
+    @classmethod
+    def from_env(cls) -> "HistoryShards":
+        count = int(os.getenv("HISTORY_SHARDS", "1"))
+        directory = os.getenv("HISTORY_SHARD_DIR", db_dir)
+        os.makedirs(directory, exist_ok=True)
+        paths = [db_path] + [os.path.join(directory, f"code_explainer.shard{shard}.db") for shard in range(1, count)]
+        return cls(paths, parse_tenant_map(os.getenv("HISTORY_SHARD_MAP", "")))
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    # --- маршрутизация ---
+
+    @staticmethod
+    def tenant_of(headers: Mapping[str, str]) -> Optional[str]:
+        tenant = (headers.get(TENANT_HEADER) or "").strip()
+        return tenant[:MAX_TENANT_LENGTH] or None
+
+    def shard_for_tenant(self, tenant: Optional[str]) -> int:
+        if not tenant or len(self) == 1:
+            return 0
+        if tenant in self.tenant_map:
+            return self.tenant_map[tenant]
+        return zlib.crc32(tenant.encode("utf-8")) % len(self)
+
+    def shard_for_id(self, explanation_id: int) -> int:
+        """
+        Шард записи по id; id несуществующего шарда направляется в шард 0, где записи нет (404)
+        """
+        shard = explanation_id >> SHARD_ID_BITS
+        return shard if 0 <= shard < len(self) else 0
+
+    # --- сессии ---
+
+    def session(self, shard: int = 0) -> Session:
+        return self.session_factories[shard]()
+
+    def sessions(self) -> List[Session]:
+        """
+        Сессии всех шардов (соединения открываются при первом запросе)
+        """
+        return [factory() for factory in self.session_factories]
+
+    @staticmethod
+    def version(sessions: List[Session]) -> int:
+        """
+        Версия истории для ETag: сумма версий шардов растёт при любом изменении любого из них
+        """
+        return sum(get_table_version(db) for db in sessions)
+
+    def create_tables(self):
+        for shard, shard_engine in enumerate(self.engines):
+            create_tables(shard_engine, id_base=shard << SHARD_ID_BITS)
+
+    def dispose(self):
+        for shard_engine in self.engines:
+            shard_engine.dispose()
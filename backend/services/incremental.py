@@ -0,0 +1,226 @@
+import contextvars
+import hashlib
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from .code_analyzer import CodeAnalyzer
+from .explanation_cache import snippet_hash
+from .llm_service import LLMService
+from .metrics import INCREMENTAL_BLOCKS
+from .shared_cache import TieredCache
+
+logger = logging.getLogger(__name__)
+
+# Заголовок раздела, в который вклеиваются объяснения изменённых блоков
+CHANGES_HEADING = "## Изменения после правки"
+_HEADING = re.compile(r'^(#{1,4})(\s)')
+
+
+def block_hash(code: str) -> str:
+    """
+    Хэш блока без учёта пробелов и переносов: переформатирование не считается правкой
+    """
+    return hashlib.blake2b(" ".join(code.split()).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _line_count(code: str) -> int:
+    return sum(1 for line in code.split("\n") if line.strip())
+
+
+def _demote_headings(text: str) -> str:
+    """
+    Сдвигает заголовки markdown на два уровня вниз, чтобы они оказались внутри раздела блока
+    (строки внутри блоков кода не трогаются)
+    """
+    lines = []
+    in_code = False
+    for line in text.split("\n"):
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        elif not in_code:
+            line = _HEADING.sub(lambda m: "#" * (len(m.group(1)) + 2) + m.group(2), line)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class IncrementalExplainer:
+    """
+    Повторное объяснение отредактированного фрагмента по частям.
+
+    Для каждого объяснённого фрагмента в кэше (ключ — хэш фрагмента и язык) хранится
+    состояние: хэши блоков (функций, классов, методов — CodeAnalyzer.split_blocks)
+    той версии, для которой LLM объяснил весь код целиком («база»), объяснения базы
+    по уровням и объяснения блоков, изменённых с тех пор. Когда клиент присылает хэш
+    предыдущей версии, заново объясняются только блоки, которые отличаются от базы и
+    ещё не были объяснены в текущем виде; их объяснения вклеиваются в объяснение базы
+    отдельным разделом. Если изменилась большая часть кода, нужен полный ответ LLM.
+    """
+
+    def __init__(self, cache: TieredCache, enabled: bool = True, max_changed_ratio: float = 0.5,
+                 max_parallel: int = 4):
+        self.cache = cache
+        self.enabled = enabled
+        self.max_changed_ratio = max_changed_ratio
+        # Сколько изменённых блоков объясняется одновременно
+        self.max_parallel = max(1, max_parallel)
+
+    @classmethod
+    def from_env(cls) -> "IncrementalExplainer":
+        cache_size = int(os.getenv("INCREMENTAL_CACHE_SIZE", "512"))
+        return cls(
+            TieredCache.from_env("incremental", cache_size),
+            enabled=os.getenv("INCREMENTAL_ENABLED", "true").lower() == "true" and cache_size > 0,
+            max_changed_ratio=float(os.getenv("INCREMENTAL_MAX_CHANGED_RATIO", "0.5")),
+            max_parallel=int(os.getenv("INCREMENTAL_MAX_PARALLEL", "4"))
+        )
+
+    @staticmethod
+    def make_key(digest: str, language: str) -> str:
+        return f"{digest}:{language}"
+
+    def remember(self, code_snippet: str, language: str, explanations: Dict[str, str]) -> None:
+        """
+        Запоминает полное объяснение фрагмента как базу для следующих правок
+        (уровни, объяснённые раньше для того же кода, сохраняются)
+        """
+        if not self.enabled or not explanations:
+            return
+        try:
+            key = self.make_key(snippet_hash(code_snippet), language)
+            base = {block["name"]: block_hash(block["code"])
+                    for block in CodeAnalyzer.split_blocks(code_snippet, language)}
+            state = self.cache.get(key)
+            if state is None or state["base"] != base or state["sections"]:
+                state = {"base": base, "explanations": {}, "sections": {}}
+            state["explanations"].update(explanations)
+            self.cache.set(key, state)
+        except Exception as e:
+            logger.warning("Error remembering explanation blocks: %s", e)
+
+    def explain(
+        self,
+        previous_hash: str,
+        code_snippet: str,
+        language: str,
+        levels: Sequence[str],
+        llm_service: LLMService
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Объясняет новую версию фрагмента через предыдущую. Возвращает
+        {"explanations": {уровень: текст}, "info": {...}} или None, если предыдущая
+        версия неизвестна, изменений слишком много или LLM недоступен — тогда
+        фрагмент объясняется целиком.
+        """
+        state = self.cache.get(self.make_key(previous_hash, language))
+        if state is None or any(level not in state["explanations"] for level in levels):
+            return None
+
+        blocks = CodeAnalyzer.split_blocks(code_snippet, language)
+        base = state["base"]
+        current = {block["name"]: block_hash(block["code"]) for block in blocks}
+        changed = [block for block in blocks if base.get(block["name"]) != current[block["name"]]]
+        removed = [name for name in base if name not in current]
+        total_lines = sum(_line_count(block["code"]) for block in blocks) or 1
+        changed_lines = sum(_line_count(block["code"]) for block in changed)
+        if changed_lines > total_lines * self.max_changed_ratio:
+            return None
+
+        context_names = ", ".join(f"`{block['name']}`" for block in blocks if block["kind"] != "module")
+        sections = {}
+        pending = []
+        reused = []
+        for block in changed:
+            name = block["name"]
+            previous = state["sections"].get(name)
+            if previous and previous["hash"] == current[name] and all(level in previous["explanations"] for level in levels):
+                sections[name] = previous
+                reused.append(name)
+            else:
+                sections[name] = {"hash": current[name], "added": name not in base, "explanations": None}
+                pending.append(block)
+
+        def explain_block(block):
+            return self._explain_block(block, block["name"] not in base, language, levels, context_names, llm_service)
+
+        if len(pending) > 1 and self.max_parallel > 1:
+            # Каждому потоку — копия контекста: вызовы LLM идут в справедливую очередь от имени клиента
+            with ThreadPoolExecutor(max_workers=min(len(pending), self.max_parallel)) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, explain_block, block) for block in pending]
+                results = [future.result() for future in futures]
+        else:
+            results = [explain_block(block) for block in pending]
+        if any(explanations is None for explanations in results):
+            return None
+        for block, explanations in zip(pending, results):
+            sections[block["name"]]["explanations"] = explanations
+        reexplained = [block["name"] for block in pending]
+        INCREMENTAL_BLOCKS.labels("reexplained").inc(len(reexplained))
+        INCREMENTAL_BLOCKS.labels("reused").inc(len(blocks) - len(reexplained))
+
+        self.cache.set(
+            self.make_key(snippet_hash(code_snippet), language),
+            {"base": base, "explanations": state["explanations"], "sections": sections}
+        )
+        return {
+            "explanations": {
+                level: self._splice(state["explanations"][level], sections, removed, level)
+                for level in levels
+            },
+            "info": {
+                "previous_snippet_hash": previous_hash,
+                "reexplained_blocks": reexplained,
+                "reused_sections": reused,
+                "removed_blocks": removed,
+                "unchanged_blocks": len(blocks) - len(changed)
+            }
+        }
+
+    @staticmethod
+    def _explain_block(
+        block: Dict[str, Any],
+        added: bool,
+        language: str,
+        levels: Sequence[str],
+        context_names: str,
+        llm_service: LLMService
+    ) -> Optional[Dict[str, str]]:
+        """
+        Объясняет один блок; None, если вместо ответа LLM получено резервное мок-объяснение
+        """
+        context = f"это {'новая' if added else 'изменённая'} часть `{block['name']}` большего фрагмента"
+        if context_names:
+            context += f" (в нём также объявлены {context_names})"
+        context += "; объясни только этот код"
+        summary = CodeAnalyzer.extract_code_summary(block["code"], language)
+        if len(levels) > 1:
+            result = llm_service.explain_code_all_levels(block["code"], language, code_summary=summary, context=context)
+            if result.get("fallback_levels"):
+                return None
+            return {level: result["explanations"][level] for level in levels}
+        result = llm_service.explain_code(block["code"], language, levels[0], code_summary=summary, context=context)
+        if not result["success"] or result.get("mock") and not llm_service.use_mock:
+            return None
+        return {levels[0]: result["explanation"]}
+
+    @staticmethod
+    def _splice(base_explanation: str, sections: Dict[str, Dict[str, Any]], removed: List[str], level: str) -> str:
+        """
+        Вклеивает объяснения изменённых блоков после объяснения базовой версии
+        """
+        if not sections and not removed:
+            return base_explanation
+        parts = [base_explanation.rstrip(), "", CHANGES_HEADING]
+        for name, section in sections.items():
+            parts += ["", f"### `{name}` ({'новый блок' if section['added'] else 'изменён'})", "",
+                      _demote_headings(section["explanations"][level].strip())]
+        if removed:
+            parts += ["", "Удалены: " + ", ".join(f"`{name}`" for name in removed)
+                      + " — их описание выше относится к прежней версии кода."]
+        return "\n".join(parts)
+
+    def close(self) -> None:
+        self.cache.clear()
+        self.cache.close()
@@ -0,0 +1,491 @@
+import asyncio
+import functools
+import ipaddress
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from sqlalchemy import text
+
+from .metrics import JOBS, JOB_SECONDS
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+JOB_COLUMNS = ("id, status, payload, callback_url, attempts, max_attempts, error, result, explanation_id, "
+               "created_at, updated_at, deadline_at, finished_at, callback_status")
+# Условие обновления задачи воркером: задача выполняется именно этой его попыткой
+OWNED = "id = :id AND status = 'running' AND worker = :worker AND attempts = :attempts"
+
+
+class QueueFullError(Exception):
+    """
+    В очереди больше max_pending ожидающих задач
+    """
+
+
+class CallbackURLError(ValueError):
+    """
+    callback_url ведёт на адрес, куда сервер не отправляет запросы (внутренняя сеть, loopback)
+    """
+
+
+def check_callback_url(url: str, allowed_hosts: Sequence[str] = ()) -> Optional[List[str]]:
+    """
+    Проверяет, что на callback_url можно отправить итог задачи. Со списком allowed_hosts
+    (точные имена или *.домен) допускаются только перечисленные узлы; без него — узлы,
+    все адреса которых публичные: loopback, частные, link-local (в том числе метаданные
+    облака 169.254.169.254) и зарезервированные сети отклоняются. Выполняет DNS-запрос.
+    Возвращает проверенные адреса, к которым и нужно подключаться (pinned_session),
+    или None для узла из allowed_hosts.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise CallbackURLError("callback_url must be an absolute http(s) URL")
+    if allowed_hosts:
+        if not any(host == entry or (entry.startswith("*.") and host.endswith(entry[1:]))
+                   for entry in allowed_hosts):
+            raise CallbackURLError(f"Callback host {host} is not in JOB_CALLBACK_ALLOWED_HOSTS")
+        return None
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        raise CallbackURLError(f"Cannot resolve callback host {host}: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if not ip.is_global or ip.is_multicast:
+            raise CallbackURLError(f"Callback host {host} resolves to a non-public address {ip}")
+    return sorted(addresses)
+
+
+def pinned_session(addresses: Sequence[str]):
+    """
+    Сессия requests, которая подключается только к addresses, не разрешая имя узла заново:
+    иначе DNS-ответ между проверкой и запросом (DNS rebinding) мог бы направить запрос
+    во внутреннюю сеть. Заголовок Host, SNI и проверка сертификата — по имени из URL.
+    Переменные окружения прокси не учитываются: через прокси адрес не закрепить.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    from urllib3.exceptions import NewConnectionError
+    from urllib3.util.connection import create_connection
+
+    def pinned(connection_cls):
+        class PinnedConnection(connection_cls):
+            def _new_conn(self):
+                error = None
+                for address in addresses:
+                    try:
+                        return create_connection((address, self.port), self.timeout,
+                                                 source_address=self.source_address,
+                                                 socket_options=self.socket_options)
+                    except OSError as e:
+                        error = e
+                raise NewConnectionError(self, f"Failed to connect to {self.host} ({', '.join(addresses)}): {error}")
+        return PinnedConnection
+
+    class PinnedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = pinned(HTTPConnection)
+
+    class PinnedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = pinned(HTTPSConnection)
+
+    class PinnedAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": PinnedHTTPConnectionPool, "https": PinnedHTTPSConnectionPool
+            }
+
+    session = requests.Session()
+    session.trust_env = False
+    adapter = PinnedAdapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class JobError(Exception):
+    """
+    Ошибка выполнения задачи; retryable=False — повтор не поможет (например, некорректный код)
+    """
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+def job_to_dict(row) -> Dict[str, Any]:
+    """
+    Представление задачи для API (время в ISO 8601, результат — разобранный JSON)
+    """
+    job = dict(row._mapping)
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "created_at": _isoformat(job["created_at"]),
+        "updated_at": _isoformat(job["updated_at"]),
+        "deadline_at": _isoformat(job["deadline_at"]),
+        "finished_at": _isoformat(job["finished_at"]),
+        "error": job["error"],
+        "explanation_id": job["explanation_id"],
+        "result": json.loads(job["result"]) if job["result"] else None,
+        "callback_url": job["callback_url"],
+        "callback_status": job["callback_status"]
+    }
+
+
+class JobQueue:
+    """
+    Долговечная очередь задач объяснения в таблице explain_jobs и ограниченный пул
+    воркеров внутри процесса приложения. Задача берётся атомарным UPDATE ... RETURNING
+    с арендой на lease_seconds, поэтому несколько процессов делят одну очередь, а задачи
+    упавшего процесса после окончания аренды забирают другие; пока задача выполняется,
+    аренда продлевается, поэтому срок задачи может быть длиннее аренды. Ошибки повторяются
+    с экспоненциальной задержкой, пока не исчерпаны попытки или не наступил срок задачи.
+    """
+
+    # Сколько ждать обработчик после срока задачи: он сам соблюдает срок (вызовы LLM
+    # ограничены оставшимся временем), запас покрывает сохранение в историю
+    DEADLINE_GRACE = 30.0
+
+    def __init__(self, session_factory, workers: int = 2, max_pending: int = 1000, max_attempts: int = 3,
+                 default_deadline: float = 600.0, lease_seconds: float = 300.0, poll_interval: float = 0.5,
+                 retry_base: float = 2.0, callback_timeout: float = 10.0, callback_attempts: int = 3,
+                 callback_allowed_hosts: Sequence[str] = ()):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.default_deadline = default_deadline
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retry_base = retry_base
+        self.callback_timeout = callback_timeout
+        self.callback_attempts = callback_attempts
+        self.callback_allowed_hosts = tuple(callback_allowed_hosts)
+        # Уникален для процесса: по нему при остановке возвращаются в очередь свои задачи
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.running = 0
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # Свои потоки: по одному на обработчик задачи и столько же для взятия задач,
+        # продления аренды и завершения, чтобы они не ждали долгие обработчики
+        # (пул asyncio по умолчанию ограничен числом CPU + 4)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def from_env(cls, session_factory) -> "JobQueue":
+        return cls(
+            session_factory,
+            workers=int(os.getenv("JOB_WORKERS", "2")),
+            max_pending=int(os.getenv("JOB_MAX_PENDING", "1000")),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+            default_deadline=float(os.getenv("JOB_DEADLINE_SECONDS", "600")),
+            lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "300")),
+            poll_interval=float(os.getenv("JOB_POLL_INTERVAL", "0.5")),
+            retry_base=float(os.getenv("JOB_RETRY_BASE_SECONDS", "2")),
+            callback_allowed_hosts=[
+                host.strip().lower() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()
+            ]
+        )
+
+    def check_callback_url(self, url: str) -> Optional[List[str]]:
+        return check_callback_url(url, self.callback_allowed_hosts)
+
+    # --- операции с таблицей ---
+
+    def enqueue(self, db, payload: Dict[str, Any], callback_url: Optional[str] = None,
+                deadline_seconds: Optional[float] = None, max_attempts: Optional[int] = None) -> Dict[str, Any]:
+        if self.pending_count(db) >= self.max_pending:
+            raise QueueFullError(f"Job queue is full ({self.max_pending} pending jobs)")
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        db.execute(
+            text("INSERT INTO explain_jobs (id, status, payload, callback_url, callback_status, attempts, "
+                 "max_attempts, created_at, updated_at, deadline_at, next_attempt_at) VALUES (:id, 'queued', "
+                 ":payload, :callback_url, :callback_status, 0, :max_attempts, :now, :now, :deadline, :now)"),
+            {"id": job_id, "payload": json.dumps(payload), "callback_url": callback_url,
+             "callback_status": "pending" if callback_url else None,
+             "max_attempts": max_attempts or self.max_attempts, "now": now,
+             "deadline": now + (deadline_seconds or self.default_deadline)}
+        )
+        db.commit()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return self.get(db, job_id)
+
+    def get(self, db, job_id: str) -> Optional[Dict[str, Any]]:
+        row = db.execute(text(f"SELECT {JOB_COLUMNS} FROM explain_jobs WHERE id = :id"), {"id": job_id}).first()
+        return job_to_dict(row) if row is not None else None
+
+    def pending_count(self, db=None) -> int:
+        if db is None:
+            with self.session_factory() as session:
+                return self.pending_count(session)
+        return db.execute(text("SELECT COUNT(*) FROM explain_jobs WHERE status IN ('queued', 'running')")).scalar()
+
+    def claim(self, db) -> Optional[Dict[str, Any]]:
+        """
+        Берёт самую давно готовую задачу: ожидающую или брошенную воркером с истёкшей арендой
+        """
+        now = time.time()
+        row = db.execute(
+            text("UPDATE explain_jobs SET status = 'running', attempts = attempts + 1, worker = :worker, "
+                 "locked_until = :lease, updated_at = :now WHERE id = ("
+                 "SELECT id FROM explain_jobs WHERE (status = 'queued' AND next_attempt_at <= :now) "
+                 "OR (status = 'running' AND locked_until < :now) ORDER BY next_attempt_at LIMIT 1) "
+                 "RETURNING id, payload, attempts, max_attempts, created_at, deadline_at, callback_url"),
+            {"worker": self.worker_id, "lease": now + self.lease_seconds, "now": now}
+        ).first()
+        db.commit()
+        if row is None:
+            return None
+        job = dict(row._mapping)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def _owner(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Параметры OWNED: задача всё ещё выполняется этой попыткой этого воркера. Номер попытки
+        различает и повторный захват задачи тем же процессом после истечения аренды.
+        """
+        return {"id": job["id"], "worker": self.worker_id, "attempts": job["attempts"]}
+
+    def complete(self, db, job: Dict[str, Any], result: Dict[str, Any], explanation_id: Optional[int]) -> bool:
+        """
+        Сохраняет результат; False, если аренда истекла и задачу уже забрал другой воркер
+        """
+        now = time.time()
+        completed = db.execute(
+            text("UPDATE explain_jobs SET status = 'succeeded', result = :result, explanation_id = :explanation_id, "
+                 f"error = NULL, locked_until = NULL, updated_at = :now, finished_at = :now WHERE {OWNED}"),
+            {**self._owner(job), "result": json.dumps(result), "explanation_id": explanation_id, "now": now}
+        ).rowcount
+        db.commit()
+        return completed == 1
+
+    def fail(self, db, job: Dict[str, Any], error: str, retryable: bool) -> Optional[bool]:
+        """
+        Возвращает задачу в очередь с задержкой retry_base * 2^(попытка-1) или завершает
+        её ошибкой, если повтор бесполезен, попытки исчерпаны или повтор не успеет до срока.
+        Возвращает True, если задача будет повторена, False, если завершена ошибкой, и None,
+        если задача уже не за этой попыткой (её забрал другой воркер) и не изменена.
+        """
+        now = time.time()
+        next_attempt = now + self.retry_base * 2 ** (job["attempts"] - 1)
+        retry = retryable and job["attempts"] < job["max_attempts"] and next_attempt < job["deadline_at"]
+        if retry:
+            updated = db.execute(
+                text("UPDATE explain_jobs SET status = 'queued', error = :error, next_attempt_at = :next_attempt, "
+                     f"locked_until = NULL, updated_at = :now WHERE {OWNED}"),
+                {**self._owner(job), "error": error, "next_attempt": next_attempt, "now": now}
+            ).rowcount
+        else:
+            updated = db.execute(
+                text("UPDATE explain_jobs SET status = 'failed', error = :error, locked_until = NULL, "
+                     f"updated_at = :now, finished_at = :now WHERE {OWNED}"),
+                {**self._owner(job), "error": error, "now": now}
+            ).rowcount
+        db.commit()
+        return retry if updated == 1 else None
+
+    def renew_lease(self, db, job: Dict[str, Any]) -> bool:
+        """
+        Продлевает аренду выполняемой задачи; False, если задача уже не за этим воркером
+        """
+        renewed = db.execute(
+            text(f"UPDATE explain_jobs SET locked_until = :lease WHERE {OWNED}"),
+            {**self._owner(job), "lease": time.time() + self.lease_seconds}
+        ).rowcount
+        db.commit()
+        return bool(renewed)
+
+    def release_own(self, db) -> int:
+        """
+        Возвращает в очередь задачи, прерванные остановкой этого процесса (попытка не засчитывается)
+        """
+        released = db.execute(
+            text("UPDATE explain_jobs SET status = 'queued', attempts = attempts - 1, locked_until = NULL, "
+                 "next_attempt_at = :now, updated_at = :now WHERE status = 'running' AND worker = :worker"),
+            {"worker": self.worker_id, "now": time.time()}
+        ).rowcount
+        db.commit()
+        return released
+
+    # --- пул воркеров ---
+
+    def start(self, handler: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        """
+        Запускает workers корутин; handler(job) выполняется в потоке и возвращает
+        {"result": ..., "explanation_id": ..., "after": [функции]} или бросает исключение
+        (JobError — с признаком повтора). Функции after вызываются после завершения задачи.
+        """
+        if self.workers <= 0 or self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=2 * self.workers, thread_name_prefix="job-worker")
+        self._tasks = [asyncio.create_task(self._work(handler), name=f"job-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._tasks:
+            with self.session_factory() as db:
+                released = self.release_own(db)
+            if released:
+                logger.info("Returned %d interrupted jobs to the queue", released)
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._tasks = []
+
+    async def _work(self, handler):
+        while True:
+            try:
+                job = await self._in_thread(self._claim_next)
+            except Exception as e:
+                logger.warning("Error claiming job: %s", e)
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.running += 1
+            try:
+                await self._run(job, handler)
+            finally:
+                self.running -= 1
+
+    def _in_thread(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args))
+
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        with self.session_factory() as db:
+            return self.claim(db)
+
+    def _renew(self, job: Dict[str, Any]) -> bool:
+        with self.session_factory() as db:
+            return self.renew_lease(db, job)
+
+    async def _run_handler(self, job: Dict[str, Any], handler, remaining: float) -> Dict[str, Any]:
+        """
+        Выполняет handler в потоке, продлевая аренду каждые lease_seconds / 3.
+        asyncio.TimeoutError, если обработчик не уложился в срок с запасом DEADLINE_GRACE
+        (поток при этом продолжает работу, но обработчик после срока ничего не сохраняет).
+        """
+        future = self._in_thread(handler, job)
+        give_up = time.monotonic() + remaining + self.DEADLINE_GRACE
+        while True:
+            timeout = min(self.lease_seconds / 3, give_up - time.monotonic())
+            if timeout <= 0:
+                raise asyncio.TimeoutError
+            done, _ = await asyncio.wait({future}, timeout=timeout)
+            if done:
+                return future.result()
+            try:
+                await self._in_thread(self._renew, job)
+            except Exception as e:
+                logger.warning("Error renewing lease of job %s: %s", job["id"], e)
+
+    async def _run(self, job: Dict[str, Any], handler):
+        started = time.time()
+        if job["attempts"] == 1:
+            JOB_SECONDS.labels("wait").observe(started - job["created_at"])
+        remaining = job["deadline_at"] - started
+        outcome, error, retryable = None, None, True
+        if job["attempts"] > job["max_attempts"]:
+            error, retryable = "Worker lost while processing the job", False
+        elif remaining <= 0:
+            error, retryable = "Deadline exceeded", False
+        else:
+            try:
+                outcome = await self._run_handler(job, handler, remaining)
+            except asyncio.TimeoutError:
+                error, retryable = "Deadline exceeded", False
+            except JobError as e:
+                error, retryable = str(e), e.retryable
+            except Exception as e:
+                logger.warning("Job %s attempt %d failed: %s", job["id"], job["attempts"], e)
+                error = str(e) or type(e).__name__
+        JOB_SECONDS.labels("run").observe(time.time() - started)
+        await self._in_thread(self._finish, job, outcome, error, retryable)
+
+    def _finish(self, job: Dict[str, Any], outcome: Optional[Dict[str, Any]], error: Optional[str], retryable: bool):
+        with self.session_factory() as db:
+            if outcome is not None:
+                finished = self.complete(db, job, outcome["result"], outcome.get("explanation_id"))
+                if finished:
+                    JOBS.labels("succeeded").inc()
+            else:
+                retry = self.fail(db, job, error, retryable)
+                if retry:
+                    JOBS.labels("retried").inc()
+                    return
+                finished = retry is not None
+                if finished:
+                    JOBS.labels("failed").inc()
+            if not finished:
+                # Аренда истекла и задачу выполняет другой воркер: его результат и обратный вызов главнее
+                logger.warning("Job %s attempt %d lost its lease, result discarded", job["id"], job["attempts"])
+            elif job["callback_url"]:
+                self._deliver_callback(db, job["id"], job["callback_url"])
+        for func in (outcome or {}).get("after", ()):
+            try:
+                func()
+            except Exception as e:
+                logger.warning("Post-job task for %s failed: %s", job["id"], e)
+
+    def _deliver_callback(self, db, job_id: str, url: str):
+        """
+        POST итоговой задачи на callback_url; несколько попыток с паузой 1, 2, 4 с.
+        Адрес проверяется перед каждой попыткой (DNS мог измениться после постановки задачи),
+        и запрос идёт только на проверенные адреса; перенаправления не выполняются: иначе
+        внешний узел мог бы направить запрос во внутреннюю сеть.
+        """
+        import requests
+
+        body = {"success": True, "job": self.get(db, job_id)}
+        status = "failed"
+        for attempt in range(self.callback_attempts):
+            try:
+                addresses = self.check_callback_url(url)
+            except CallbackURLError as e:
+                logger.warning("Callback for job %s blocked: %s", job_id, e)
+                status = "blocked"
+                break
+            try:
+                with (requests.Session() if addresses is None else pinned_session(addresses)) as session:
+                    response = session.post(url, json=body, timeout=self.callback_timeout, allow_redirects=False)
+                if response.status_code < 500:
+                    status = "delivered" if response.status_code < 300 else "rejected"
+                    break
+            except Exception as e:
+                logger.warning("Callback for job %s failed: %s", job_id, e)
+            if attempt + 1 < self.callback_attempts:
+                time.sleep(2 ** attempt)
+        db.execute(text("UPDATE explain_jobs SET callback_status = :status WHERE id = :id"),
+                   {"id": job_id, "status": status})
+        db.commit()
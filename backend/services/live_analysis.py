@@ -0,0 +1,111 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from .code_analyzer import CodeAnalyzer
+
+# Наибольший размер кода в одном соединении, символов
+LIVE_MAX_CHARS = int(os.getenv("LIVE_MAX_CHARS", "200000"))
+
+
+class LiveAnalysis:
+    """
+    Состояние анализа одного соединения редактора (/code/live).
+
+    Хранит текущий текст, к которому применяются правки из редактора, и результаты
+    анализа по частям кода (CodeAnalyzer.split_chunks): очки языков и признаки краткого
+    описания. При правке заново анализируются только изменившиеся части, остальные
+    берутся из состояния. Результат совпадает с analyze_snippet для того же текста.
+    """
+
+    def __init__(self, max_chars: int = LIVE_MAX_CHARS):
+        self.max_chars = max_chars
+        self.code = ""
+        # Язык, выбранный пользователем (None — автоопределение), как в запросе /code/explain
+        self.language: Optional[str] = None
+        # Номер последней применённой правки
+        self.version = 0
+        # Часть кода -> {"scores": [...], "facts": {язык: признаки}}
+        self._chunks: Dict[str, Dict[str, Any]] = {}
+        self._analysis: Optional[Dict[str, Any]] = None
+
+    def reset(self, code: str, language: Optional[str], version: int = 0) -> None:
+        self._check_size(len(code))
+        self.code = code
+        self.language = language
+        self.version = version
+        self._analysis = None
+
+    def set_language(self, language: Optional[str]) -> None:
+        if language != self.language:
+            self.language = language
+            self._analysis = None
+
+    def apply(self, changes: List[Dict[str, Any]], version: int) -> None:
+        """
+        Применяет правки по порядку: каждая задаётся смещением, длиной заменяемого
+        отрезка и новым текстом относительно текста после предыдущей правки.
+        Номер версии должен быть следующим за текущим, иначе клиенту нужен reset.
+        """
+        if version != self.version + 1:
+            raise ValueError(f"Expected version {self.version + 1}, got {version}")
+        code = self.code
+        for change in changes:
+            offset, length, text = int(change["offset"]), int(change.get("length", 0)), str(change.get("text", ""))
+            if offset < 0 or length < 0 or offset + length > len(code):
+                raise ValueError(f"Change range {offset}+{length} is outside the document ({len(code)} chars)")
+            self._check_size(len(code) - length + len(text))
+            code = code[:offset] + text + code[offset + length:]
+        self.code = code
+        self.version = version
+        self._analysis = None
+
+    def _check_size(self, size: int) -> None:
+        if size > self.max_chars:
+            raise ValueError(f"Code is too large for live analysis ({size} > {self.max_chars} chars)")
+
+    def analyze(self) -> Dict[str, Any]:
+        """
+        Язык, результаты validate_code и краткое описание текущего текста
+        (в том же виде, что analyze_snippet кэширует для /code/explain)
+        """
+        if self._analysis is not None:
+            return self._analysis
+        previous, self._chunks = self._chunks, {}
+
+        # Язык определяется по тексту без начальных и конечных пробелов, как в detect_language
+        stripped = self.code.strip()
+        language = CodeAnalyzer.explicit_language(stripped, self.language)
+        if language is None:
+            scores = []
+            for chunk in CodeAnalyzer.split_chunks(stripped):
+                state = self._chunk_state(chunk, previous)
+                if state["scores"] is None:
+                    state["scores"] = CodeAnalyzer.language_scores(chunk)
+                scores.append(state["scores"])
+            language = CodeAnalyzer.language_from_scores(CodeAnalyzer.merge_language_scores(scores))
+
+        validation = CodeAnalyzer.validate_code(self.code, language)
+        summary = None
+        if validation["is_valid"]:
+            parts = []
+            for chunk in CodeAnalyzer.split_chunks(self.code):
+                facts = self._chunk_state(chunk, previous)["facts"]
+                if language not in facts:
+                    facts[language] = CodeAnalyzer.summary_facts(chunk, language)
+                parts.append(facts[language])
+            summary = CodeAnalyzer.summary_from_facts(
+                CodeAnalyzer.merge_summary_facts(parts), len(self.code.split("\n"))
+            )
+        self._analysis = {"language": language, "validation": validation, "summary": summary}
+        return self._analysis
+
+    def _chunk_state(self, chunk: str, previous: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Состояние части кода: из текущего прохода, из предыдущего или новое.
+        В состоянии остаются только части текущего текста.
+        """
+        state = self._chunks.get(chunk)
+        if state is None:
+            state = previous.get(chunk) or {"scores": None, "facts": {}}
+            self._chunks[chunk] = state
+        return state
@@ -0,0 +1,283 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# Границы бакетов гистограмм по умолчанию, секунд
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Базовый класс метрики с метками (API совместим по духу с prometheus_client)
+    """
+
+    type_name = "untyped"
+    # Суффикс имени в строках HELP/TYPE (у счётчиков совпадает с именем сэмпла)
+    header_suffix = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *labelvalues: str, **labelkwargs: str):
+        if labelkwargs:
+            labelvalues = tuple(labelkwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in labelvalues)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _default(self):
+        return self.labels(*())
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        header = self.name + self.header_suffix
+        lines = [f"# HELP {header} {self.documentation}", f"# TYPE {header} {self.type_name}"]
+        with self._lock:
+            children = list(self._children.items())
+        for labelvalues, child in sorted(children):
+            lines.extend(child.render(self.name, self.labelnames, labelvalues))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def render(self, name, labelnames, labelvalues):
+        return [f"{name}_total{_format_labels(labelnames, labelvalues)} {_format_value(self._value)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+    header_suffix = "_total"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0.0
+
+    def set(self, value: float):
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def render(self, name, labelnames, labelvalues):
+        return [f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(self._value)}"]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def render(self, name, labelnames, labelvalues):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, labelvalues, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, labelvalues)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, labelvalues)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик, отдающий их в текстовом формате Prometheus
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Метрики приложения
+EXPLAIN_STAGE_SECONDS = Histogram(
+    "code_explainer_explain_stage_seconds",
+    "Длительность этапов обработки /code/explain",
+    ["stage"]
+)
+HISTORY_QUERY_SECONDS = Histogram(
+    "code_explainer_history_query_seconds",
+    "Длительность запросов к истории объяснений",
+    ["endpoint"]
+)
+DB_WRITE_SECONDS = Histogram(
+    "code_explainer_db_write_seconds",
+    "Длительность записи объяснения в базу данных"
+)
+LLM_FALLBACKS = Counter(
+    "code_explainer_llm_fallbacks",
+    "Переключения с LLM API на мок-объяснения",
+    ["reason"]
+)
+CACHE_REQUESTS = Counter(
+    "code_explainer_cache_requests",
+    "Обращения к кэшу объяснений",
+    ["cache", "result"]
+)
+JOBS = Counter(
+    "code_explainer_jobs",
+    "Попытки выполнения задач объяснения по итогу",
+    ["status"]
+)
+JOB_SECONDS = Histogram(
+    "code_explainer_job_seconds",
+    "Ожидание задачи в очереди и длительность её выполнения",
+    ["phase"]
+)
+QUEUE_DEPTH = Gauge(
+    "code_explainer_queue_depth",
+    "Текущая глубина очередей обработки",
+    ["queue"]
+)
+CACHE_SIZE = Gauge(
+    "code_explainer_cache_size",
+    "Текущее число записей в кэше",
+    ["cache"]
+)
+INCREMENTAL_BLOCKS = Counter(
+    "code_explainer_incremental_blocks",
+    "Блоки отредактированных фрагментов: объяснённые заново и взятые из предыдущей версии",
+    ["result"]
+)
+LIVE_ANALYSIS_SECONDS = Histogram(
+    "code_explainer_live_analysis_seconds",
+    "Длительность анализа правки в соединении живого анализа"
+)
+UPLOAD_FILES = Counter(
+    "code_explainer_upload_files",
+    "Файлы загрузок /code/upload по итогу: объяснённые, с ошибками и пропущенные",
+    ["result"]
+)
+UPLOAD_STAGE_SECONDS = Histogram(
+    "code_explainer_upload_stage_seconds",
+    "Длительность этапов обработки загрузки /code/upload",
+    ["stage"]
+)
+CACHE_WARMUP_ENTRIES = Counter(
+    "code_explainer_cache_warmup_entries",
+    "Частые фрагменты истории при прогреве кэшей после запуска: прогретые и пропущенные",
+    ["result"]
+)
+RATE_LIMIT_REQUESTS = Counter(
+    "code_explainer_rate_limit_requests",
+    "Запросы к группам маршрутов с лимитом: пропущенные и отклонённые (429)",
+    ["group", "result"]
+)
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "code_explainer_llm_queue_wait_seconds",
+    "Ожидание места в справедливой очереди к LLM"
+)
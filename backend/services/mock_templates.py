@@ -0,0 +1,383 @@
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Callable, Dict, List, Tuple
+
+# Отображаемые названия языков для вывода
+LANG_DISPLAY_NAMES = {
+    "cpp": "C++",
+    "csharp": "C#",
+    "javascript": "JavaScript",
+    "typescript": "TypeScript"
+}
+
+LEVEL_DISPLAY_NAMES = {
+    "beginner": "начальный",
+    "intermediate": "средний",
+    "advanced": "продвинутый"
+}
+
+DEFAULT_SUMMARY = {"purpose": "Неизвестная функциональность", "complexity": "Простая", "key_functions": []}
+
+
+class CompiledTemplate:
+    """
+    Шаблон, который один раз разбирается и компилируется в функцию вида
+    lambda c: "".join(("литерал", c["поле"], ...)). Статические поля (язык,
+    уровень) подставляются заранее через bind(), соседние литералы склеиваются.
+    """
+
+    def __init__(self, segments: Tuple[Tuple[bool, str], ...]):
+        # Сегмент — пара (является ли литералом, текст литерала или имя поля)
+        self._segments = segments
+        self.render: Callable[[Dict[str, str]], str] = self._compile(segments)
+
+    @classmethod
+    def parse(cls, source: str) -> "CompiledTemplate":
+        segments = []
+        for literal, field, _, _ in Formatter().parse(source):
+            if literal:
+                segments.append((True, literal))
+            if field:
+                segments.append((False, field))
+        return cls(tuple(segments))
+
+    def bind(self, **static: str) -> "CompiledTemplate":
+        """
+        Возвращает шаблон с подставленными статическими фрагментами
+        """
+        segments: List[Tuple[bool, str]] = []
+        for is_literal, value in self._segments:
+            if not is_literal and value in static:
+                is_literal, value = True, static[value]
+            if is_literal and segments and segments[-1][0]:
+                segments[-1] = (True, segments[-1][1] + value)
+            else:
+                segments.append((is_literal, value))
+        return CompiledTemplate(tuple(segments))
+
+    @staticmethod
+    def _compile(segments: Tuple[Tuple[bool, str], ...]) -> Callable[[Dict[str, str]], str]:
+        if not segments:
+            return lambda c: ""
+        items = ", ".join(repr(value) if is_literal else f"c[{value!r}]" for is_literal, value in segments)
+        return eval(compile(f"lambda c: ''.join(({items},))", "<mock-template>", "eval"))
+
+
+BEGINNER_TEMPLATE = CompiledTemplate.parse("""## Объяснение кода на {lang_name} (уровень {level_display})
+
+### Общее описание
+Этот пример на {lang_name} предназначен для задачи **{purpose_lower}**. Анализ показал, что уровень сложности — {complexity_lower}.
+
+### Что делает код
+Код решает задачу «{purpose_lower}».{functions_sentence}
+
+### Ключевые элементы
+{functions_line}
+{control_line}
+{operations_line}
+{variables_line}
+{patterns_text}
+
+### Фрагмент кода
+```{code_block_lang}
+{preview}
+```
+
+### Технические детали
+- **Назначение:** {purpose}
+- **Обнаруженная сложность:** {complexity_detected}
+- **Язык:** {lang_name}
+{functions_item}
+
+### Лучшие практики
+- Код следует соглашениям {lang_name}
+- {control_practice}
+- {operations_practice}
+
+Объяснение адаптировано под {level_display} уровень и построено на анализе переданного кода.""")
+
+INTERMEDIATE_TEMPLATE = CompiledTemplate.parse("""## Анализ кода на {lang_name} (уровень {level_display})
+
+### Сводка
+Этот код на {lang_name} реализует **{purpose_lower}**. Анализ показал **{complexity_lower}** уровень сложности, {functions_found}.
+
+### Логика работы
+Главная цель — {purpose_lower}. {functions_logic}
+
+#### Ключевые компоненты
+{components_text}
+
+#### Технические детали
+```{code_block_lang}
+{preview}
+```
+
+#### Разбор анализа
+- **Назначение:** {purpose}
+- **Сложность кода:** {complexity_detected}
+- **Управление потоком:** {control_text}
+{operations_item}
+{patterns_text}
+
+#### Замечания по производительности
+{performance_operations} {performance_functions}
+
+#### Продемонстрированные практики
+- {functions_practice}
+- {control_practice}
+- Соблюдаются соглашения {lang_name}
+
+Этот разбор даёт представление среднего уровня и основан на структуре вашего кода.""")
+
+ADVANCED_TEMPLATE = CompiledTemplate.parse("""## Продвинутый анализ и оптимизация кода на {lang_name}
+
+### Архитектура решения
+Код реализует **{purpose_lower}**, уровень сложности — {complexity_lower}. {functions_overview}
+
+#### Детальный разбор
+
+**1. Структура функций**
+{functions_structure}
+{functions_modularity}
+
+**2. Управление потоком**
+Задействованы конструкции: {control_text_lower}. {control_assessment}
+
+**3. Операции и паттерны**
+{operations_defined}
+{patterns_text}
+
+#### Продвинутые аспекты
+
+**Управление памятью**
+{memory_text}. {memory_note}
+
+**Алгоритмическая сложность**
+{algorithm_note}
+По управляющим конструкциям: {control_complexity}.
+
+**Производительность**
+{performance_operations}
+
+#### Структура кода
+```{code_block_lang}
+{first_line}
+...
+```
+
+#### Возможности оптимизации
+{optimization_refactor}
+{optimization_operations}
+{optimization_control}
+
+#### Рекомендации для продакшена
+- {recommendation_functions}
+- {recommendation_control}
+- {recommendation_operations}
+
+Этот анализ основан на фактическом содержимом кода и предназначен для продвинутых разработчиков, работающих с {lang_name}.""")
+
+
+@lru_cache(maxsize=256)
+def _bound_template(complexity_level: str, language: str) -> CompiledTemplate:
+    """
+    Кэширует шаблон уровня с уже подставленными фрагментами, зависящими от языка
+    """
+    template = {
+        "intermediate": INTERMEDIATE_TEMPLATE,
+        "advanced": ADVANCED_TEMPLATE
+    }.get(complexity_level, BEGINNER_TEMPLATE)
+    return template.bind(
+        lang_name=LANG_DISPLAY_NAMES.get(language, language.capitalize()),
+        code_block_lang=language,
+        level_display=LEVEL_DISPLAY_NAMES.get(complexity_level, complexity_level)
+    )
+
+
+# Фрагменты, зависящие от одной части анализа кода (функции, управляющие
+# конструкции, операции, назначение), кэшируются: их словарь значений невелик,
+# а одинаковые комбинации повторяются между запросами.
+
+def _functions_text(functions: Tuple[str, ...]) -> str:
+    if not functions:
+        return "Функции не обнаружены"
+    if len(functions) == 1:
+        return f"`{functions[0]}`"
+    if len(functions) <= 3:
+        return ", ".join([f"`{f}`" for f in functions])
+    return ", ".join([f"`{f}`" for f in functions[:3]]) + f", и ещё {len(functions) - 3}"
+
+
+@lru_cache(maxsize=1024)
+def _functions_fragments(complexity_level: str, functions: Tuple[str, ...]) -> Dict[str, str]:
+    functions_text = _functions_text(functions)
+    count = str(len(functions))
+    if complexity_level == "intermediate":
+        return {
+            "component_functions": f"**Функции:** {functions_text}" if functions else "",
+            "functions_found": "обнаружено " + count + " функци(й/и)" if functions else "функции не задействованы",
+            "functions_logic": "Для этого используются функции: " + functions_text + "." if functions else "Логика реализована напрямую в теле кода.",
+            "performance_functions": "Наличие " + count + " функци(й/и) повышает модульность." if functions else "",
+            "functions_practice": "Ясное разделение логики по функциям" if functions else "Последовательная реализация без вспомогательных функций"
+        }
+    if complexity_level == "advanced":
+        return {
+            "functions_overview": "В коде определено " + count + " функци(й/и): " + functions_text + "." if functions else "Реализация выполнена без выделенных функций.",
+            "functions_structure": "Код использует следующие функции: " + functions_text + "." if functions else "Функции не обнаружены — логика реализована процедурно.",
+            "functions_modularity": "Количество функций указывает на " + ("модульный подход" if len(functions) > 1 else "сфокусированный дизайн под одну задачу") if functions else "",
+            "algorithm_note": "Наличие " + count + " функци(й/и) намекает на " + ("возможность оптимизации через рефакторинг" if len(functions) > 3 else "хорошую модульность") + "." if functions else "Стоит рассмотреть вынос частей логики в функции для переиспользования.",
+            "recommendation_functions": "Модульный дизайн с " + count + " функци(ями/ями) упрощает тестирование и поддержку." if functions else "Рассмотрите выделение функций для упрощения тестирования."
+        }
+    return {
+        "functions_sentence": " Он включает следующие функции: " + functions_text + "." if functions else " Операции выполняются без явных определений функций.",
+        "functions_line": "**Функции:** " + functions_text if functions else "",
+        "functions_item": "- **Функции:** " + functions_text if functions else ""
+    }
+
+
+@lru_cache(maxsize=1024)
+def _control_fragments(complexity_level: str, control_structures: Tuple[str, ...]) -> Dict[str, str]:
+    control_text = ", ".join(control_structures) if control_structures else "Прямолинейное последовательное выполнение"
+    if complexity_level == "intermediate":
+        return {
+            "control_text": control_text,
+            "component_control": f"**Управление потоком:** {control_text}" if control_structures else "",
+            "control_practice": "Корректное использование " + control_text.lower() if control_structures else "Линейное исполнение без ветвлений"
+        }
+    if complexity_level == "advanced":
+        return {
+            "control_text_lower": control_text.lower(),
+            "control_assessment": "Это говорит о " + ("сложной логике принятия решений" if len(control_structures) > 2 else "умеренной ветвистости") if control_structures else "Исполнение идёт последовательно.",
+            "control_complexity": "сложная логика ветвлений" if len(control_structures) > 2 else "умеренная сложность",
+            "optimization_control": "Множественные управляющие конструкции (" + str(len(control_structures)) + ") можно упростить для повышения читабельности." if len(control_structures) > 3 else "",
+            "recommendation_control": control_text + " требует внимательного учета крайних случаев." if control_structures else "Прямолинейный поток снижает риск ошибок."
+        }
+    return {
+        "control_line": "**Управление потоком:** " + control_text if control_structures else "",
+        "control_practice": "Используются соответствующие управляющие конструкции" if control_structures else "Выполнение идёт последовательно без ветвлений"
+    }
+
+
+@lru_cache(maxsize=1024)
+def _operations_fragments(complexity_level: str, operations: Tuple[str, ...], lang_name: str) -> Dict[str, str]:
+    operations_text = ", ".join(operations) if operations else "Базовые операции"
+    if complexity_level == "intermediate":
+        return {
+            "component_operations": f"**Операции:** {operations_text}" if operations else "",
+            "operations_item": "- **Операции:** " + operations_text if operations else "",
+            "performance_operations": "Код выполняет " + operations_text + ", что может повлиять на производительность." if operations else "Производительность соответствует базовому сценарию."
+        }
+    if complexity_level == "advanced":
+        memory_ops = [op for op in operations if 'memory' in op or 'allocation' in op or 'deallocation' in op]
+        return {
+            "operations_defined": "Определены операции: " + operations_text + "." if operations else "Выполняются базовые операции.",
+            "memory_text": ", ".join(memory_ops) if memory_ops else "Стандартное управление памятью",
+            "memory_note": "Код явно управляет памятью" if memory_ops else f"Память контролируется рантаймом {lang_name}.",
+            "performance_operations": "Код выполняет " + operations_text + ", что влияет на характеристики производительности." if operations else "Производительность определяется базовой последовательной обработкой.",
+            "optimization_operations": "Наличие операций (" + operations_text + ") требует внимания к производительности." if operations else "",
+            "recommendation_operations": "Операции (" + operations_text + ") стоит мониторить в продуктивной среде." if operations else ""
+        }
+    return {
+        "operations_line": "**Операции:** " + operations_text if operations else "",
+        "operations_practice": "Основные операции: " + operations_text if operations else "Задействованы базовые операции"
+    }
+
+
+@lru_cache(maxsize=256)
+def _summary_fragments(purpose: str, complexity_detected: str) -> Dict[str, str]:
+    return {
+        "purpose": purpose,
+        "purpose_lower": purpose.lower(),
+        "complexity_detected": complexity_detected,
+        "complexity_lower": complexity_detected.lower(),
+        "optimization_refactor": "Рассмотрите рефакторинг на более мелкие функции, если сложность превышает комфортный уровень." if complexity_detected == "Сложная" else "Структура кода сбалансирована для текущей задачи."
+    }
+
+
+def render_mock_explanation(code_snippet: str, language: str, complexity_level: str,
+                            code_summary: Dict[str, Any] = None) -> str:
+    """
+    Формирует мок-объяснение по шаблону выбранного уровня сложности
+    """
+    if code_summary is None:
+        code_summary = DEFAULT_SUMMARY
+
+    variables = code_summary.get("key_variables", [])
+    patterns = code_summary.get("patterns", [])
+
+    context = {
+        **_summary_fragments(
+            code_summary.get("purpose", "Неизвестная функциональность"),
+            code_summary.get("complexity", "Простая")
+        ),
+        **_functions_fragments(complexity_level, tuple(code_summary.get("key_functions", []))),
+        **_control_fragments(complexity_level, tuple(code_summary.get("control_structures", []))),
+        **_operations_fragments(
+            complexity_level,
+            tuple(code_summary.get("operations", [])),
+            LANG_DISPLAY_NAMES.get(language, language.capitalize())
+        ),
+        "patterns_text": "\n".join("- " + p for p in patterns) if patterns else ""
+    }
+    variables_line = "**Ключевые переменные:** " + ", ".join([f"`{v}`" for v in variables[:5]]) if variables else ""
+
+    if complexity_level == "advanced":
+        context["first_line"] = code_snippet.split('\n')[0][:80] if code_snippet else "code_example"
+    else:
+        context["preview"] = code_snippet[:200] + "..." if len(code_snippet) > 200 else code_snippet
+        if complexity_level == "intermediate":
+            components = [
+                component for component in (
+                    context["component_functions"],
+                    context["component_control"],
+                    context["component_operations"],
+                    variables_line
+                ) if component
+            ]
+            context["components_text"] = "\n".join(f"- {c}" for c in components) if components else "- Базовая структура кода"
+        else:
+            context["variables_line"] = variables_line
+
+    return _bound_template(complexity_level, language).render(context)
+
+
+def render_mock_project_overview(files: List[Dict[str, Any]], complexity_level: str) -> str:
+    """
+    Формирует мок-обзор загруженного проекта по кратким описаниям файлов
+    """
+    languages: Dict[str, int] = {}
+    for file in files:
+        languages[file["language"]] = languages.get(file["language"], 0) + 1
+    languages_text = ", ".join(
+        f"{LANG_DISPLAY_NAMES.get(language, language.capitalize())} — {count}"
+        for language, count in sorted(languages.items(), key=lambda item: -item[1])
+    )
+
+    lines = [
+        "## Обзор проекта",
+        "",
+        f"**Файлов:** {len(files)} ({languages_text})",
+        f"**Уровень:** {LEVEL_DISPLAY_NAMES.get(complexity_level, complexity_level)}",
+        "",
+        "### Файлы",
+        ""
+    ]
+    for file in files:
+        summary = file.get("summary")
+        if summary is None:
+            lines.append(f"- `{file['path']}` — код содержит ошибки и не объяснялся")
+            continue
+        line = f"- `{file['path']}` — {summary.get('purpose', 'Неизвестная функциональность').lower()}"
+        if summary.get("key_functions"):
+            line += ": " + ", ".join(f"`{name}`" for name in summary["key_functions"])
+        lines.append(line)
+
+    # Читать проект удобнее с самых насыщенных функциями файлов
+    entry_points = sorted(
+        (file for file in files if file.get("summary")),
+        key=lambda file: -len(file["summary"].get("key_functions", []))
+    )[:3]
+    if entry_points:
+        lines += ["", "### С чего начать", ""]
+        lines += [f"- `{file['path']}`" for file in entry_points]
+    return "\n".join(lines)
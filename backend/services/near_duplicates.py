@@ -0,0 +1,204 @@
+import hashlib
+import logging
+import os
+import struct
+import zlib
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, text
+
+from .code_analyzer import CodeAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# Параметры MinHash/LSH: 64 корзины сигнатуры, 16 полос по 4 значения, шинглы из 4 токенов
+NUM_BINS = 64
+ROWS_PER_BAND = 4
+SHINGLE_SIZE = 4
+EMPTY_BIN = 0xFFFFFFFF
+SIGNATURE_FORMAT = f"<{NUM_BINS}I"
+
+Signature = Tuple[int, ...]
+
+
+class Fingerprint(NamedTuple):
+    token_count: int
+    # Хэш нормализованного потока токенов: точное совпадение после нормализации
+    digest: str
+    signature: Signature
+
+
+def minhash_signature(tokens: Sequence[str]) -> Signature:
+    """
+    MinHash с одной перестановкой: каждый шингл хэшируется один раз, младшие биты хэша
+    выбирают корзину, в корзине остаётся минимум. crc32 выбран вместо hash(), потому что
+    он одинаков во всех процессах, и дешевле криптографических хэшей.
+    """
+    signature = [EMPTY_BIN] * NUM_BINS
+    size = min(SHINGLE_SIZE, len(tokens))
+    for i in range(len(tokens) - size + 1):
+        h = (zlib.crc32(" ".join(tokens[i:i + size]).encode("utf-8")) * 0x9E3779B1) & 0xFFFFFFFF
+        slot = h % NUM_BINS
+        value = h // NUM_BINS
+        if value < signature[slot]:
+            signature[slot] = value
+    return tuple(signature)
+
+
+def estimate_similarity(a: Signature, b: Signature) -> float:
+    """
+    Оценка сходства Жаккара по совпадающим корзинам (пустые в обеих сигнатурах не учитываются)
+    """
+    compared = equal = 0
+    for x, y in zip(a, b):
+        if x == EMPTY_BIN and y == EMPTY_BIN:
+            continue
+        compared += 1
+        if x == y:
+            equal += 1
+    return equal / compared if compared else 0.0
+
+
+def band_keys(signature: Signature) -> List[int]:
+    """
+    Ключи полос LSH: номер полосы в старших битах, crc32 её значений — в младших
+    """
+    keys = []
+    for band in range(NUM_BINS // ROWS_PER_BAND):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        if all(value == EMPTY_BIN for value in rows):
+            continue
+        keys.append((band << 32) | zlib.crc32(struct.pack(f"<{ROWS_PER_BAND}I", *rows)))
+    return keys
+
+
+class NearDuplicateIndex:
+    """
+    Индекс почти одинаковых фрагментов (отличаются именами переменных, пробелами,
+    комментариями, литералами) в таблицах snippet_fingerprints и snippet_lsh_buckets.
+    Сначала ищется совпадение нормализованного потока токенов целиком (переименования,
+    комментарии, пробелы — один поиск по индексу), затем кандидаты по совпадению полос LSH,
+    у которых сравниваются сигнатуры; ответ возвращается при сходстве не ниже threshold.
+    """
+
+    EXACT_SQL = text(
+        "SELECT explanation_id FROM snippet_fingerprints "
+        "WHERE digest = :digest AND language = :language AND complexity_level = :level "
+        "ORDER BY explanation_id DESC LIMIT 1"
+    )
+
+    # Кандидаты упорядочены по числу совпавших полос: оно растёт со сходством, поэтому
+    # частые полосы (типовые конструкции) не вытесняют настоящие дубликаты из LIMIT
+    CANDIDATES_SQL = text(
+        "SELECT f.explanation_id, f.signature FROM ("
+        "SELECT explanation_id, COUNT(*) AS bands FROM snippet_lsh_buckets WHERE band_key IN :keys "
+        "GROUP BY explanation_id ORDER BY bands DESC, explanation_id DESC LIMIT :limit) c "
+        "JOIN snippet_fingerprints f ON f.explanation_id = c.explanation_id "
+        "WHERE f.language = :language AND f.complexity_level = :level"
+    ).bindparams(bindparam("keys", expanding=True))
+
+    def __init__(self, enabled: bool = True, threshold: float = 0.9, min_tokens: int = 20,
+                 max_candidates: int = 32):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.min_tokens = min_tokens
+        self.max_candidates = max_candidates
+
+    @classmethod
+    def from_env(cls) -> "NearDuplicateIndex":
+        return cls(
+            enabled=os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true",
+            threshold=float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9")),
+            min_tokens=int(os.getenv("NEAR_DUPLICATE_MIN_TOKENS", "20")),
+            max_candidates=int(os.getenv("NEAR_DUPLICATE_MAX_CANDIDATES", "32"))
+        )
+
+    def fingerprint(self, code_snippet: str, language: str) -> Optional[Fingerprint]:
+        """
+        Отпечаток фрагмента или None для слишком коротких фрагментов:
+        у них почти одинаковые нормализованные токены при разном смысле
+        """
+        tokens = CodeAnalyzer.normalize_tokens(code_snippet, language)
+        if len(tokens) < self.min_tokens:
+            return None
+        digest = hashlib.blake2b(" ".join(tokens).encode("utf-8"), digest_size=16).hexdigest()
+        return Fingerprint(len(tokens), digest, minhash_signature(tokens))
+
+    def find(self, db, fingerprint: Fingerprint, language: str,
+             complexity_level: str) -> Optional[Dict[str, Any]]:
+        """
+        Самое похожее сохранённое объяснение того же языка и уровня или None
+        """
+        best_id = db.execute(self.EXACT_SQL, {
+            "digest": fingerprint.digest, "language": language, "level": complexity_level
+        }).scalar()
+        best_similarity = 1.0
+        if best_id is None:
+            rows = db.execute(self.CANDIDATES_SQL, {
+                "keys": band_keys(fingerprint.signature),
+                "language": language,
+                "level": complexity_level,
+                "limit": self.max_candidates
+            }).fetchall()
+            best_similarity = 0.0
+            for explanation_id, stored in rows:
+                similarity = estimate_similarity(fingerprint.signature, struct.unpack(SIGNATURE_FORMAT, stored))
+                if similarity > best_similarity:
+                    best_id, best_similarity = explanation_id, similarity
+        if best_id is None or best_similarity < self.threshold:
+            return None
+        explanation = db.execute(
+            text("SELECT explanation FROM code_explanations WHERE id = :id"), {"id": best_id}
+        ).scalar()
+        if explanation is None:
+            return None
+        return {"explanation_id": best_id, "similarity": round(best_similarity, 3), "explanation": explanation}
+
+    def add(self, db, explanation_id: int, fingerprint: Fingerprint, language: str,
+            complexity_level: str, commit: bool = True) -> None:
+        db.execute(
+            text("INSERT OR REPLACE INTO snippet_fingerprints "
+                 "(explanation_id, language, complexity_level, token_count, digest, signature) "
+                 "VALUES (:id, :language, :level, :token_count, :digest, :signature)"),
+            {"id": explanation_id, "language": language, "level": complexity_level,
+             "token_count": fingerprint.token_count, "digest": fingerprint.digest,
+             "signature": struct.pack(SIGNATURE_FORMAT, *fingerprint.signature)}
+        )
+        db.execute(
+            text("INSERT OR IGNORE INTO snippet_lsh_buckets (band_key, explanation_id) VALUES (:key, :id)"),
+            [{"key": key, "id": explanation_id} for key in band_keys(fingerprint.signature)]
+        )
+        if commit:
+            db.commit()
+
+    def rebuild(self, db) -> int:
+        """
+        Строит индекс заново по всей истории (например, для записей, сохранённых до его появления)
+        """
+        db.execute(text("DELETE FROM snippet_lsh_buckets"))
+        db.execute(text("DELETE FROM snippet_fingerprints"))
+        indexed = 0
+        rows = db.execute(text("SELECT id, code_snippet, language, complexity_level FROM code_explanations")).fetchall()
+        for explanation_id, code_snippet, language, complexity_level in rows:
+            fingerprint = self.fingerprint(code_snippet, language)
+            if fingerprint is not None:
+                self.add(db, explanation_id, fingerprint, language, complexity_level, commit=False)
+                indexed += 1
+        db.commit()
+        return indexed
+
+
+if __name__ == "__main__":
+    from .history_shards import HistoryShards
+
+    logging.basicConfig(level=logging.INFO)
+    shards = HistoryShards.from_env()
+    shards.create_tables()
+    index = NearDuplicateIndex.from_env()
+    for shard in range(len(shards)):
+        session = shards.session(shard)
+        try:
+            count = index.rebuild(session)
+        finally:
+            session.close()
+        logger.info("Near-duplicate index of shard %d rebuilt: %d explanations indexed", shard, count)
@@ -0,0 +1,128 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+
+class ProfilerBusyError(RuntimeError):
+    """
+    Профилировщик уже запущен другим запросом
+    """
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профилировщик всего процесса: с заданным интервалом снимает стеки
+    всех потоков через sys._current_frames() и агрегирует их в формате collapsed stacks
+    (строка «поток;кадр;...;кадр число», вход для flamegraph.pl и speedscope).
+    Код приложения не инструментируется, поэтому накладные расходы малы.
+    """
+
+    # Кадры ожидания (файл, функция): стеки, заканчивающиеся ими, по умолчанию не учитываются
+    IDLE_FRAMES = frozenset({
+        ("threading.py", "wait"),
+        ("selectors.py", "select"),
+        ("queue.py", "get"),
+        ("socket.py", "accept"),
+        ("socketserver.py", "serve_forever"),
+    })
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, seconds: float, interval: float = 0.005, include_idle: bool = False) -> str:
+        """
+        Снимает стеки в течение seconds секунд и возвращает их в формате collapsed stacks.
+        Блокирует вызывающий поток, поэтому из обработчика запускается через to_thread.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("Sampling profiler is already running")
+        try:
+            return self._sample(seconds, interval, include_idle)
+        finally:
+            self._lock.release()
+
+    def _is_idle(self, frame) -> bool:
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in self.IDLE_FRAMES
+
+    def _sample(self, seconds: float, interval: float, include_idle: bool) -> str:
+        own_id = threading.get_ident()
+        counts: Counter = Counter()
+        labels: Dict[object, str] = {}
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if not include_idle and self._is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(frame)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+                counts[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        lines = [f"{stack} {count}" for stack, count in counts.most_common()]
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+class RequestProfileStore:
+    """
+    Последние результаты профилирования отдельных запросов (X-Profile) по идентификатору
+    """
+
+    def __init__(self, max_size: int = 20):
+        self.max_size = max_size
+        self._profiles: "OrderedDict[str, pstats.Stats]" = OrderedDict()
+        self._lock = threading.Lock()
+        # cProfile в одном потоке допускает только один активный профилировщик
+        self.active = threading.Lock()
+
+    def add(self, profile_id: str, profiler: cProfile.Profile):
+        stats = pstats.Stats(profiler)
+        with self._lock:
+            self._profiles[profile_id] = stats
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[pstats.Stats]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    @staticmethod
+    def render_text(stats: pstats.Stats, sort: str = "cumulative", limit: int = 50) -> str:
+        stream = io.StringIO()
+        # Копия: strip_dirs изменяет статистику, а исходная может понадобиться в формате pstats
+        report = pstats.Stats(stream=stream)
+        report.add(stats)
+        report.strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    @staticmethod
+    def render_pstats(stats: pstats.Stats) -> bytes:
+        """
+        Бинарный формат pstats (как у cProfile -o) для snakeviz и pstats.Stats(файл)
+        """
+        return marshal.dumps(stats.stats)
+
+
+sampling_profiler = SamplingProfiler()
+request_profiles = RequestProfileStore()
@@ -0,0 +1,166 @@
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .metrics import RATE_LIMIT_REQUESTS
+
+# Заголовок с ключом API клиента; без него клиент определяется по IP-адресу
+API_KEY_HEADER = os.getenv("API_KEY_HEADER", "X-API-Key").lower()
+# Выданные ключи API (через запятую). Клиентом считается только известный ключ: иначе
+# случайный ключ в каждом запросе давал бы новую корзину и новый поток справедливой очереди
+API_KEYS = tuple(key.strip().encode("utf-8") for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip())
+# Брать IP клиента из X-Forwarded-For (только за доверенным обратным прокси)
+TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+# Группы маршрутов с общим лимитом: (группа, метод или None — любой, префиксы пути)
+ROUTE_GROUPS: Sequence[Tuple[str, Optional[str], Tuple[str, ...]]] = (
+    ("explain", "POST", ("/code/explain", "/code/jobs", "/code/upload")),
+    ("history", None, ("/history",)),
+)
+
+
+def client_id(api_key: Optional[str], forwarded_for: Optional[str], host: Optional[str]) -> str:
+    """
+    Идентификатор клиента для лимитов и счётчиков: хэш ключа API (сам ключ не хранится),
+    если ключ есть в RATE_LIMIT_API_KEYS, иначе IP-адрес
+    """
+    if api_key and is_known_api_key(api_key):
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    if TRUST_FORWARDED_FOR and forwarded_for:
+        return "ip:" + forwarded_for.split(",")[0].strip()
+    return "ip:" + (host or "unknown")
+
+
+def is_known_api_key(api_key: str) -> bool:
+    """
+    Сравнивает ключ со всеми выданными за постоянное время (без раннего выхода)
+    """
+    candidate = api_key.encode("utf-8")
+    known = False
+    for key in API_KEYS:
+        known |= secrets.compare_digest(candidate, key)
+    return known
+
+
+def route_group(method: str, path: str) -> Optional[str]:
+    for group, group_method, prefixes in ROUTE_GROUPS:
+        if (group_method is None or method == group_method) and path.startswith(prefixes):
+            return group
+    return None
+
+
+class ClientUsage:
+    """
+    Счётчики использования по клиентам (запросы и отказы по группам, вызовы LLM и ожидание
+    в очереди к нему). Хранятся последние max_clients активных клиентов.
+    Пишут и поток цикла событий, и потоки вызовов LLM, поэтому доступ под блокировкой.
+    """
+
+    def __init__(self, max_clients: int = 10000):
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, client: str, **amounts: float):
+        now = time.time()
+        with self._lock:
+            counters = self._clients.get(client)
+            if counters is None:
+                counters = self._clients[client] = {"first_seen": now}
+                if len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client)
+            counters["last_seen"] = now
+            for name, amount in amounts.items():
+                counters[name] = counters.get(name, 0) + amount
+
+    def get(self, client: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._clients.get(client, {}))
+
+    def snapshot(self, limit: int = 100, sort: str = "last_seen") -> List[Dict[str, Any]]:
+        """
+        Клиенты по убыванию счётчика sort (по умолчанию — недавно активные первыми)
+        """
+        with self._lock:
+            clients = [{"client": client, **counters} for client, counters in self._clients.items()]
+        clients.sort(key=lambda counters: counters.get(sort, 0), reverse=True)
+        for counters in clients:
+            for name in ("llm_queue_seconds", "llm_seconds"):
+                if name in counters:
+                    counters[name] = round(counters[name], 3)
+        return clients[:limit]
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+class RateLimiter:
+    """
+    Лимиты запросов по клиентам: маркерная корзина на клиента и группу маршрутов.
+    Корзина вмещает burst запросов и пополняется со скоростью rate запросов в секунду,
+    поэтому короткий всплеск проходит, а долгий поток ограничивается скоростью rate.
+    Вызывается только из потока цикла событий (middleware), поэтому без блокировки.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], usage: ClientUsage, enabled: bool = True,
+                 max_buckets: int = 20000):
+        # Группа без лимита (rate <= 0) только учитывается в счётчиках
+        self.limits = {group: (rate, burst) for group, (rate, burst) in limits.items() if rate > 0}
+        self.usage = usage
+        self.enabled = enabled
+        self.max_buckets = max_buckets
+        # (клиент, группа) -> [маркеры, время пополнения]
+        self._buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls, usage: ClientUsage) -> "RateLimiter":
+        limits = {}
+        for group, rate, burst in (("explain", "1", "20"), ("history", "20", "100")):
+            prefix = f"RATE_LIMIT_{group.upper()}"
+            limits[group] = (float(os.getenv(f"{prefix}_RATE", rate)), float(os.getenv(f"{prefix}_BURST", burst)))
+        return cls(
+            limits,
+            usage,
+            enabled=os.getenv("RATE_LIMIT_ENABLED", "false").lower() == "true",
+            max_buckets=int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000")) * len(limits)
+        )
+
+    def acquire(self, client: str, group: str) -> Tuple[bool, Optional[float], float]:
+        """
+        Учитывает запрос клиента к группе и забирает маркер.
+        Возвращает (разрешён, остаток маркеров или None без лимита, через сколько секунд
+        появится маркер).
+        """
+        limit = self.limits.get(group) if self.enabled else None
+        if limit is None:
+            self.usage.add(client, **{f"{group}_requests": 1})
+            return True, None, 0.0
+
+        rate, burst = limit
+        now = time.monotonic()
+        key = (client, group)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            if len(self._buckets) > self.max_buckets:
+                # Давно не обращавшийся клиент при возвращении получит полную корзину
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.usage.add(client, **{f"{group}_requests": 1})
+            RATE_LIMIT_REQUESTS.labels(group, "allowed").inc()
+            return True, bucket[0], 0.0
+        self.usage.add(client, **{f"{group}_requests": 1, f"{group}_limited": 1})
+        RATE_LIMIT_REQUESTS.labels(group, "limited").inc()
+        return False, bucket[0], (1 - bucket[0]) / rate
@@ -0,0 +1,66 @@
+import hashlib
+from typing import Callable, Optional, Tuple
+
+from .metrics import CACHE_REQUESTS
+from .shared_cache import LocalLRUCache
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Проверяет заголовок If-None-Match (список тегов или «*»); слабые теги сравниваются
+    без префикса W/, как требует RFC 9110 для условного GET
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == bare:
+            return True
+    return False
+
+
+class VersionedResponseCache:
+    """
+    Кэш сериализованных ответов, привязанных к версии данных.
+    ETag строится из версии таблицы и ключа запроса (путь и параметры), поэтому
+    If-None-Match проверяется без выполнения запроса к данным. Тело ответа хранится
+    в LRU процесса вместе с версией и становится недействительным при её изменении.
+    """
+
+    def __init__(self, name: str, max_size: int = 256):
+        self.name = name
+        self.entries = LocalLRUCache(max_size)
+
+    @staticmethod
+    def make_etag(key: str, version: int) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        return f'W/"{version}-{digest}"'
+
+    def resolve(self, key: str, version: int, if_none_match: Optional[str],
+                build: Callable[[], bytes]) -> Tuple[str, Optional[bytes]]:
+        """
+        Возвращает (ETag, тело); тело None означает, что у клиента актуальная версия (304).
+        build() вызывается только при промахе кэша.
+        """
+        etag = self.make_etag(key, version)
+        if etag_matches(if_none_match, etag):
+            CACHE_REQUESTS.labels(self.name, "not_modified").inc()
+            return etag, None
+
+        cached = self.entries.get(key)
+        if cached is not None and cached[0] == version:
+            CACHE_REQUESTS.labels(self.name, "hit").inc()
+            return etag, cached[1]
+        CACHE_REQUESTS.labels(self.name, "miss").inc()
+        body = build()
+        self.entries.set(key, (version, body))
+        return etag, body
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,455 @@
+import heapq
+import logging
+import math
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+
+from .tracing import tracer
+
+# NumPy — необязательная зависимость: без неё поиск идёт по массиву array('f') из stdlib
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Блокировки файла индекса между воркерами; на Windows индекс пишет один процесс
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Заголовок файла векторов: сигнатура, версия формата, размерность и последняя учтённая
+# запись журнала удалений deleted_explanations
+HEADER = struct.Struct("<4sHHq")
+DELETED_SEQ = struct.Struct("<q")
+DELETED_SEQ_OFFSET = 8
+MAGIC = b"CESI"
+# Версия 2: журнал удалений (индексы версии 1 строятся заново, без векторов удалённых записей)
+FORMAT_VERSION = 2
+
+# Слова латиницей с разбиением camelCase и snake_case, слова кириллицей
+WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[а-яё]+", re.IGNORECASE)
+SUFFIXES = ("ations", "ation", "ions", "ion", "ings", "ing", "ers", "er", "ed", "es", "s")
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have if in into is it its of on or that the then this "
+    "to was we which will with you your can does do not".split()
+)
+# Вклад кода в вектор относительно текста объяснения; биграммы весят меньше слов
+CODE_WEIGHT = 0.7
+BIGRAM_WEIGHT = 0.5
+
+
+def stem(word: str) -> str:
+    """
+    Грубая нормализация словоформ: deletion, deleting, deleted, delete -> delet;
+    русские слова обрезаются до шести букв
+    """
+    word = word.lower()
+    if not word.isascii():
+        return word[:6]
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    if word.endswith("e") and len(word) > 4:
+        word = word[:-1]
+    return word
+
+
+def terms(value: str) -> List[str]:
+    return [stem(word) for word in WORD_RE.findall(value) if word.lower() not in STOP_WORDS and len(word) > 1]
+
+
+def embed_text(value: str, dim: int, code: str = "") -> array:
+    """
+    Локальный эмбеддинг без модели и сети: хэширование слов и биграмм (crc32) в dim
+    координат со знаком, логарифмический вес частоты, нормировка L2. Похожие по
+    словам тексты получают близкие векторы, косинус считается скалярным произведением.
+    """
+    weights: Dict[str, float] = Counter()
+    for source, weight in ((value, 1.0), (code, CODE_WEIGHT)):
+        words = terms(source)
+        for word in words:
+            weights["w:" + word] += weight
+        for first, second in zip(words, words[1:]):
+            weights["b:" + first + " " + second] += weight * BIGRAM_WEIGHT
+    vector = array("f", bytes(4 * dim))
+    for feature, weight in weights.items():
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += math.log1p(weight) if h & 0x80000000 else -math.log1p(weight)
+    norm = math.sqrt(sum(x * x for x in vector))
+    if norm:
+        for i in range(dim):
+            vector[i] /= norm
+    return vector
+
+
+class SemanticIndex:
+    """
+    Векторный индекс истории для поиска по смыслу. Векторы (code_snippet + explanation)
+    хранятся подряд в файле float32 (<path>.f32), идентификаторы объяснений — в <path>.ids.
+    Файлы только дописываются: новые записи истории индексируются пачками по batch_size
+    (после записи, перед поиском и при старте), поэтому индекс не перестраивается целиком.
+    Строки удалённых объяснений (журнал deleted_explanations) обнуляются на месте: нулевой
+    вектор не находится поиском, а нулевой id не мешает проиндексировать запись, получившую
+    тот же id после удаления. Воркеры делят файлы через flock и видят чужие изменения
+    по размеру файла и номеру учтённого удаления в заголовке.
+    """
+
+    def __init__(self, path: str, dim: int = 128, enabled: bool = True, batch_size: int = 64,
+                 flush_interval: float = 5.0):
+        self.path = path
+        self.dim = dim
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.vectors_path = path + ".f32"
+        self.ids_path = path + ".ids"
+        self.lock_path = path + ".lock"
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._last_id = 0
+        self._deleted_seq = 0
+        self._ids = array("q")
+        self._vectors = array("f")
+        self._pending_writes = 0
+        self._last_sync = 0.0
+        self._catch_up_thread = None
+
+    @classmethod
+    def from_env(cls, shard: int = 0) -> "SemanticIndex":
+        """
+        Индекс шарда истории shard: у каждого шарда свои файлы (id растут только внутри шарда)
+        """
+        path = os.getenv("SEMANTIC_INDEX_PATH") or os.path.join(
+            os.getenv("DATABASE_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+            "semantic_index"
+        )
+        if shard:
+            path += f".shard{shard}"
+        return cls(
+            path,
+            dim=int(os.getenv("SEMANTIC_INDEX_DIM", "128")),
+            enabled=os.getenv("SEMANTIC_SEARCH_ENABLED", "true").lower() == "true",
+            batch_size=int(os.getenv("SEMANTIC_INDEX_BATCH_SIZE", "64")),
+            flush_interval=float(os.getenv("SEMANTIC_INDEX_FLUSH_SECONDS", "5"))
+        )
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # --- файлы индекса ---
+
+    def _file_lock(self, exclusive: bool, blocking: bool = True):
+        """
+        Открытый файл блокировки (закрытие снимает её) или None, если блокировка занята
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        handle = open(self.lock_path, "a+b")
+        if fcntl is None:
+            return handle
+        flags = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(handle, flags)
+        except BlockingIOError:
+            handle.close()
+            return None
+        return handle
+
+    def _read_header(self) -> Optional[int]:
+        """
+        Последняя учтённая запись журнала удалений или None, если файла нет или он другого формата
+        """
+        try:
+            with open(self.vectors_path, "rb") as f:
+                magic, version, dim, deleted_seq = HEADER.unpack(f.read(HEADER.size))
+        except (OSError, struct.error):
+            return None
+        if magic != MAGIC or version != FORMAT_VERSION or dim != self.dim:
+            return None
+        return deleted_seq
+
+    def _file_rows(self) -> int:
+        """
+        Число целых строк в паре файлов (хвост, оборванный при сбое, не учитывается)
+        """
+        if self._read_header() is None:
+            return -1
+        try:
+            vectors_size = os.path.getsize(self.vectors_path)
+            ids_size = os.path.getsize(self.ids_path)
+        except OSError:
+            return -1
+        return min(ids_size // 8, (vectors_size - HEADER.size) // (4 * self.dim))
+
+    def _reset_files(self):
+        """
+        Создаёт пустой индекс; старые файлы заменяются атомарно, открытые отображения
+        в других воркерах остаются на прежних файлах до перечитывания
+        """
+        for path, content in ((self.vectors_path, HEADER.pack(MAGIC, FORMAT_VERSION, self.dim, 0)), (self.ids_path, b"")):
+            with open(path + ".tmp", "wb") as f:
+                f.write(content)
+            os.replace(path + ".tmp", path)
+
+    def _refresh(self):
+        """
+        Перечитывает индекс, если файлы изменились (дописаны или обнулены этим или другим воркером)
+        """
+        try:
+            stat = os.stat(self.ids_path)
+            stamp = (stat.st_ino, stat.st_size, os.stat(self.vectors_path).st_ino, self._read_header())
+        except OSError:
+            stamp = None
+        if stamp == self._stamp:
+            return
+        rows = self._file_rows()
+        if rows <= 0:
+            self._ids, self._vectors = array("q"), array("f")
+        elif np is not None:
+            self._ids = np.fromfile(self.ids_path, dtype="<i8", count=rows)
+            # Отображение только целых строк: усечение оборванного хвоста его не задевает
+            self._vectors = np.memmap(self.vectors_path, dtype="<f4", mode="r", offset=HEADER.size,
+                                      shape=(rows, self.dim))
+        else:
+            ids = array("q")
+            with open(self.ids_path, "rb") as f:
+                ids.fromfile(f, rows)
+            # Загруженные строки переиспользуются, если файл тот же и в нём ничего не обнулялось
+            vectors = self._vectors if stamp and self._stamp and stamp[2:] == self._stamp[2:] \
+                and isinstance(self._vectors, array) else array("f")
+            with open(self.vectors_path, "rb") as f:
+                # Дописанные строки дочитываются к уже загруженным
+                f.seek(HEADER.size + 4 * len(vectors))
+                vectors.fromfile(f, rows * self.dim - len(vectors))
+            self._ids, self._vectors = ids, vectors
+        # Строки идут по возрастанию id, но обнулённые (удалённые) могут оказаться в конце
+        self._last_id = int(self._ids.max()) if rows > 0 and np is not None else max(self._ids, default=0)
+        self._deleted_seq = (stamp[3] if stamp else None) or 0
+        self._stamp = stamp
+
+    def _append(self, ids: List[int], vectors: List[array]):
+        rows = self._file_rows()
+        with open(self.vectors_path, "r+b") as f:
+            f.truncate(HEADER.size + 4 * self.dim * rows)
+            f.seek(0, os.SEEK_END)
+            f.write(b"".join(vector.tobytes() for vector in vectors))
+        with open(self.ids_path, "r+b") as f:
+            f.truncate(8 * rows)
+            f.seek(0, os.SEEK_END)
+            f.write(array("q", ids).tobytes())
+
+    def _erase(self, ids: set, deleted_seq: int):
+        """
+        Обнуляет строки удалённых объяснений и запоминает последнюю учтённую запись журнала.
+        Номер пишется после строк: при сбое между ними обнуление просто повторится.
+        """
+        if np is not None and isinstance(self._ids, np.ndarray):
+            positions = np.flatnonzero(np.isin(self._ids, list(ids))).tolist()
+        else:
+            positions = [i for i, value in enumerate(self._ids) if value in ids]
+        zero_vector = bytes(4 * self.dim)
+        with open(self.vectors_path, "r+b") as vectors_file, open(self.ids_path, "r+b") as ids_file:
+            for position in positions:
+                vectors_file.seek(HEADER.size + 4 * self.dim * position)
+                vectors_file.write(zero_vector)
+                ids_file.seek(8 * position)
+                ids_file.write(bytes(8))
+            vectors_file.seek(DELETED_SEQ_OFFSET)
+            vectors_file.write(DELETED_SEQ.pack(deleted_seq))
+
+    # --- обновление ---
+
+    def sync(self, db, blocking: bool = True) -> int:
+        """
+        Убирает из индекса удалённые записи и индексирует добавленные после последней
+        проиндексированной (id растут, поэтому достаточно max(id) из файла).
+        Возвращает число новых строк.
+        С blocking=False не ждёт, если индекс сейчас обновляет другой поток или воркер.
+        """
+        if not self.enabled:
+            return 0
+        if not self._lock.acquire(blocking):
+            return 0
+        try:
+            handle = self._file_lock(exclusive=True, blocking=blocking)
+            if handle is None:
+                return 0
+            try:
+                with tracer.span("semantic.sync"):
+                    return self._sync_locked(db)
+            finally:
+                handle.close()
+        finally:
+            self._pending_writes = 0
+            self._last_sync = time.monotonic()
+            self._lock.release()
+
+    def _sync_locked(self, db) -> int:
+        if self._file_rows() < 0:
+            self._reset_files()
+        self._refresh()
+        # Журнал удалений и новые записи читаются в одной транзакции: запись, получившая id
+        # удалённой, видна только вместе с его записью в журнале и индексируется после обнуления
+        deletions = db.execute(
+            text("SELECT seq, explanation_id FROM deleted_explanations WHERE seq > :seq ORDER BY seq"),
+            {"seq": self._deleted_seq}
+        ).fetchall()
+        if deletions:
+            self._erase({row[1] for row in deletions}, deletions[-1][0])
+            self._refresh()
+        last_id = self._last_id
+        added = 0
+        while True:
+            rows = db.execute(
+                text("SELECT id, code_snippet, explanation FROM code_explanations "
+                     "WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": self.batch_size}
+            ).fetchall()
+            if not rows:
+                break
+            self._append([row[0] for row in rows], [embed_text(row[2], self.dim, row[1]) for row in rows])
+            last_id = rows[-1][0]
+            added += len(rows)
+        if added:
+            self._refresh()
+        return added
+
+    def note_write(self, db):
+        """
+        Вызывается после сохранения объяснения: индекс обновляется пачкой, когда накопилось
+        batch_size записей или прошло flush_interval секунд с прошлого обновления
+        """
+        if not self.enabled:
+            return
+        self._pending_writes += 1
+        if self._pending_writes >= self.batch_size or time.monotonic() - self._last_sync >= self.flush_interval:
+            self.sync(db, blocking=False)
+
+    def rebuild(self, db) -> int:
+        """
+        Строит индекс заново по всей истории (например, чтобы сжать файлы после многих удалений)
+        """
+        with self._lock:
+            handle = self._file_lock(exclusive=True)
+            try:
+                self._reset_files()
+                return self._sync_locked(db)
+            finally:
+                handle.close()
+
+    def start_catch_up(self, session_factory):
+        """
+        Фоновая индексация записей, сохранённых до запуска (не задерживает старт приложения)
+        """
+        if not self.enabled or self._catch_up_thread is not None:
+            return
+
+        def run():
+            db = session_factory()
+            try:
+                added = self.sync(db)
+                if added:
+                    logger.info("Semantic index caught up: %d explanations indexed", added)
+            except Exception as e:
+                logger.warning("Semantic index catch-up failed: %s", e)
+            finally:
+                db.close()
+
+        self._catch_up_thread = threading.Thread(target=run, name="semantic-index-catch-up", daemon=True)
+        self._catch_up_thread.start()
+
+    # --- поиск ---
+
+    def nearest(self, vector: array, count: int) -> List[Tuple[int, float]]:
+        """
+        count ближайших по косинусу строк индекса: (id объяснения, сходство) по убыванию
+        """
+        handle = self._file_lock(exclusive=False)
+        try:
+            self._refresh()
+            ids, vectors = self._ids, self._vectors
+        finally:
+            handle.close()
+        rows = len(ids)
+        if not rows:
+            return []
+        count = min(count, rows)
+        if np is not None:
+            scores = vectors @ np.frombuffer(vector, dtype="<f4")
+            top = np.argpartition(-scores, count - 1)[:count]
+            top = top[np.argsort(-scores[top])]
+            return [(int(ids[i]), float(scores[i])) for i in top]
+        # Без NumPy: запрос разрежен, поэтому суммируются только столбцы его ненулевых координат
+        scores = [0.0] * rows
+        for d, weight in enumerate(vector):
+            if weight:
+                scores = [s + weight * x for s, x in zip(scores, vectors[d::self.dim])]
+        top = heapq.nlargest(count, range(rows), key=scores.__getitem__)
+        return [(ids[i], scores[i]) for i in top]
+
+    def search(self, db, query: str, limit: int = 10, language: Optional[str] = None,
+               complexity_level: Optional[str] = None) -> List[Tuple[int, float]]:
+        """
+        Объяснения, ближайшие к запросу по смыслу, с учётом фильтров: (id, сходство).
+        Удалённые записи и не подходящие под фильтры отсеиваются по базе; если после
+        этого результатов не хватает, число кандидатов увеличивается.
+        """
+        self.sync(db, blocking=False)
+        vector = embed_text(query, self.dim)
+        if not any(vector):
+            return []
+        with tracer.span("semantic.search"):
+            count = limit * 4
+            while True:
+                candidates = [(i, score) for i, score in self.nearest(vector, count) if score > 0]
+                existing = self._filter(db, [i for i, _ in candidates], language, complexity_level)
+                results, seen = [], set()
+                for i, score in candidates:
+                    if i in existing and i not in seen:
+                        seen.add(i)
+                        results.append((i, score))
+                if len(results) >= limit or count >= len(self._ids) or len(candidates) < count:
+                    return results[:limit]
+                count *= 4
+
+    @staticmethod
+    def _filter(db, ids: List[int], language: Optional[str], complexity_level: Optional[str]) -> set:
+        if not ids:
+            return set()
+        sql = "SELECT id FROM code_explanations WHERE id IN :ids"
+        params = {"ids": ids}
+        if language:
+            sql += " AND language = :language"
+            params["language"] = language.lower()
+        if complexity_level:
+            sql += " AND complexity_level = :level"
+            params["level"] = complexity_level.lower()
+        statement = text(sql).bindparams(bindparam("ids", expanding=True))
+        return {row[0] for row in db.execute(statement, params)}
+
+
+if __name__ == "__main__":
+    from .history_shards import HistoryShards
+
+    logging.basicConfig(level=logging.INFO)
+    shards = HistoryShards.from_env()
+    shards.create_tables()
+    for shard in range(len(shards)):
+        session = shards.session(shard)
+        try:
+            count = SemanticIndex.from_env(shard).rebuild(session)
+        finally:
+            session.close()
+        logger.info("Semantic index of shard %d rebuilt: %d explanations indexed", shard, count)
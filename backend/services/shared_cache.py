@@ -0,0 +1,375 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Разделяемый кэш для всех воркеров узла (файл SQLite рядом с базой приложения)
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE_ENABLED", "true").lower() == "true"
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH") or os.path.join(
+    os.getenv("DATABASE_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "shared_cache.db"
+)
+SHARED_CACHE_MAX_ENTRIES = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "20000"))
+SHARED_CACHE_MAX_MB = float(os.getenv("SHARED_CACHE_MAX_MB", "256"))
+
+# Версия формата кэшируемых значений. Файл кэша переживает обновления, поэтому версию
+# увеличивают при изменении структуры значений (краткое описание анализатора, состояние
+# инкрементального объяснения) или текста мок-объяснений: записи старой версии не читаются
+CACHE_SCHEMA_VERSION = 1
+# Виды данных в общем кэше; значения explanations и incremental зависят от источника объяснений.
+# Отметки прогрева (warmup) относятся к одному запуску и сюда не входят: prestart их удаляет
+CACHE_NAMESPACES = ("explanations", "analysis", "incremental")
+LLM_DEPENDENT_NAMESPACES = ("explanations", "incremental")
+
+
+def llm_mode() -> str:
+    """
+    Источник объяснений: мок-режим или LLM по конкретному адресу (разные модели дают разные ответы)
+    """
+    if os.getenv("USE_MOCK_LLM", "true").lower() == "true":
+        return "mock"
+    return "llm-" + hashlib.sha256(os.getenv("LLM_API_URL", "").encode("utf-8")).hexdigest()[:12]
+
+
+def cache_namespace(name: str) -> str:
+    """
+    Пространство имён общего кэша с версией формата и, для объяснений, источником:
+    после переключения USE_MOCK_LLM или смены модели старые объяснения не выдаются за новые
+    """
+    if name in LLM_DEPENDENT_NAMESPACES:
+        return f"{name}:{llm_mode()}:v{CACHE_SCHEMA_VERSION}"
+    return f"{name}:v{CACHE_SCHEMA_VERSION}"
+
+
+def drop_stale_namespaces(path: str = SHARED_CACHE_PATH) -> int:
+    """
+    Удаляет из общего кэша записи других режимов и версий формата: лимиты вытеснения
+    действуют внутри пространства имён, поэтому сами такие записи не освободили бы место.
+    Выполняется в prestart до запуска воркеров. Возвращает число удалённых записей.
+    """
+    if not SHARED_CACHE_ENABLED or not os.path.exists(path):
+        return 0
+    current = [cache_namespace(name) for name in CACHE_NAMESPACES]
+    try:
+        connection = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+        try:
+            return connection.execute(
+                f"DELETE FROM cache_entries WHERE namespace NOT IN ({','.join('?' * len(current))})",
+                current
+            ).rowcount
+        finally:
+            connection.close()
+    except sqlite3.Error as e:
+        logger.warning("Shared cache cleanup failed: %s", e)
+        return 0
+
+
+class LocalLRUCache:
+    """
+    LRU-кэш в памяти процесса (первый уровень)
+    """
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        with self._lock:
+            return {key: self._entries[key] for key in keys if key in self._entries}
+
+    def set(self, key: str, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedSQLiteCache:
+    """
+    Кэш «ключ — значение» в файле SQLite, общий для всех воркеров узла (второй уровень).
+    Значения хранятся в JSON; вытеснение — по времени последнего обращения (приближённый LRU:
+    время обновляется не чаще раза в touch_interval секунд, чтобы чтение не превращалось в запись)
+    с ограничением числа записей и объёма для каждого пространства имён.
+    Ошибки SQLite не прерывают запрос: значение считается отсутствующим.
+    """
+
+    # Проверка размеров выполняется раз в столько записей
+    EVICT_CHECK_EVERY = 64
+
+    def __init__(self, path: str, namespace: str, max_entries: int = 20000,
+                 max_bytes: int = 256 * 1024 * 1024, touch_interval: float = 60.0):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str) -> Optional["SharedSQLiteCache"]:
+        """
+        Общий кэш вида данных name в пространстве имён cache_namespace(name)
+        """
+        if not SHARED_CACHE_ENABLED:
+            return None
+        return cls(
+            SHARED_CACHE_PATH,
+            cache_namespace(name),
+            max_entries=SHARED_CACHE_MAX_ENTRIES,
+            max_bytes=int(SHARED_CACHE_MAX_MB * 1024 * 1024)
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            # Кэш можно потерять при сбое питания, поэтому fsync не нужен
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, accessed_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed ON cache_entries (namespace, accessed_at)"
+            )
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        try:
+            connection = self._connection()
+            placeholders = ",".join("?" * len(keys))
+            rows = connection.execute(
+                f"SELECT key, value, accessed_at FROM cache_entries WHERE namespace = ? AND key IN ({placeholders})",
+                [self.namespace, *keys]
+            ).fetchall()
+            now = time.time()
+            stale = [key for key, _, accessed_at in rows if accessed_at < now - self.touch_interval]
+            if stale:
+                connection.execute(
+                    f"UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key IN ({','.join('?' * len(stale))})",
+                    [now, self.namespace, *stale]
+                )
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning("Shared cache read failed: %s", e)
+            return {}
+        found = {key: json.loads(value) for key, value, _ in rows}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: Any) -> None:
+        self.set_many({key: value})
+
+    def add(self, key: str, value: Any) -> bool:
+        """
+        Записывает значение, только если ключа ещё нет. Возвращает True, если запись сделал
+        этот вызов (атомарно между процессами), и при ошибке SQLite — чтобы вызывающий
+        выполнил работу сам, а не рассчитывал на другой воркер.
+        """
+        data = json.dumps(value, ensure_ascii=False)
+        try:
+            return self._connection().execute(
+                "INSERT OR IGNORE INTO cache_entries (namespace, key, value, size, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, data, len(data.encode("utf-8")), time.time())
+            ).rowcount == 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning("Shared cache write failed: %s", e)
+            return True
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            data = json.dumps(value, ensure_ascii=False)
+            rows.append((self.namespace, key, data, len(data.encode("utf-8")), now))
+        try:
+            connection = self._connection()
+            connection.executemany(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, size, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._writes += len(rows)
+            if self._writes >= self.EVICT_CHECK_EVERY:
+                self._writes = 0
+                self._evict(connection)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning("Shared cache write failed: %s", e)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """
+        Удаляет давно не использованные записи, пока пространство имён не уложится в лимиты
+        (с запасом 10%, чтобы не вытеснять на каждой проверке)
+        """
+        count, total = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+            (self.namespace,)
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        target_count = int(self.max_entries * 0.9)
+        target_bytes = int(self.max_bytes * 0.9)
+        excess = max(count - target_count, 0)
+        if total > target_bytes and count:
+            excess = max(excess, int(count * (total - target_bytes) / total) + 1)
+        connection.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+            "SELECT key FROM cache_entries WHERE namespace = ? ORDER BY accessed_at LIMIT ?)",
+            (self.namespace, self.namespace, excess)
+        )
+
+    def clear(self) -> None:
+        try:
+            self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+        except sqlite3.Error as e:
+            logger.warning("Shared cache clear failed: %s", e)
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            count, total = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+                (self.namespace,)
+            ).fetchone()
+        except sqlite3.Error:
+            count, total = None, None
+        return {
+            "size": count,
+            "bytes": total,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors
+        }
+
+
+class TieredCache:
+    """
+    Двухуровневый кэш: LRU в памяти процесса и (необязательно) общий SQLite-кэш узла.
+    Промах первого уровня проверяется во втором; найденное значение поднимается в первый.
+    """
+
+    def __init__(self, local: LocalLRUCache, shared: Optional[SharedSQLiteCache] = None):
+        self.local = local
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, local_size: int) -> "TieredCache":
+        # Нулевой размер означает «кэш выключен» для обоих уровней
+        shared = SharedSQLiteCache.from_env(name) if local_size > 0 else None
+        return cls(LocalLRUCache(local_size), shared)
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str], count_stats: bool = True) -> Dict[str, Any]:
+        keys = list(keys)
+        found = self.local.get_many(keys)
+        local_hits = len(found)
+        shared_hits = 0
+        missing = [key for key in keys if key not in found]
+        if missing and self.shared is not None:
+            promoted = self.shared.get_many(missing)
+            for key, value in promoted.items():
+                self.local.set(key, value)
+            found.update(promoted)
+            shared_hits = len(promoted)
+        if count_stats:
+            with self._lock:
+                self.hits += local_hits + shared_hits
+                self.shared_hits += shared_hits
+                self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: Any) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        for key, value in items.items():
+            self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set_many(items)
+
+    def clear(self) -> None:
+        """
+        Очищает только память процесса: общий кэш принадлежит всем воркерам
+        """
+        self.local.clear()
+        with self._lock:
+            self.hits = self.shared_hits = self.misses = 0
+
+    def close(self) -> None:
+        if self.shared is not None:
+            self.shared.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.local),
+                "max_size": self.local.max_size,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "shared": self.shared is not None
+            }
@@ -0,0 +1,119 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import bindparam, func, select, text
+
+from ..database import ExplanationTag, Tag
+
+# Допустимые символы тега (c++, c#, .net); остальные заменяются дефисом
+_TAG_INVALID = re.compile(r'[^a-z0-9+#.]+')
+MAX_TAG_LENGTH = 50
+# Наибольшее число тегов одного объяснения
+MAX_TAGS = 20
+
+# Теги страницы объяснений одним запросом (по индексу связей explanation_id)
+EXPLANATION_TAGS_SQL = text(
+    "SELECT et.explanation_id, t.name FROM explanation_tags et JOIN tags t ON t.id = et.tag_id "
+    "WHERE et.explanation_id IN :ids ORDER BY t.name"
+).bindparams(bindparam("ids", expanding=True))
+
+
+def normalize_tag(name: str) -> Optional[str]:
+    """
+    Приводит тег к каноническому виду: нижний регистр, слова через дефис
+    """
+    tag = _TAG_INVALID.sub("-", name.strip().lower()).strip("-")[:MAX_TAG_LENGTH].rstrip("-")
+    return tag or None
+
+
+def normalize_tags(names: Iterable[str]) -> List[str]:
+    tags = []
+    for name in names:
+        tag = normalize_tag(name)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags[:MAX_TAGS]
+
+
+def set_tags(db, explanation_id: int, names: Iterable[str], source: str = "auto", replace: bool = False) -> List[str]:
+    """
+    Привязывает теги к объяснению (новые теги создаются); replace=True сначала снимает
+    все прежние теги. Работает и с Session, и с Connection; фиксация — на вызывающем.
+    Возвращает привязанные теги в каноническом виде.
+    """
+    tags = normalize_tags(names)
+    if replace:
+        db.execute(text("DELETE FROM explanation_tags WHERE explanation_id = :id"), {"id": explanation_id})
+    if not tags:
+        return tags
+    db.execute(
+        text("INSERT OR IGNORE INTO tags (name, explanation_count) VALUES (:name, 0)"),
+        [{"name": tag} for tag in tags]
+    )
+    db.execute(
+        text("INSERT OR IGNORE INTO explanation_tags (tag_id, explanation_id, source) "
+             "SELECT id, :explanation_id, :source FROM tags WHERE name = :name"),
+        [{"explanation_id": explanation_id, "source": source, "name": tag} for tag in tags]
+    )
+    return tags
+
+
+def explanation_tags(db, explanation_ids: Sequence[int]) -> Dict[int, List[str]]:
+    """
+    Теги объяснений (по алфавиту) по id; у объяснений без тегов записи нет
+    """
+    tags: Dict[int, List[str]] = {}
+    if not explanation_ids:
+        return tags
+    for explanation_id, name in db.execute(EXPLANATION_TAGS_SQL, {"ids": list(explanation_ids)}).all():
+        tags.setdefault(explanation_id, []).append(name)
+    return tags
+
+
+def tag_filter(model_id, name: str):
+    """
+    Условие «у объяснения есть тег name»: поиск тега по уникальному индексу имени
+    и выборка по первичному ключу связей (tag_id, explanation_id)
+    """
+    tag_id = select(Tag.id).where(Tag.name == name).scalar_subquery()
+    return model_id.in_(select(ExplanationTag.explanation_id).where(ExplanationTag.tag_id == tag_id))
+
+
+def tag_facets(db, explanation_ids=None, limit: Optional[int] = 20) -> List[Dict[str, object]]:
+    """
+    Самые частые теги с числом объяснений (limit=None — все). Без фильтра (explanation_ids
+    is None) читаются счётчики таблицы tags; с фильтром — связи объяснений из подзапроса
+    explanation_ids.
+    """
+    if explanation_ids is None:
+        rows = db.execute(
+            select(Tag.name, Tag.explanation_count)
+            .where(Tag.explanation_count > 0)
+            .order_by(Tag.explanation_count.desc(), Tag.name)
+            .limit(limit)
+        ).all()
+    else:
+        count = func.count().label("count")
+        rows = db.execute(
+            select(Tag.name, count)
+            .join(ExplanationTag, ExplanationTag.tag_id == Tag.id)
+            .where(ExplanationTag.explanation_id.in_(explanation_ids))
+            .group_by(Tag.id)
+            .order_by(count.desc(), Tag.name)
+            .limit(limit)
+        ).all()
+    return [{"tag": name, "count": count} for name, count in rows]
+
+
+def merge_facets(shard_facets: Sequence[List[Dict[str, object]]], limit: int = 20) -> List[Dict[str, object]]:
+    """
+    Складывает счётчики тегов нескольких шардов истории (полные списки, limit=None)
+    и оставляет limit самых частых
+    """
+    counts = Counter()
+    for facets in shard_facets:
+        for facet in facets:
+            counts[facet["tag"]] += facet["count"]
+    top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return [{"tag": name, "count": count} for name, count in top]
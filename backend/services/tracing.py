@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """
+    Отрезок работы внутри трассы (этап анализа, вызов LLM, запрос к БД)
+    """
+
+    __slots__ = ("span_id", "parent_id", "name", "start", "start_perf", "duration_ms", "attributes", "status")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.start_perf = time.perf_counter()
+        self.duration_ms = 0.0
+        self.attributes = attributes
+        self.status = "ok"
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class Trace:
+    """
+    Трасса одного запроса: идентификатор, решение о сэмплировании и собранные отрезки
+    """
+
+    __slots__ = ("trace_id", "sampled", "spans", "root")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name if self.root else None,
+            "start": self.root.start if self.root else None,
+            "duration_ms": round(self.root.duration_ms, 3) if self.root else None,
+            "spans": [span.to_dict() for span in self.spans]
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span_id: ContextVar[Optional[str]] = ContextVar("current_span_id", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+class TraceExporter:
+    """
+    Встроенный экспортёр: кольцевой буфер последних трасс и, по желанию,
+    JSONL-файл для офлайн-разбора
+    """
+
+    def __init__(self, buffer_size: int = 200, export_file: Optional[str] = None):
+        self.buffer = deque(maxlen=buffer_size)
+        self.export_file = export_file
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        record = trace.to_dict()
+        self.buffer.append(record)
+        if self.export_file:
+            line = json.dumps(record, ensure_ascii=False, default=str)
+            with self._lock:
+                try:
+                    with open(self.export_file, "a", encoding="utf-8") as f:
+                        f.write(line + "\n")
+                except OSError as e:
+                    logger.warning("Failed to export trace: %s", e)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return list(self.buffer)[-limit:][::-1]
+
+
+class Tracer:
+    """
+    Лёгкий трассировщик запросов.
+    Отрезки собираются для каждого запроса, но экспортируются только для
+    сэмплированных трасс и для трасс дольше порога медленного запроса.
+    """
+
+    def __init__(self, enabled: bool = True, sample_rate: float = 0.05,
+                 slow_threshold_ms: float = 5000.0, exporter: Optional[TraceExporter] = None):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_threshold_ms = slow_threshold_ms
+        self.exporter = exporter or TraceExporter()
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        return cls(
+            enabled=os.getenv("TRACING_ENABLED", "true").lower() == "true",
+            sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.05")),
+            slow_threshold_ms=float(os.getenv("TRACE_SLOW_THRESHOLD_MS", "5000")),
+            exporter=TraceExporter(
+                buffer_size=int(os.getenv("TRACE_BUFFER_SIZE", "200")),
+                export_file=os.getenv("TRACE_EXPORT_FILE") or None
+            )
+        )
+
+    @contextmanager
+    def start_trace(self, name: str, trace_id: Optional[str] = None, **attributes):
+        """
+        Открывает трассу запроса с корневым отрезком
+        """
+        if not self.enabled:
+            yield None
+            return
+        trace = Trace(trace_id or os.urandom(16).hex(), random.random() < self.sample_rate)
+        token = _current_trace.set(trace)
+        try:
+            with self.span(name, **attributes) as root:
+                trace.root = root
+                yield trace
+        finally:
+            _current_trace.reset(token)
+            if trace.sampled or (trace.root and trace.root.duration_ms >= self.slow_threshold_ms):
+                self.exporter.export(trace)
+
+    def start_span(self, name: str, **attributes):
+        """
+        Открывает отрезок вручную; возвращает дескриптор для end_span (None вне трассы)
+        """
+        trace = _current_trace.get()
+        if trace is None:
+            return None
+        span = Span(name, _current_span_id.get(), attributes)
+        return trace, span, _current_span_id.set(span.span_id)
+
+    def end_span(self, handle, error: Optional[BaseException] = None):
+        if handle is None:
+            return
+        trace, span, token = handle
+        span.duration_ms = (time.perf_counter() - span.start_perf) * 1000
+        if error is not None:
+            span.status = "error"
+            span.attributes["error"] = repr(error)
+        _current_span_id.reset(token)
+        trace.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        handle = self.start_span(name, **attributes)
+        try:
+            yield handle[1] if handle else None
+        except BaseException as e:
+            self.end_span(handle, e)
+            raise
+        else:
+            self.end_span(handle)
+
+    def traced(self, name: str):
+        """
+        Декоратор, оборачивающий вызов функции в отрезок трассы
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+class TraceIdLogFilter(logging.Filter):
+    """
+    Добавляет trace_id текущего запроса в записи журнала
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+
+def install_sqlalchemy_tracing(engine):
+    """
+    Создаёт отрезок трассы для каждого SQL-запроса движка
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._trace_span = tracer.start_span("db.query", statement=statement[:200])
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        tracer.end_span(getattr(context, "_trace_span", None))
+        context._trace_span = None
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        context = exception_context.execution_context
+        if context is not None:
+            tracer.end_span(getattr(context, "_trace_span", None), exception_context.original_exception)
+            context._trace_span = None
+
+
+tracer = Tracer.from_env()
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import queue
+import random
+import re
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+
+from .explanation_cache import snippet_hash
+from .tracing import current_trace_id
+
+logger = logging.getLogger(__name__)
+
+# Строковые литералы и комментарии: в них чаще всего оказываются секреты и персональные данные.
+# Директивы препроцессора C/C++ (#include и т.п.) комментариями не считаются.
+REDACT_RE = re.compile(
+    r'"""[\s\S]*?"""'
+    r"|'''[\s\S]*?'''"
+    r'|"(?:\\.|[^"\\\n])*"'
+    r"|'(?:\\.|[^'\\\n])*'"
+    r"|`(?:\\.|[^`\\])*`"
+    r"|/\*[\s\S]*?\*/"
+    r"|//[^\n]*"
+    r"|#(?!\s*(?:include|define|pragma|if|ifdef|ifndef|else|elif|endif|undef)\b)[^\n]*"
+)
+WORD_RE = re.compile(r"\w")
+
+
+def redact_code(code: str) -> str:
+    """
+    Маскирует содержимое строковых литералов и комментариев, сохраняя длину,
+    переносы строк и структуру кода (анализатор даёт на ней те же оценки)
+    """
+    return REDACT_RE.sub(lambda m: WORD_RE.sub("x", m.group(0)), code)
+
+
+def worker_capture_path(path: str, pid: int) -> str:
+    """
+    Журнал процесса: traffic.jsonl -> traffic.<pid>.jsonl. У каждого воркера свой файл
+    и своя ротация — RotatingFileHandler не согласует переименования между процессами
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.{pid}{ext}"
+
+
+class TrafficRecorder:
+    """
+    Запись трафика /code/explain в ротируемый JSONL-журнал для последующего воспроизведения.
+    Формат строки совместим с корпусами benchmarks: request_id, title, method, path, body
+    плюс хэш фрагмента, язык, уровень, время этапов и результат обращения к кэшу.
+    Запись в файл выполняется в отдельном потоке и не задерживает ответ.
+    Каждый процесс пишет в свой файл (worker_capture_path), benchmarks.replay объединяет их.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = 50 * 1024 * 1024,
+                 backup_count: int = 5, redact: bool = True, sample_rate: float = 1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.redact = redact
+        self.sample_rate = sample_rate
+        self._queue = queue.SimpleQueue()
+        self._listener = None
+
+    @classmethod
+    def from_env(cls) -> "TrafficRecorder":
+        return cls(
+            path=os.getenv("TRAFFIC_CAPTURE_FILE") or None,
+            max_bytes=int(os.getenv("TRAFFIC_CAPTURE_MAX_BYTES", str(50 * 1024 * 1024))),
+            backup_count=int(os.getenv("TRAFFIC_CAPTURE_BACKUPS", "5")),
+            redact=os.getenv("TRAFFIC_CAPTURE_REDACT", "true").lower() == "true",
+            sample_rate=float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "1.0"))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._listener is not None
+
+    def start(self):
+        if not self.path or self._listener is not None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # Запускается в lifespan, то есть уже в процессе воркера
+        path = worker_capture_path(self.path, os.getpid())
+        file_handler = RotatingFileHandler(
+            path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8"
+        )
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        self._listener = QueueListener(self._queue, file_handler)
+        self._listener.start()
+        logger.info("Traffic capture enabled: %s", path)
+
+    def stop(self):
+        if self._listener is None:
+            return
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+
+    def record(self, body: Dict[str, Any], language: Optional[str], status_code: int, started_at: float,
+               duration_ms: float, stage_ms: Dict[str, float], cache: Optional[str]):
+        """
+        Ставит запись о запросе в очередь на запись (если захват включён и запрос попал в выборку)
+        """
+        if self._listener is None or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return
+        code = body.get("code_snippet") or ""
+        level = body.get("complexity_level")
+        entry = {
+            "request_id": current_trace_id() or os.urandom(16).hex(),
+            "title": f"{language or body.get('language') or 'unknown'} / {level}",
+            "timestamp": started_at,
+            "method": "POST",
+            "path": "/code/explain",
+            "body": {**body, "code_snippet": redact_code(code) if self.redact else code},
+            "redacted": self.redact,
+            "snippet_hash": snippet_hash(code),
+            "language": language,
+            "complexity_level": level,
+            "all_levels": bool(body.get("all_levels")),
+            "status_code": status_code,
+            "duration_ms": round(duration_ms, 3),
+            "stage_ms": {stage: round(ms, 3) for stage, ms in stage_ms.items()},
+            "cache": cache
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        self._queue.put_nowait(logging.makeLogRecord({"msg": line, "levelno": logging.INFO}))
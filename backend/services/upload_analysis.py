@@ -0,0 +1,365 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import posixpath
+import shutil
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from .code_analyzer import CodeAnalyzer
+from .explanation_cache import ExplanationCache
+from .llm_service import LLMService
+from .metrics import UPLOAD_FILES, UPLOAD_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Архивы распознаются по окончанию имени файла
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# Каталоги зависимостей и сборки в архивах пропускаются (как и скрытые: .git, .venv…)
+SKIPPED_DIRECTORIES = {"node_modules", "__pycache__", "venv", "dist", "build", "target", "vendor"}
+
+
+class UploadError(Exception):
+    """
+    Загрузку нельзя обработать; status — HTTP-код ответа (400 или 413)
+    """
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ZIP_SUFFIXES + TAR_SUFFIXES)
+
+
+def language_for_path(path: str) -> Optional[str]:
+    """
+    Язык файла по расширению (CodeAnalyzer.EXTENSION_MAPPING); None — не исходный код
+    """
+    _, ext = posixpath.splitext(path.lower())
+    return CodeAnalyzer.EXTENSION_MAPPING.get(ext[1:]) if ext else None
+
+
+def analyze_source_file(path: str, code: str, language: Optional[str]) -> Dict[str, Any]:
+    """
+    Анализ одного файла в процессе пула: язык, validate_code и краткое описание
+    (как analyze_snippet для /code/explain)
+    """
+    language = language or CodeAnalyzer.detect_language(code)
+    validation = CodeAnalyzer.validate_code(code, language)
+    summary = CodeAnalyzer.extract_code_summary(code, language) if validation["is_valid"] else None
+    return {"path": path, "language": language, "validation": validation, "summary": summary}
+
+
+class UploadAnalyzer:
+    """
+    Конвейер объяснения загруженного файла или архива (POST /code/upload).
+
+    Файлы читаются из архива по одному, без распаковки на диск, и сразу отправляются
+    на анализ в пул процессов (CodeAnalyzer — чистый Python, потоки упираются в GIL).
+    Проанализированные файлы объясняются LLM параллельно в потоках (не больше
+    explain_parallel вызовов одновременно), в памяти одновременно находится не больше
+    max_in_flight файлов. После всех файлов LLM объясняет проект целиком по их
+    кратким описаниям. Ход работы отдаётся событиями по мере готовности.
+    """
+
+    def __init__(self, upload_dir: str, max_upload_bytes: int = 50 * 1024 * 1024, max_files: int = 500,
+                 max_file_bytes: int = 256 * 1024, max_total_bytes: int = 20 * 1024 * 1024,
+                 analysis_workers: int = 0, explain_parallel: int = 4):
+        self.upload_dir = upload_dir
+        self.max_upload_bytes = max_upload_bytes
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        # Суммарный размер исходников после распаковки (защита от архивов-бомб)
+        self.max_total_bytes = max_total_bytes
+        # 0 — по числу ядер
+        self.analysis_workers = analysis_workers or os.cpu_count() or 1
+        self.explain_parallel = max(1, explain_parallel)
+        self.max_in_flight = max(self.analysis_workers, self.explain_parallel) * 2
+        # Пул процессов создаётся при первой загрузке из нескольких файлов
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def from_env(cls) -> "UploadAnalyzer":
+        return cls(
+            os.getenv("UPLOAD_DIR", os.path.join(
+                os.getenv("DATABASE_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "uploads"
+            )),
+            max_upload_bytes=int(os.getenv("UPLOAD_MAX_MB", "50")) * 1024 * 1024,
+            max_files=int(os.getenv("UPLOAD_MAX_FILES", "500")),
+            max_file_bytes=int(os.getenv("UPLOAD_MAX_FILE_KB", "256")) * 1024,
+            max_total_bytes=int(os.getenv("UPLOAD_MAX_TOTAL_MB", "20")) * 1024 * 1024,
+            analysis_workers=int(os.getenv("UPLOAD_ANALYSIS_WORKERS", "0")),
+            explain_parallel=int(os.getenv("UPLOAD_EXPLAIN_PARALLEL", "4"))
+        )
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: процессы не наследуют потоки и соединения работающего сервера
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.analysis_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # --- чтение загрузки ---
+
+    def iter_sources(self, path: str, filename: str) -> Iterator[Dict[str, Any]]:
+        """
+        Исходные файлы загрузки: {"path", "code", "language"} или {"path", "skipped": причина}
+        """
+        name = filename.lower()
+        if name.endswith(ZIP_SUFFIXES):
+            yield from self._iter_zip(path)
+        elif name.endswith(TAR_SUFFIXES):
+            yield from self._iter_tar(path)
+        else:
+            with open(path, "rb") as f:
+                data = f.read(self.max_file_bytes + 1)
+            if len(data) > self.max_file_bytes:
+                raise UploadError(f"File is larger than {self.max_file_bytes // 1024} KB", status=413)
+            code = self._decode(data)
+            if code is None:
+                raise UploadError("File is not UTF-8 text")
+            # Файл без известного расширения — язык определяется по содержимому
+            yield {"path": posixpath.basename(filename), "code": code, "language": language_for_path(filename)}
+
+    def _iter_zip(self, path: str) -> Iterator[Dict[str, Any]]:
+        try:
+            archive = zipfile.ZipFile(path)
+        except zipfile.BadZipFile as e:
+            raise UploadError(f"Invalid zip archive: {e}")
+        with archive:
+            budget = _Budget(self)
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                skip = self._skip_reason(info.filename, info.file_size)
+                if skip is None:
+                    # Размер из заголовка может быть неверным — читается не больше лимита
+                    with archive.open(info) as member:
+                        yield budget.source(info.filename, member.read(self.max_file_bytes + 1))
+                else:
+                    yield {"path": info.filename, "skipped": skip}
+
+    def _iter_tar(self, path: str) -> Iterator[Dict[str, Any]]:
+        try:
+            # Потоковый режим: сжатый tar читается последовательно, без перемотки
+            archive = tarfile.open(path, mode="r|*")
+        except tarfile.TarError as e:
+            raise UploadError(f"Invalid tar archive: {e}")
+        with archive:
+            budget = _Budget(self)
+            try:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    skip = self._skip_reason(member.name, member.size)
+                    if skip is None:
+                        yield budget.source(member.name, archive.extractfile(member).read(self.max_file_bytes + 1))
+                    else:
+                        yield {"path": member.name, "skipped": skip}
+            except tarfile.TarError as e:
+                raise UploadError(f"Invalid tar archive: {e}")
+
+    def _skip_reason(self, name: str, size: int) -> Optional[str]:
+        parts = [part for part in name.replace("\\", "/").split("/") if part]
+        if name.startswith("/") or ".." in parts:
+            return "unsafe_path"
+        if any(part.startswith(".") or part in SKIPPED_DIRECTORIES for part in parts[:-1]) or parts[-1].startswith("."):
+            return "ignored_directory"
+        if language_for_path(name) is None:
+            return "unsupported_extension"
+        if size > self.max_file_bytes:
+            return "too_large"
+        return None
+
+    @staticmethod
+    def _decode(data: bytes) -> Optional[str]:
+        if b"\0" in data:
+            return None
+        try:
+            return data.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            return None
+
+    # --- конвейер ---
+
+    async def run(
+        self,
+        path: str,
+        filename: str,
+        complexity_level: str,
+        llm_service: LLMService,
+        explanation_cache: ExplanationCache,
+        heartbeat: Optional[float] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Обрабатывает сохранённую загрузку и по мере работы отдаёт события:
+        file (stage=analyzed, затем explained), skipped, overview и в конце done или error;
+        None — событий не было дольше heartbeat секунд.
+        Каталог загрузки удаляется по завершении или при отключении клиента.
+        """
+        events: asyncio.Queue = asyncio.Queue()
+        driver = asyncio.create_task(
+            self._drive(path, filename, complexity_level, llm_service, explanation_cache, events.put_nowait)
+        )
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["type"] in ("done", "error"):
+                    break
+        finally:
+            driver.cancel()
+            await asyncio.gather(driver, return_exceptions=True)
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+    async def _drive(self, path: str, filename: str, complexity_level: str, llm_service: LLMService,
+                     explanation_cache: ExplanationCache, emit: Callable[[Dict[str, Any]], None]):
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        multi_file = is_archive(filename)
+        slots = asyncio.Semaphore(self.max_in_flight)
+        llm_slots = asyncio.Semaphore(self.explain_parallel)
+        tasks: List[asyncio.Task] = []
+        skipped: List[Dict[str, str]] = []
+        try:
+            sources = self.iter_sources(path, filename)
+            while True:
+                # Чтение и распаковка — блокирующие, поэтому в потоке, по одному файлу
+                await slots.acquire()
+                source = await loop.run_in_executor(None, next, sources, None)
+                if source is None:
+                    slots.release()
+                    break
+                if "skipped" in source:
+                    slots.release()
+                    skipped.append(source)
+                    UPLOAD_FILES.labels("skipped").inc()
+                    emit({"type": "skipped", "path": source["path"], "reason": source["skipped"]})
+                    continue
+                tasks.append(asyncio.create_task(self._process_file(
+                    source, multi_file, complexity_level, llm_service, explanation_cache, llm_slots, slots, emit
+                )))
+            files = [file for file in await asyncio.gather(*tasks) if file is not None]
+            if not files:
+                raise UploadError("Upload contains no supported source files")
+            UPLOAD_STAGE_SECONDS.labels("files").observe(time.perf_counter() - start)
+
+            files.sort(key=lambda file: file["path"])
+            overview = None
+            if multi_file:
+                with UPLOAD_STAGE_SECONDS.labels("overview").time():
+                    overview = await asyncio.to_thread(llm_service.explain_project, files, complexity_level)
+                emit({"type": "overview", "explanation": overview["explanation"], "mock": overview.get("mock", False)})
+            emit({
+                "type": "done",
+                "files": len(files),
+                "explained": sum(1 for file in files if file["explanation"] is not None),
+                "invalid": sum(1 for file in files if not file["validation"]["is_valid"]),
+                "skipped": len(skipped),
+                "languages": _count_languages(files),
+                "overview": overview["explanation"] if overview else None,
+                "processing_time": round(time.perf_counter() - start, 2)
+            })
+        except UploadError as e:
+            emit({"type": "error", "status": e.status, "detail": str(e)})
+        except Exception as e:
+            logger.warning("Upload processing failed: %s", e)
+            emit({"type": "error", "status": 500, "detail": f"An error occurred while processing the upload: {e}"})
+        finally:
+            for task in tasks:
+                task.cancel()
+            UPLOAD_STAGE_SECONDS.labels("total").observe(time.perf_counter() - start)
+
+    async def _process_file(self, source: Dict[str, Any], multi_file: bool, complexity_level: str,
+                            llm_service: LLMService, explanation_cache: ExplanationCache,
+                            llm_slots: asyncio.Semaphore, slots: asyncio.Semaphore,
+                            emit: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        try:
+            # Единственный файл анализируется в потоке: передача в процесс дороже самого анализа
+            executor = self.pool if multi_file else None
+            analysis = await loop.run_in_executor(
+                executor, analyze_source_file, source["path"], source["code"], source["language"]
+            )
+            emit({"type": "file", "stage": "analyzed", **analysis})
+            file = {**analysis, "explanation": None, "cached": False}
+            if not analysis["validation"]["is_valid"]:
+                UPLOAD_FILES.labels("invalid").inc()
+                return file
+
+            explanation = explanation_cache.get(source["code"], analysis["language"], complexity_level)
+            file["cached"] = explanation is not None
+            if explanation is None:
+                async with llm_slots:
+                    # to_thread копирует контекст: вызов LLM идёт в справедливую очередь от имени клиента
+                    result = await asyncio.to_thread(lambda: llm_service.explain_code(
+                        source["code"],
+                        analysis["language"],
+                        complexity_level,
+                        code_summary=analysis["summary"],
+                        validation_info=analysis["validation"],
+                        context=f"файл `{source['path']}` загруженного проекта" if multi_file else None
+                    ))
+                explanation = result["explanation"]
+                if not result.get("mock") or llm_service.use_mock:
+                    explanation_cache.set(source["code"], analysis["language"], complexity_level, explanation)
+            file["explanation"] = explanation
+            UPLOAD_FILES.labels("explained").inc()
+            emit({"type": "file", "stage": "explained", "path": file["path"], "explanation": explanation,
+                  "cached": file["cached"]})
+            return file
+        finally:
+            slots.release()
+
+
+class _Budget:
+    """
+    Счётчик файлов и распакованных байт одной загрузки
+    """
+
+    def __init__(self, uploads: UploadAnalyzer):
+        self.uploads = uploads
+        self.files = 0
+        self.total_bytes = 0
+
+    def source(self, name: str, data: bytes) -> Dict[str, Any]:
+        if len(data) > self.uploads.max_file_bytes:
+            return {"path": name, "skipped": "too_large"}
+        code = UploadAnalyzer._decode(data)
+        if code is None:
+            return {"path": name, "skipped": "binary"}
+        self.files += 1
+        self.total_bytes += len(data)
+        if self.files > self.uploads.max_files:
+            raise UploadError(f"Archive contains more than {self.uploads.max_files} source files", status=413)
+        if self.total_bytes > self.uploads.max_total_bytes:
+            raise UploadError(
+                f"Source files exceed {self.uploads.max_total_bytes // (1024 * 1024)} MB after extraction", status=413
+            )
+        return {"path": name, "code": code, "language": language_for_path(name)}
+
+
+def _count_languages(files: List[Dict[str, Any]]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for file in files:
+        counts[file["language"]] = counts.get(file["language"], 0) + 1
+    return counts
@@ -0,0 +1 @@
+# Пакет бенчмарков Code Explainer
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк прогрева кэшей после запуска (WARMUP_*).
+
+История из --history запросов к --snippets различным фрагментам с популярностью по закону
+Ципфа (как у реального трафика). После «перезапуска» кэши пусты; воспроизводятся первые
+--requests запросов из того же распределения (промах кладёт объяснение в кэш, как после
+вызова LLM). Сравнивается доля попаданий в кэш объяснений без прогрева и после прогрева
+CacheWarmer с разным числом прогреваемых фрагментов; выводится и время прогрева.
+
+Сервер для бенчмарка не нужен. Запуск из корня проекта:
+    python -m benchmarks.cache_warmup
+    python -m benchmarks.cache_warmup --snippets 5000 --history 100000 --entries 128 512 2048
+"""
+
+import argparse
+import os
+import random
+import tempfile
+
+os.environ.setdefault("DATABASE_DIR", tempfile.mkdtemp(prefix="code_explainer_bench_"))
+os.environ.setdefault("USE_MOCK_LLM", "true")
+os.environ.setdefault("SHARED_CACHE_ENABLED", "false")
+
+from sqlalchemy import text
+
+from backend.api.code import warm_cached_explanation
+from backend.database import SessionLocal, create_tables
+from backend.services.cache_warmup import CacheWarmer
+from backend.services.code_analyzer import CodeAnalyzer
+from backend.services.explanation_cache import ExplanationCache
+from backend.services.llm_service import LLMService
+from backend.services.shared_cache import LocalLRUCache, TieredCache
+from benchmarks.live_analysis import python_function
+
+LEVEL = "intermediate"
+
+
+def seed(snippets, history: int, weights, rng: random.Random):
+    create_tables()
+    db = SessionLocal()
+    try:
+        db.execute(text("DELETE FROM code_explanations"))
+        db.execute(
+            text("INSERT INTO code_explanations (code_snippet, language, explanation, complexity_level, "
+                 "created_at, is_favorite) VALUES (:code, 'python', :text, :level, CURRENT_TIMESTAMP, 0)"),
+            [{"code": snippets[i], "text": f"Explanation of snippet {i}", "level": LEVEL}
+             for i in rng.choices(range(len(snippets)), weights, k=history)]
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def replay(cache: ExplanationCache, snippets, requests):
+    """
+    Доля попаданий в первых 10%, 50% и во всех запросах
+    """
+    hits, marks = 0, {}
+    for n, i in enumerate(requests, 1):
+        if cache.get(snippets[i], "python", LEVEL) is not None:
+            hits += 1
+        else:
+            cache.set(snippets[i], "python", LEVEL, f"Explanation of snippet {i}")
+        if n in (len(requests) // 10, len(requests) // 2, len(requests)):
+            marks[n] = hits / n
+    return marks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snippets", type=int, default=2000, help="различных фрагментов")
+    parser.add_argument("--history", type=int, default=50000, help="запросов в истории")
+    parser.add_argument("--requests", type=int, default=2000, help="запросов после перезапуска")
+    parser.add_argument("--entries", type=int, nargs="+", default=[64, 256, 1024], help="прогреваемых фрагментов")
+    parser.add_argument("--cache-size", type=int, default=1024, help="размер кэша объяснений")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    snippets = [python_function(i, rng) for i in range(args.snippets)]
+    weights = [1 / (i + 1) for i in range(args.snippets)]
+    seed(snippets, args.history, weights, rng)
+    requests = rng.choices(range(args.snippets), weights, k=args.requests)
+    print(f"История: {args.history} запросов к {args.snippets} фрагментам; после перезапуска {args.requests} запросов, "
+          f"кэш объяснений {args.cache_size}")
+
+    def report(label, marks):
+        print(f"  {label:<32} " + ", ".join(f"первые {n}: {rate:6.1%}" for n, rate in marks.items()))
+
+    report("без прогрева", replay(ExplanationCache(args.cache_size), snippets, requests))
+    analyzer, llm_service = CodeAnalyzer(), LLMService()
+    for entries in args.entries:
+        cache = ExplanationCache(args.cache_size)
+        analysis_cache = TieredCache(LocalLRUCache(args.cache_size))
+        warmer = CacheWarmer(max_entries=min(entries, args.cache_size), scan_rows=args.history)
+        stats = warmer.warm([SessionLocal], lambda entry: warm_cached_explanation(
+            analyzer, analysis_cache, cache, llm_service, entry
+        ))
+        report(f"прогрев {stats['warmed']} за {stats['seconds'] * 1000:.0f} мс", replay(cache, snippets, requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк справедливой очереди к LLM (LLM_MAX_CONCURRENCY) и лимитов запросов (RATE_LIMIT_*).
+
+Заглушка LLM с задержкой --latency-ms одновременно генерирует не больше --capacity ответов
+(как реальный сервер инференса), остальные ждут в порядке поступления. «Тяжёлый» клиент
+(свой X-API-Key) шлёт /code/explain из --heavy-threads потоков без пауз, «лёгкий» —
+--light-requests запросов по одному. Без очереди запросы лёгкого клиента стоят у LLM за всеми
+запросами тяжёлого; со справедливой очередью места делятся между клиентами поровну.
+Выводятся задержки лёгкого клиента, пропускная способность тяжёлого и ожидание в очереди
+по /usage/clients. В конце — стоимость проверки лимита на запрос.
+
+Запуск из корня проекта:
+    python -m benchmarks.fair_queue
+    python -m benchmarks.fair_queue --heavy-threads 32 --capacity 8 --latency-ms 300
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("DATABASE_DIR", tempfile.mkdtemp(prefix="code_explainer_bench_"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Токен читается при импорте приложения
+os.environ.setdefault("ADMIN_TOKEN", "bench")
+# Клиенты бенчмарка различаются по ключам API, а клиентом считается только выданный ключ
+os.environ.setdefault("RATE_LIMIT_API_KEYS", "heavy,light")
+
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.services.rate_limiter import ClientUsage, RateLimiter
+from benchmarks.fake_llm import FakeLLMServer
+from benchmarks.load_test import percentile
+
+# Каждый запрос должен дойти до LLM: кэши и поиск почти одинаковых фрагментов выключены
+BENCH_ENV = {
+    "USE_MOCK_LLM": "false",
+    "EXPLANATION_CACHE_SIZE": "0",
+    "ANALYSIS_CACHE_SIZE": "0",
+    "SHARED_CACHE_ENABLED": "false",
+    "NEAR_DUPLICATE_ENABLED": "false",
+    "WARMUP_ENABLED": "false",
+    "RATE_LIMIT_ENABLED": "false",
+}
+
+
+def snippet(client: str, i: int) -> str:
+    return f"def {client}_{i}(items):\n    return [item * 2 for item in items]\n"
+
+
+def run(label: str, max_concurrency: int, heavy_threads: int, light_requests: int):
+    os.environ["LLM_MAX_CONCURRENCY"] = str(max_concurrency)
+    with TestClient(app) as client:
+        stop = threading.Event()
+        heavy_done = [0]
+
+        def heavy(thread: int):
+            i = 0
+            while not stop.is_set():
+                client.post("/code/explain", headers={"X-API-Key": "heavy"},
+                            json={"code_snippet": snippet(f"heavy_{thread}", i), "language": "python"})
+                heavy_done[0] += 1
+                i += 1
+
+        threads = [threading.Thread(target=heavy, args=(t,)) for t in range(heavy_threads)]
+        for thread in threads:
+            thread.start()
+        # Очередь тяжёлого клиента успевает заполниться
+        time.sleep(0.5)
+        started = time.perf_counter()
+        heavy_before = heavy_done[0]
+        latencies = []
+        for i in range(light_requests):
+            start = time.perf_counter()
+            client.post("/code/explain", headers={"X-API-Key": "light"},
+                        json={"code_snippet": snippet("light", i), "language": "python"}).raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+        heavy_rate = (heavy_done[0] - heavy_before) / elapsed
+        stop.set()
+        for thread in threads:
+            thread.join()
+        usage = client.get("/usage/clients", headers={"X-Admin-Token": os.environ["ADMIN_TOKEN"]}).json()["clients"]
+
+    latencies.sort()
+    print(f"  {label:<26} лёгкий клиент p50={percentile(latencies, 50) * 1000:7.0f} мс, "
+          f"p99={percentile(latencies, 99) * 1000:7.0f} мс; тяжёлый {heavy_rate:5.1f} запросов/с")
+    for entry in sorted(usage, key=lambda entry: entry["client"]):
+        if entry.get("llm_calls"):
+            print(f"  {'':<26} {entry['client']}: вызовов LLM {entry['llm_calls']}, "
+                  f"ожидание в очереди в среднем {entry['llm_queue_seconds'] / entry['llm_calls'] * 1000:.0f} мс")
+
+
+def limiter_overhead(requests: int):
+    limiter = RateLimiter({"explain": (1e9, 1e9)}, ClientUsage())
+    clients = [f"ip:10.0.{i // 256}.{i % 256}" for i in range(1000)]
+    start = time.perf_counter()
+    for i in range(requests):
+        limiter.acquire(clients[i % len(clients)], "explain")
+    elapsed = time.perf_counter() - start
+    print(f"Проверка лимита и учёт запроса: {elapsed / requests * 1e6:.1f} мкс на запрос "
+          f"({len(clients)} клиентов)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--heavy-threads", type=int, default=16, help="потоков тяжёлого клиента")
+    parser.add_argument("--light-requests", type=int, default=15, help="запросов лёгкого клиента")
+    parser.add_argument("--capacity", type=int, default=4, help="одновременных генераций заглушки LLM")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="задержка ответа заглушки LLM, мс")
+    args = parser.parse_args()
+
+    os.environ.update(BENCH_ENV)
+    with FakeLLMServer(latency_ms=args.latency_ms, capacity=args.capacity) as fake_llm:
+        os.environ["LLM_API_URL"] = fake_llm.url
+        print(f"LLM: {args.capacity} одновременных генераций по {args.latency_ms:.0f} мс; "
+              f"тяжёлый клиент — {args.heavy_threads} потоков")
+        run("без очереди", 0, args.heavy_threads, args.light_requests)
+        run(f"справедливая очередь ({args.capacity})", args.capacity, args.heavy_threads, args.light_requests)
+    limiter_overhead(200_000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Локальный сервер-заглушка LLM API с искусственной задержкой.
+
+Отвечает в формате Hugging Face Inference API ([{"generated_text": ...}]),
+поэтому подключается к бэкенду через LLM_API_URL без изменения кода.
+
+Запуск из корня проекта:
+    python -m benchmarks.fake_llm --port 8081 --latency-ms 300 --jitter-ms 50
+    LLM_API_URL=http://127.0.0.1:8081 USE_MOCK_LLM=false python run.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.services.explanation_cache import COMPLEXITY_LEVELS
+from backend.services.llm_service import LEVEL_MARKER_PREFIX
+
+EXPLANATION_BODY = (
+    "## Обзор\n"
+    "Этот код демонстрирует типичный приём для данного языка.\n\n"
+    "## Разбор\n"
+    "1. Объявляются входные данные.\n"
+    "2. Выполняется основная логика.\n"
+    "3. Возвращается результат.\n"
+)
+
+
+class FakeLLMServer:
+    """
+    HTTP-сервер, имитирующий LLM API: задержка, разброс задержки, доля ошибок и ёмкость
+    (capacity одновременно генерируемых ответов, остальные ждут в порядке поступления; 0 — без ограничения)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, error_rate: float = 0.0, latency_per_kb_ms: float = 0.0,
+                 capacity: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # Добавка к задержке за каждый килобайт промпта (время обработки входных токенов)
+        self.latency_per_kb_ms = latency_per_kb_ms
+        self.requests_served = 0
+        # Суммарный размер промптов в символах — оценка расхода входных токенов
+        self.prompt_chars = 0
+        self._capacity = threading.Semaphore(capacity) if capacity > 0 else None
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _delay(self, prompt: str = ""):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        delay += len(prompt.encode("utf-8")) / 1024 * self.latency_per_kb_ms
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Заголовки и тело уходят отдельными пакетами: без этого Nagle и
+            # отложенный ACK добавляют ~40 мс к каждому ответу
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                prompt = payload.get("inputs", "")
+                if server._capacity is None:
+                    server._delay(prompt)
+                else:
+                    with server._capacity:
+                        server._delay(prompt)
+                server.requests_served += 1
+                server.prompt_chars += len(prompt)
+                if random.random() < server.error_rate:
+                    self._reply(503, {"error": "Model is currently loading"})
+                    return
+                self._reply(200, [{"generated_text": generate_text(prompt)}])
+
+            def _reply(self, status, body):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def generate_text(prompt: str) -> str:
+    """
+    Формирует ответ: с маркерами уровней, если промпт просит все уровни сразу
+    """
+    if LEVEL_MARKER_PREFIX in prompt:
+        return "\n".join(f"{LEVEL_MARKER_PREFIX}{level}\n{EXPLANATION_BODY}" for level in COMPLEXITY_LEVELS)
+    return EXPLANATION_BODY
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="средняя задержка ответа, мс")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="разброс задержки, мс")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 503")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"Заглушка LLM API: {server.url} (задержка {args.latency_ms} ± {args.jitter_ms} мс)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
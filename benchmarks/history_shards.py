@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк шардов истории (HISTORY_SHARDS).
+
+--writers процессов (как воркеры gunicorn) одновременно сохраняют по --rows объяснений
+тем же путём, что /code/explain (save_explanation_to_db: запись, теги, триггеры версии),
+каждый от имени своего клиента. Клиенты равномерно закреплены за шардами, поэтому при
+одном шарде все процессы делят одну блокировку записи SQLite, а при N — по шарду на
+группу клиентов. Выводятся записи в секунду и задержка сохранения, затем время запросов
+по всей истории (страница списка, статистика), которые опрашивают все шарды.
+
+Сервер для бенчмарка не нужен. Запуск из корня проекта:
+    python -m benchmarks.history_shards
+    python -m benchmarks.history_shards --writers 16 --rows 500 --shards 1 2 4 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_DIR", tempfile.mkdtemp(prefix="code_explainer_bench_"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks.load_test import percentile
+
+EXPLANATION = "## Python Code Analysis\n\n" + "This function iterates over the items and returns a result. " * 30
+
+
+def shard_paths(directory: str, shards: int):
+    return [os.path.join(directory, f"history.shard{shard}.db") for shard in range(shards)]
+
+
+def tenant_map(writers: int, shards: int):
+    return {f"tenant-{writer}": writer % shards for writer in range(writers)}
+
+
+def writer(paths, tenants, tenant: str, rows: int, start, results):
+    from backend.api.code import save_explanation_to_db
+    from backend.services.history_shards import HistoryShards
+
+    shards = HistoryShards(paths, tenants)
+    db = shards.session(shards.shard_for_tenant(tenant))
+    latencies, failures = [], 0
+    start.wait()
+    try:
+        for i in range(rows):
+            began = time.perf_counter()
+            explanation_id = save_explanation_to_db(
+                db, f"def {tenant.replace('-', '_')}_{i}(items):\n    return sorted(items)\n", "python",
+                EXPLANATION, "intermediate", tags=["sorting", tenant]
+            )
+            latencies.append(time.perf_counter() - began)
+            failures += explanation_id is None
+    finally:
+        db.close()
+        shards.dispose()
+    results.put((time.perf_counter(), latencies, failures))
+
+
+def run(directory: str, shards: int, writers: int, rows: int, queries: int):
+    from backend.api.history import query_explanations, query_stats
+    from backend.services.history_shards import HistoryShards
+
+    paths = shard_paths(directory, shards)
+    tenants = tenant_map(writers, shards)
+    history = HistoryShards(paths, tenants)
+    history.create_tables()
+
+    context = multiprocessing.get_context("spawn")
+    start, results = context.Event(), context.Queue()
+    processes = [
+        context.Process(target=writer, args=(paths, tenants, f"tenant-{w}", rows, start, results))
+        for w in range(writers)
+    ]
+    for process in processes:
+        process.start()
+    # Процессы импортируют приложение до старта замера
+    time.sleep(3)
+    began = time.perf_counter()
+    start.set()
+    finished = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = max(end for end, _, _ in finished) - began
+    latencies = sorted(latency for _, shard_latencies, _ in finished for latency in shard_latencies)
+    failures = sum(failed for _, _, failed in finished)
+    print(f"  шардов {shards:>2}: {writers * rows / elapsed:7.0f} записей/с, сохранение "
+          f"p50={percentile(latencies, 50) * 1000:6.2f} мс, p99={percentile(latencies, 99) * 1000:7.2f} мс"
+          + (f", ошибок {failures}" if failures else ""))
+
+    sessions = history.sessions()
+    try:
+        for label, call in (
+            ("страница списка", lambda: query_explanations(sessions, None, None, None, None, 1, 10)),
+            ("страница 10 с фильтром по тегу", lambda: query_explanations(sessions, None, None, None, None, 10, 10, ["sorting"])),
+            ("статистика", lambda: query_stats(sessions)),
+        ):
+            timings = []
+            for _ in range(queries):
+                query_began = time.perf_counter()
+                call()
+                timings.append(time.perf_counter() - query_began)
+            timings.sort()
+            print(f"             {label:<32} p50={percentile(timings, 50) * 1000:6.2f} мс")
+    finally:
+        for db in sessions:
+            db.close()
+        history.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8, help="процессов, пишущих одновременно")
+    parser.add_argument("--rows", type=int, default=300, help="объяснений на процесс")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="числа шардов")
+    parser.add_argument("--queries", type=int, default=20, help="запросов каждого замера чтения")
+    args = parser.parse_args()
+
+    print(f"{args.writers} процессов по {args.rows} объяснений:")
+    for shards in args.shards:
+        directory = tempfile.mkdtemp(dir=os.environ["DATABASE_DIR"])
+        try:
+            run(directory, shards, args.writers, args.rows, args.queries)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
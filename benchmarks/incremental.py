@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк повторного объяснения отредактированного фрагмента (previous_snippet_hash).
+
+Для синтетических фрагментов из --functions функций (Python и JavaScript) сначала
+запрашивается полное объяснение, затем --edits раз подряд меняется одна строка в
+случайной функции — как при правке в редакторе. Каждая правка объясняется дважды:
+целиком (без previous_snippet_hash) и через предыдущую версию. Выводятся задержка,
+число вызовов LLM и объём промптов (оценка расхода входных токенов).
+
+Заглушка LLM отвечает с задержкой --latency-ms плюс --latency-per-kb-ms за каждый
+килобайт промпта: время генерации растёт с размером объясняемого кода.
+
+Запуск из корня проекта:
+    python -m benchmarks.incremental
+    python -m benchmarks.incremental --functions 20 --edits 30 --latency-ms 300 --latency-per-kb-ms 200
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_DIR", tempfile.mkdtemp(prefix="code_explainer_bench_"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from benchmarks.fake_llm import FakeLLMServer
+from benchmarks.load_test import percentile
+
+# Каждый запрос должен дойти до LLM или до разбивки на блоки
+BENCH_ENV = {
+    "USE_MOCK_LLM": "false",
+    "NEAR_DUPLICATE_ENABLED": "false",
+    "SHARED_CACHE_ENABLED": "false",
+}
+
+
+def python_function(i: int, rng: random.Random) -> str:
+    return "\n".join([
+        f"def process_{i}(items, limit={rng.randint(1, 100)}):",
+        f'    """Обрабатывает элементы, шаг {i}"""',
+        "    result = []",
+        "    for item in items:",
+        f"        if item % {rng.randint(2, 9)} == 0:",
+        f"            result.append(item * {rng.randint(2, 9)})",
+        "        elif len(result) > limit:",
+        "            break",
+        "    return result",
+    ])
+
+
+def javascript_function(i: int, rng: random.Random) -> str:
+    return "\n".join([
+        f"function process{i}(items, limit = {rng.randint(1, 100)}) {{",
+        "    const result = [];",
+        "    for (const item of items) {",
+        f"        if (item % {rng.randint(2, 9)} === 0) {{",
+        f"            result.push(item * {rng.randint(2, 9)});",
+        "        } else if (result.length > limit) {",
+        "            break;",
+        "        }",
+        "    }",
+        "    return result;",
+        "}",
+    ])
+
+
+def build_snippet(language: str, functions: int, rng: random.Random):
+    make = python_function if language == "python" else javascript_function
+    return [make(i, rng) for i in range(functions)]
+
+
+def edit_function(function: str, rng: random.Random) -> str:
+    """
+    Меняет один числовой литерал в функции — правка одной строки
+    """
+    lines = function.split("\n")
+    candidates = [i for i, line in enumerate(lines) if "* " in line or "% " in line]
+    i = rng.choice(candidates)
+    digit = next(ch for ch in reversed(lines[i]) if ch.isdigit())
+    position = lines[i].rindex(digit)
+    lines[i] = lines[i][:position] + str((int(digit) + rng.randint(1, 8)) % 10) + lines[i][position + 1:]
+    return "\n".join(lines)
+
+
+def run(client: TestClient, fake_llm: FakeLLMServer, language: str, functions: int, edits: int,
+        all_levels: bool, rng: random.Random):
+    blocks = build_snippet(language, functions, rng)
+    code = "\n\n".join(blocks) + "\n"
+    client.post("/code/explain", json={"code_snippet": code, "language": language, "all_levels": all_levels}).raise_for_status()
+    stats = {mode: {"latencies": [], "calls": 0, "chars": 0} for mode in ("full", "incremental")}
+    spliced = 0
+    for n in range(edits):
+        target = rng.randrange(len(blocks))
+        blocks[target] = edit_function(blocks[target], rng)
+        previous_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        code = "\n\n".join(blocks) + "\n"
+        for mode in ("full", "incremental"):
+            payload = {"code_snippet": code, "language": language, "all_levels": all_levels}
+            if mode == "full":
+                # Отдельный вариант того же кода, чтобы не попасть в кэш объяснений
+                comment = "#" if language == "python" else "//"
+                payload["code_snippet"] = f"{code}{comment} full {n}\n"
+            else:
+                payload["previous_snippet_hash"] = previous_hash
+            calls, chars = fake_llm.requests_served, fake_llm.prompt_chars
+            start = time.perf_counter()
+            response = client.post("/code/explain", json=payload)
+            stats[mode]["latencies"].append(time.perf_counter() - start)
+            response.raise_for_status()
+            stats[mode]["calls"] += fake_llm.requests_served - calls
+            stats[mode]["chars"] += fake_llm.prompt_chars - chars
+            if mode == "incremental" and response.json()["incremental"]:
+                spliced += 1
+
+    title = f"{language}, {functions} функций ({len(code.splitlines())} строк), {'все уровни' if all_levels else 'один уровень'}"
+    print(f"{title}; собрано из предыдущей версии {spliced} из {edits}:")
+    for mode, label in (("full", "целиком"), ("incremental", "по блокам")):
+        latencies = sorted(stats[mode]["latencies"])
+        print(f"  {label:>9}: p50={percentile(latencies, 50) * 1000:7.1f} мс, p99={percentile(latencies, 99) * 1000:7.1f} мс, "
+              f"вызовов LLM {stats[mode]['calls'] / edits:.1f} на правку, промпт {stats[mode]['chars'] / edits / 1024:.1f} КБ на правку")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", type=int, default=12, help="функций во фрагменте")
+    parser.add_argument("--edits", type=int, default=20, help="правок подряд")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="базовая задержка заглушки LLM")
+    parser.add_argument("--latency-per-kb-ms", type=float, default=150.0, help="добавка к задержке за килобайт промпта")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.update(BENCH_ENV)
+    rng = random.Random(args.seed)
+    with FakeLLMServer(latency_ms=args.latency_ms, latency_per_kb_ms=args.latency_per_kb_ms) as fake_llm:
+        os.environ["LLM_API_URL"] = fake_llm.url
+        with TestClient(app) as client:
+            for language in ("python", "javascript"):
+                for all_levels in (False, True):
+                    run(client, fake_llm, language, args.functions, args.edits, all_levels, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк очереди задач объяснения (POST /code/jobs).
+
+Поднимает заглушку LLM с задержкой и долей ошибок 503, отправляет --jobs задач
+без ожидания результата и ждёт, пока пул воркеров выполнит их все. Для каждого
+размера пула (--workers) выводит задержку постановки в очередь (не зависит от
+длительности генерации), время разбора очереди, пропускную способность и число
+повторов после ошибок LLM.
+
+Запуск из корня проекта:
+    python -m benchmarks.jobs
+    python -m benchmarks.jobs --jobs 200 --workers 1 4 8 --latency-ms 300 --error-rate 0.1
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_DIR", tempfile.mkdtemp(prefix="code_explainer_bench_"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from backend.app import app
+from backend.database import SessionLocal
+from benchmarks.fake_llm import FakeLLMServer
+from benchmarks.load_test import percentile
+from benchmarks.mock_render import SNIPPETS
+
+# Каждая задача должна дойти до LLM: кэши и поиск почти одинаковых фрагментов выключены.
+# Задаётся после импортов (mock_render включает мок-режим), контейнер читает окружение при старте
+BENCH_ENV = {
+    "USE_MOCK_LLM": "false",
+    "EXPLANATION_CACHE_SIZE": "0",
+    "ANALYSIS_CACHE_SIZE": "0",
+    "SHARED_CACHE_ENABLED": "false",
+    "NEAR_DUPLICATE_ENABLED": "false",
+    "JOB_RETRY_BASE_SECONDS": "0.05",
+    "JOB_POLL_INTERVAL": "0.05",
+}
+
+
+def run(jobs: int, workers: int):
+    os.environ["JOB_WORKERS"] = str(workers)
+    with TestClient(app) as client:
+        latencies = []
+        started = time.perf_counter()
+        for i in range(jobs):
+            language, snippet = SNIPPETS[i % len(SNIPPETS)]
+            start = time.perf_counter()
+            response = client.post("/code/jobs", json={
+                "code_snippet": f"{snippet}\n// job {workers}-{i}" if language != "python" else f"{snippet}\n# job {workers}-{i}",
+                "language": language,
+                "max_attempts": 5
+            })
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+        with SessionLocal() as db:
+            while db.execute(text("SELECT COUNT(*) FROM explain_jobs WHERE status IN ('queued', 'running')")).scalar():
+                time.sleep(0.05)
+            drained = time.perf_counter() - started
+            counts = dict(db.execute(text("SELECT status, COUNT(*) FROM explain_jobs GROUP BY status")).fetchall())
+            attempts = db.execute(text("SELECT SUM(attempts) FROM explain_jobs")).scalar()
+            db.execute(text("DELETE FROM explain_jobs"))
+            db.commit()
+    latencies.sort()
+    print(f"  воркеров {workers:>2}: постановка p50={percentile(latencies, 50) * 1000:.2f} мс, "
+          f"p99={percentile(latencies, 99) * 1000:.2f} мс; очередь разобрана за {drained:.1f} с "
+          f"({jobs / drained:.1f} задач/с); успешно {counts.get('succeeded', 0)}, с ошибкой {counts.get('failed', 0)}, "
+          f"повторов {attempts - jobs}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=100, help="задач в каждом прогоне")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8], help="размеры пула воркеров")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="задержка заглушки LLM")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="доля ответов 503 от заглушки LLM")
+    args = parser.parse_args()
+
+    os.environ.update(BENCH_ENV)
+    with FakeLLMServer(latency_ms=args.latency_ms, error_rate=args.error_rate) as fake_llm:
+        os.environ["LLM_API_URL"] = fake_llm.url
+        print(f"{args.jobs} задач, LLM {args.latency_ms:.0f} мс, ошибок {args.error_rate:.0%}:")
+        for workers in args.workers:
+            run(args.jobs, workers)
+
+
+if __name__ == "__main__":
+    main()
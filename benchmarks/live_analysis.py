@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк живого анализа редактора (/code/live).
+
+Синтетический фрагмент из --functions функций (Python и JavaScript) правится --edits раз:
+вставка и удаление символов в случайных местах, как при наборе. После каждой правки
+сравнивается время полного анализа (detect_language, validate_code, extract_code_summary —
+то, что делает /code/explain) и анализа по состоянию соединения (LiveAnalysis), где
+заново обрабатываются только изменённые части кода. Результаты обоих способов
+проверяются на совпадение.
+
+Сервер для бенчмарка не нужен. Запуск из корня проекта:
+    python -m benchmarks.live_analysis
+    python -m benchmarks.live_analysis --functions 100 --edits 500
+"""
+
+import argparse
+import random
+import time
+
+from backend.services.code_analyzer import CodeAnalyzer
+from backend.services.live_analysis import LiveAnalysis
+from benchmarks.load_test import percentile
+
+# Вставляемые при «наборе» фрагменты
+TYPED_TEXT = ["x", "1", " ", "\n", "    ", "total += 1", "if (a > b) {", "}", "print(a)", "def helper(x):\n"]
+
+
+def python_function(i: int, rng: random.Random) -> str:
+    return "\n".join([
+        f"def process_{i}(items, limit={rng.randint(1, 100)}):",
+        "    result = []",
+        "    for item in items:",
+        f"        if item % {rng.randint(2, 9)} == 0:",
+        f"            result.append(item * {rng.randint(2, 9)})",
+        "    return result",
+    ])
+
+
+def javascript_function(i: int, rng: random.Random) -> str:
+    return "\n".join([
+        f"function process{i}(items, limit = {rng.randint(1, 100)}) {{",
+        "    const result = [];",
+        "    for (const item of items) {",
+        f"        if (item % {rng.randint(2, 9)} === 0) {{",
+        f"            result.push(item * {rng.randint(2, 9)});",
+        "        }",
+        "    }",
+        "    return result;",
+        "}",
+    ])
+
+
+def full_analysis(code: str) -> dict:
+    language = CodeAnalyzer.detect_language(code)
+    validation = CodeAnalyzer.validate_code(code, language)
+    summary = CodeAnalyzer.extract_code_summary(code, language) if validation["is_valid"] else None
+    return {"language": language, "validation": validation, "summary": summary}
+
+
+def run(language: str, functions: int, edits: int, rng: random.Random):
+    make = python_function if language == "python" else javascript_function
+    code = "\n\n".join(make(i, rng) for i in range(functions)) + "\n"
+    state = LiveAnalysis()
+    state.reset(code, None)
+    state.analyze()
+
+    timings = {"full": [], "live": []}
+    for version in range(1, edits + 1):
+        offset = rng.randrange(len(code))
+        length = rng.choice([0, 0, 1, 3])
+        text = rng.choice(TYPED_TEXT) if length == 0 or rng.random() < 0.5 else ""
+        length = min(length, len(code) - offset)
+        code = code[:offset] + text + code[offset + length:]
+        state.apply([{"offset": offset, "length": length, "text": text}], version)
+
+        start = time.perf_counter()
+        expected = full_analysis(code)
+        timings["full"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        actual = state.analyze()
+        timings["live"].append(time.perf_counter() - start)
+        if actual != expected:
+            raise AssertionError(f"Live analysis differs from full analysis after edit {version}")
+
+    print(f"{language}, {functions} функций, {len(code)} символов, {edits} правок:")
+    for mode, label in (("full", "полный"), ("live", "живой")):
+        latencies = sorted(timings[mode])
+        print(f"  {label:>7}: p50={percentile(latencies, 50) * 1000:7.2f} мс, "
+              f"p99={percentile(latencies, 99) * 1000:7.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", type=int, default=40, help="Число функций во фрагменте")
+    parser.add_argument("--edits", type=int, default=200, help="Число правок")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for language in ("python", "javascript"):
+        run(language, args.functions, args.edits, rng)
+
+
+if __name__ == "__main__":
+    main()
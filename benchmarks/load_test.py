@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест API и бенчмарк компонентов с проверкой регрессий по базовой линии.
+
+Сценарии воспроизводят корпуса запросов из benchmarks/corpora/*.jsonl
+(одна JSON-запись на строку: request_id, title, method, path, body/params):
+    explain-mock  — POST /code/explain в мок-режиме LLM;
+    explain-llm   — POST /code/explain через локальную заглушку LLM API с задержкой;
+    history       — GET /history/* по заранее заполненной истории;
+    components    — CodeAnalyzer, слой БД и HTTP-клиент LLM по отдельности.
+
+Запуск из корня проекта:
+    python -m benchmarks.load_test                          # все сценарии в процессе
+    python -m benchmarks.load_test --mode http              # через uvicorn по HTTP
+    python -m benchmarks.load_test --mode http --url http://localhost:8000 --scenario history
+    python -m benchmarks.load_test --save-baseline          # записать базовую линию
+    python -m benchmarks.load_test --check                  # упасть при регрессии
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Бенчмарк не трогает рабочую базу данных и не засоряет вывод журналом запросов
+os.environ.setdefault("DATABASE_DIR", tempfile.mkdtemp(prefix="code_explainer_bench_"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import requests
+
+from benchmarks.fake_llm import FakeLLMServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+CORPORA_DIR = os.path.join(BENCH_DIR, "corpora")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "baseline.json")
+
+SCENARIOS = {
+    "explain-mock": {"corpus": "explain.jsonl", "llm": "mock"},
+    "explain-llm": {"corpus": "explain.jsonl", "llm": "fake"},
+    "history": {"corpus": "history.jsonl", "llm": "mock", "seed": "explain.jsonl"},
+}
+ALL_SCENARIOS = list(SCENARIOS) + ["components"]
+
+# Направление метрик при сравнении с базовой линией; остальные метрики справочные
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "cpu_ms_per_request", "per_op_us")
+HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+def load_corpus(name: str) -> List[Dict[str, Any]]:
+    path = name if os.path.isabs(name) else os.path.join(CORPORA_DIR, name)
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """
+    Перцентиль методом ближайшего ранга по отсортированному списку
+    """
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(rank, 1)) - 1]
+
+
+class ProcessSampler:
+    """
+    Снимает процессорное время и RSS процесса (через /proc, иначе через getrusage для себя)
+    """
+
+    def __init__(self, pid: Optional[int] = None):
+        self.pid = pid or os.getpid()
+        self.own = self.pid == os.getpid()
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def cpu_seconds(self) -> Optional[float]:
+        if self.own:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            return usage.ru_utime + usage.ru_stime
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / self._ticks
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def memory_mb(self) -> Dict[str, Optional[float]]:
+        values = {"VmRSS": None, "VmHWM": None}
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    key = line.split(":", 1)[0]
+                    if key in values:
+                        values[key] = int(line.split()[1]) / 1024
+        except OSError:
+            if self.own:
+                # ru_maxrss — в КБ на Linux и в байтах на macOS
+                peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                values["VmHWM"] = peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+        return {"rss_mb": values["VmRSS"], "peak_rss_mb": values["VmHWM"]}
+
+
+class InProcessTarget:
+    """
+    Приложение в текущем процессе через TestClient (без сети и сериализации HTTP)
+    """
+
+    def __init__(self, env: Dict[str, str]):
+        self.env = env
+        self._saved_env = {}
+        self.client = None
+        self.sampler = ProcessSampler()
+
+    def __enter__(self):
+        for key, value in self.env.items():
+            self._saved_env[key] = os.environ.get(key)
+            os.environ[key] = value
+        from fastapi.testclient import TestClient
+        from backend.app import app
+        # Контейнер сервисов создаётся в lifespan и читает окружение заново
+        self.client = TestClient(app).__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.client.__exit__(*exc)
+        for key, value in self._saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    def send(self, entry: Dict[str, Any]) -> int:
+        response = self.client.request(entry["method"], entry["path"], json=entry.get("body"), params=entry.get("params"))
+        return response.status_code
+
+
+class HttpTarget:
+    """
+    Приложение по HTTP: уже запущенный сервер (url) или uvicorn в дочернем процессе
+    """
+
+    def __init__(self, env: Dict[str, str], url: Optional[str] = None):
+        self.env = env
+        self.url = url.rstrip("/") if url else None
+        self.process = None
+        self.sampler = None
+        self._local = threading.local()
+
+    def __enter__(self):
+        if self.url is None:
+            port = _free_port()
+            self.url = f"http://127.0.0.1:{port}"
+            self.process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "backend.app:app", "--host", "127.0.0.1",
+                 "--port", str(port), "--log-level", "warning"],
+                cwd=ROOT_DIR, env={**os.environ, **self.env}
+            )
+            self.sampler = ProcessSampler(self.process.pid)
+            self._wait_ready()
+        return self
+
+    def __exit__(self, *exc):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def _wait_ready(self, timeout: float = 30.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("uvicorn завершился при запуске")
+            try:
+                if requests.get(f"{self.url}/health/live", timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Сервер {self.url} не ответил за {timeout} с")
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def send(self, entry: Dict[str, Any]) -> int:
+        response = self._session().request(
+            entry["method"], self.url + entry["path"], json=entry.get("body"), params=entry.get("params"), timeout=120
+        )
+        return response.status_code
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_load(target, entries: List[Dict[str, Any]], total: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    """
+    Прогоняет корпус по кругу заданное число раз и собирает задержки и ресурсы
+    """
+    for entry in entries[:warmup]:
+        target.send(entry)
+
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker():
+        local_latencies = []
+        local_errors = 0
+        while True:
+            i = next(counter)
+            if i >= total:
+                break
+            start = time.perf_counter()
+            try:
+                status = target.send(entries[i % len(entries)])
+            except Exception:
+                status = 599
+            local_latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    sampler = target.sampler
+    cpu_before = sampler.cpu_seconds() if sampler else None
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - started
+    cpu_after = sampler.cpu_seconds() if sampler else None
+
+    latencies.sort()
+    result = {
+        "requests": total,
+        "errors": errors[0],
+        "concurrency": concurrency,
+        "throughput_rps": total / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+    if cpu_before is not None and cpu_after is not None:
+        cpu = cpu_after - cpu_before
+        result["cpu_percent"] = cpu / elapsed * 100
+        result["cpu_ms_per_request"] = cpu / total * 1000
+    if sampler:
+        result.update(sampler.memory_mb())
+    return result
+
+
+def scenario_env(scenario: Dict[str, Any], args, fake_llm: Optional[FakeLLMServer]) -> Dict[str, str]:
+    env = {
+        "USE_MOCK_LLM": "false" if scenario["llm"] == "fake" else "true",
+        # Без кэша каждый запрос проходит анализ, LLM и запись в БД
+        "EXPLANATION_CACHE_SIZE": os.environ.get("EXPLANATION_CACHE_SIZE", "512") if args.cache else "0",
+        "ANALYSIS_CACHE_SIZE": os.environ.get("ANALYSIS_CACHE_SIZE", "1024") if args.cache else "0",
+        "NEAR_DUPLICATE_ENABLED": "true" if args.cache else "false",
+        "DATABASE_DIR": os.environ["DATABASE_DIR"],
+        "LOG_LEVEL": os.environ["LOG_LEVEL"],
+    }
+    if fake_llm is not None:
+        env["LLM_API_URL"] = fake_llm.url
+    return env
+
+
+def run_scenario(name: str, args) -> Dict[str, Any]:
+    scenario = SCENARIOS[name]
+    # Свой корпус (например, журнал трафика) заменяет стандартный в сценариях explain-*
+    entries = load_corpus(args.corpus if args.corpus and name.startswith("explain") else scenario["corpus"])
+    fake_llm = None
+    if scenario["llm"] == "fake":
+        fake_llm = FakeLLMServer(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms).start()
+    try:
+        env = scenario_env(scenario, args, fake_llm)
+        target = HttpTarget(env, args.url) if args.mode == "http" else InProcessTarget(env)
+        with target:
+            if scenario.get("seed"):
+                for entry in load_corpus(scenario["seed"]):
+                    target.send(entry)
+            requests_count = args.requests if scenario["llm"] != "fake" else min(args.requests, args.llm_requests)
+            return run_load(target, entries, requests_count, args.concurrency, warmup=len(entries))
+    finally:
+        if fake_llm is not None:
+            fake_llm.stop()
+
+
+def _time_per_op(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run_components(args) -> Dict[str, Dict[str, Any]]:
+    """
+    Замеры отдельных компонентов: анализатор, запись и чтение БД, HTTP-клиент LLM
+    """
+    from backend.database import CodeExplanation, SessionLocal, create_tables
+    from backend.services.code_analyzer import CodeAnalyzer
+    from backend.services.llm_service import LLMService
+
+    snippets = [(e["body"]["code_snippet"], e["body"].get("language")) for e in load_corpus("explain.jsonl")]
+    iterations = args.component_iterations
+
+    def analyze_corpus():
+        for snippet, language in snippets:
+            detected = CodeAnalyzer.detect_language(snippet, language)
+            CodeAnalyzer.validate_code(snippet, detected)
+            CodeAnalyzer.extract_code_summary(snippet, detected)
+
+    results = {"component.analyzer": {"per_op_us": _time_per_op(analyze_corpus, iterations) / len(snippets)}}
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        def insert_row():
+            db.add(CodeExplanation(code_snippet=snippets[0][0], language="python", explanation="x" * 2000))
+            db.commit()
+
+        def query_page():
+            db.query(CodeExplanation).order_by(CodeExplanation.created_at.desc()).offset(20).limit(10).all()
+            db.query(CodeExplanation).count()
+
+        results["component.db_insert"] = {"per_op_us": _time_per_op(insert_row, iterations)}
+        results["component.db_query"] = {"per_op_us": _time_per_op(query_page, iterations)}
+    finally:
+        db.close()
+
+    # Заглушка без задержки: замеряется собственная стоимость клиента (сессия, JSON, HTTP)
+    with FakeLLMServer() as fake_llm:
+        service = LLMService()
+        service.api_url = fake_llm.url
+        prompt = service._create_prompt(snippets[0][0], "python", "intermediate")
+        try:
+            results["component.llm_client"] = {
+                "per_op_us": _time_per_op(lambda: service._generate(prompt, max_new_tokens=1000), iterations)
+            }
+        finally:
+            service.close()
+    return results
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Возвращает список регрессий относительно базовой линии с учётом допуска
+    """
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if metric not in metrics or not base.get(metric):
+                continue
+            ratio = metrics[metric] / base[metric]
+            worse = ratio > 1 + tolerance if metric in LOWER_IS_BETTER else ratio < 1 - tolerance
+            if worse:
+                regressions.append(f"{name}.{metric}: {metrics[metric]:.2f} (база {base[metric]:.2f}, {ratio - 1:+.0%})")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, Any]]):
+    for name, metrics in results.items():
+        formatted = ", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items() if v is not None)
+        print(f"{name}: {formatted}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=ALL_SCENARIOS, help="сценарий (можно несколько; по умолчанию все)")
+    parser.add_argument("--mode", choices=("inprocess", "http"), default="inprocess", help="способ обращения к API")
+    parser.add_argument("--url", help="адрес уже запущенного сервера для --mode http")
+    parser.add_argument("--corpus", help="JSONL-корпус или журнал трафика для сценариев explain-*")
+    parser.add_argument("--requests", type=int, default=300, help="запросов на сценарий")
+    parser.add_argument("--llm-requests", type=int, default=100, help="запросов в сценарии с заглушкой LLM")
+    parser.add_argument("--concurrency", type=int, default=4, help="число параллельных клиентов")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="задержка заглушки LLM, мс")
+    parser.add_argument("--llm-jitter-ms", type=float, default=10.0, help="разброс задержки заглушки LLM, мс")
+    parser.add_argument("--component-iterations", type=int, default=200, help="итераций в замерах компонентов")
+    parser.add_argument("--cache", action="store_true", help="не отключать кэш объяснений")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="файл базовой линии")
+    parser.add_argument("--save-baseline", action="store_true", help="записать результаты как базовую линию")
+    parser.add_argument("--check", action="store_true", help="завершиться с ошибкой при регрессии")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое ухудшение метрик (доля)")
+    parser.add_argument("--output", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.scenario or ALL_SCENARIOS:
+        if name == "components":
+            results.update(run_components(args))
+        else:
+            results[f"{name}.{args.mode}"] = run_scenario(name, args)
+    print_results(results)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Базовая линия записана: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("Базовая линия не найдена, сравнение пропущено")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"РЕГРЕССИЯ {regression}")
+    if not regressions:
+        print(f"Регрессий относительно базовой линии нет (допуск {args.tolerance:.0%})")
+    elif args.check:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк мок-режима /code/explain и golden-проверка шаблонов мок-объяснений.
+
+Запуск из корня проекта:
+    python -m benchmarks.mock_render              # golden-проверка и замер
+    python -m benchmarks.mock_render --check      # только golden-проверка
+    python -m benchmarks.mock_render --update-golden
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Изолируем бенчмарк от рабочей базы данных и отключаем кэши объяснений и анализа,
+# чтобы каждый запрос проходил через рендеринг мок-объяснения
+os.environ.setdefault("DATABASE_DIR", tempfile.mkdtemp(prefix="code_explainer_bench_"))
+os.environ["USE_MOCK_LLM"] = "true"
+os.environ["EXPLANATION_CACHE_SIZE"] = "0"
+os.environ["ANALYSIS_CACHE_SIZE"] = "0"
+
+from backend.services.code_analyzer import CodeAnalyzer
+from backend.services.explanation_cache import COMPLEXITY_LEVELS
+from backend.services.llm_service import LLMService
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "mock_explanations.json")
+
+SNIPPETS = [
+    ("python", "print('hi')"),
+    ("python", "# Пример на Python: последовательность Фибоначчи\ndef fibonacci(n):\n    \"\"\"Формирует последовательность\"\"\"\n    if n <= 0:\n        return []\n    sequence = [0, 1]\n    for i in range(2, n):\n        sequence.append(sequence[i-1] + sequence[i-2])\n    return sequence\n\nresult = fibonacci(10)\nprint(result)"),
+    ("python", "class Stack:\n    def __init__(self):\n        self.items = []\n    def push(self, item):\n        self.items.append(item)\n    def pop(self):\n        return self.items.pop()\n    def peek(self):\n        return self.items[-1]\n    def size(self):\n        return len(self.items)\n    def clear(self):\n        self.items = []\n"),
+    ("javascript", "// Сортировка\nfunction customSort(arr, compareFn) {\n    const sorted = [...arr];\n    for (let i = 0; i < sorted.length - 1; i++) {\n        for (let j = 0; j < sorted.length - i - 1; j++) {\n            if (compareFn(sorted[j], sorted[j + 1]) > 0) {\n                [sorted[j], sorted[j + 1]] = [sorted[j + 1], sorted[j]];\n            }\n        }\n    }\n    return sorted;\n}\nconst numbers = [64, 34, 25];\nconst byValue = (a, b) => a - b;\nconsole.log(customSort(numbers, byValue));"),
+    ("java", "public class BinarySearch {\n    public static int binarySearch(int[] arr, int target) {\n        int left = 0;\n        int right = arr.length - 1;\n        while (left <= right) {\n            int mid = left + (right - left) / 2;\n            if (arr[mid] == target) {\n                return mid;\n            } else if (arr[mid] < target) {\n                left = mid + 1;\n            } else {\n                right = mid - 1;\n            }\n        }\n        return -1;\n    }\n}"),
+    ("cpp", "#include <iostream>\nusing namespace std;\nstruct Node { int value; Node* next; };\nvoid deleteList(Node*& head) {\n    while (head != nullptr) {\n        Node* tmp = head;\n        head = head->next;\n        delete tmp;\n    }\n}\nint main() {\n    Node* head = new Node();\n    try { deleteList(head); } catch (...) {}\n    switch (head == nullptr) { default: break; }\n    if (head) { cout << 1; }\n    for (int i = 0; i < 3; i++) {}\n    return 0;\n}"),
+    ("csharp", "public class Greeter { public string Greet(string name) { return \"Hello \" + name; } }"),
+    ("typescript", "const total: number = [1, 2, 3].reduce((a, b) => a + b, 0);"),
+    ("ruby", "def greet(name)\n  puts \"Hello #{name}\"\nend"),
+    ("go", "package main\n\nfunc main() {\n    for i := 0; i < 10; i++ {\n        fmt.Println(i)\n    }\n}\n" + "// padding line\n" * 20),
+    ("sql", "SELECT name, COUNT(*) AS total FROM users WHERE active = 1 GROUP BY name ORDER BY total DESC;"),
+    ("bash", "x" * 250),
+    ("python", "\n".join(f"value_{i} = compute({i}) if {i} > 2 else None" for i in range(120))),
+    ("javascript", "let counter = 0;\ncounter += 1;"),
+]
+
+
+def build_cases():
+    """
+    Формирует детерминированный набор входных данных для golden-проверки
+    """
+    cases = []
+    for language, snippet in SNIPPETS:
+        summary = CodeAnalyzer.extract_code_summary(snippet, language)
+        for level in COMPLEXITY_LEVELS:
+            cases.append({"code_snippet": snippet, "language": language, "complexity_level": level, "code_summary": summary})
+        # Вариант без результатов анализа
+        cases.append({"code_snippet": snippet, "language": language, "complexity_level": "beginner", "code_summary": None})
+    return cases
+
+
+def render(case):
+    return LLMService()._mock_explanation(
+        case["code_snippet"], case["language"], case["complexity_level"], case["code_summary"]
+    )["explanation"]
+
+
+def update_golden():
+    cases = build_cases()
+    for case in cases:
+        case["expected"] = render(case)
+    with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+        json.dump(cases, f, ensure_ascii=False, indent=1)
+    print(f"Записано golden-образцов: {len(cases)} -> {GOLDEN_PATH}")
+
+
+def check_golden() -> bool:
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        cases = json.load(f)
+    failures = 0
+    for i, case in enumerate(cases):
+        if render(case) != case["expected"]:
+            failures += 1
+            print(f"Расхождение в образце #{i}: {case['language']} / {case['complexity_level']}")
+    print(f"Golden-проверка: {len(cases) - failures}/{len(cases)} совпадений")
+    return failures == 0
+
+
+def bench_render(iterations: int):
+    cases = build_cases()
+    service = LLMService()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for case in cases:
+            service._mock_explanation(case["code_snippet"], case["language"], case["complexity_level"], case["code_summary"])
+    elapsed = time.perf_counter() - start
+    calls = iterations * len(cases)
+    print(f"_mock_explanation: {calls / elapsed:,.0f} вызовов/с ({elapsed / calls * 1e6:.1f} мкс на вызов)")
+
+
+def bench_endpoint(requests_count: int):
+    from fastapi.testclient import TestClient
+    from backend.app import app
+
+    with TestClient(app) as client:
+        payloads = [
+            {"code_snippet": snippet, "language": language, "complexity_level": level}
+            for language, snippet in SNIPPETS
+            for level in COMPLEXITY_LEVELS
+        ]
+        start = time.perf_counter()
+        for i in range(requests_count):
+            response = client.post("/code/explain", json=payloads[i % len(payloads)])
+            response.raise_for_status()
+        elapsed = time.perf_counter() - start
+    print(f"POST /code/explain (мок): {requests_count / elapsed:,.1f} запросов/с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update-golden", action="store_true", help="перезаписать golden-образцы текущим выводом")
+    parser.add_argument("--check", action="store_true", help="только golden-проверка, без замеров")
+    parser.add_argument("--iterations", type=int, default=200, help="проходов по набору образцов при замере рендеринга")
+    parser.add_argument("--requests", type=int, default=500, help="число запросов к /code/explain")
+    args = parser.parse_args()
+
+    if args.update_golden:
+        update_golden()
+        return
+    if not check_golden():
+        sys.exit(1)
+    if args.check:
+        return
+    bench_render(args.iterations)
+    bench_endpoint(args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк индекса почти одинаковых фрагментов (MinHash/LSH).
+
+Заполняет историю --rows синтетическими фрагментами и измеряет:
+- время поиска (нормализация, сигнатура, запрос к SQLite) — p50/p99;
+- долю найденных вариантов с другими именами переменных, литералами, комментариями и пробелами;
+- долю найденных вариантов с одной изменённой строкой (сходство ниже, порог решает);
+- долю ложных совпадений для новых фрагментов, которых нет в индексе.
+
+Запуск из корня проекта:
+    python -m benchmarks.near_duplicates
+    python -m benchmarks.near_duplicates --rows 100000 --queries 500 --threshold 0.85
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_DIR", tempfile.mkdtemp(prefix="code_explainer_bench_"))
+
+from sqlalchemy import text
+
+from backend.database import SessionLocal, create_tables
+from backend.services.near_duplicates import NearDuplicateIndex
+from benchmarks.load_test import percentile
+
+# Шаблоны строк: {a}, {b}, {c} — имена переменных, {n} — число, {f} — вызываемая функция
+LINE_TEMPLATES = [
+    "{a} = {b} + {n}", "{a} = {f}({b}, {c})", "for {a} in range({n}):", "    {b}.append({a} * {n})",
+    "if {a} > {b}:", "    return {c}", "while {a} < {n}:", "    {a} += {b}", "{a} = [{n}, {b}, {c}]",
+    "{a} = {{'{b}': {n}}}", "print({f}({a}))", "{a}, {b} = {b}, {a}", "try:", "    {a} = {f}({b})",
+    "except ValueError:", "    {a} = None", "{a} = '{b}'.join({c})", "{a} = {b}[{n}:{c}]",
+    "with open({a}) as {b}:", "    {c} = {b}.read()", "{a} = sorted({b}, key=len)", "assert {a} != {n}",
+    "{a} = {b} if {c} else {n}", "yield {a}", "{a} = {f}(*{b})", "del {a}[{n}]", "{a}.update({b})",
+]
+FUNCTIONS = ["len", "sum", "max", "min", "abs", "sorted", "list", "dict", "str", "int", "compute", "parse", "load"]
+NAMES = [f"{prefix}{suffix}" for prefix in ("val", "item", "count", "data", "node", "total", "idx", "buf", "res")
+         for suffix in ("", "s", "_a", "_b", "_tmp", "1", "2")]
+
+
+def random_program(rng: random.Random, lines: int = 12):
+    """
+    Программа как список (шаблон, f); конкретные имена и числа подставляются в render
+    """
+    return [(rng.choice(LINE_TEMPLATES), rng.choice(FUNCTIONS)) for _ in range(lines)]
+
+
+def render(program, rng: random.Random, comments: bool = False) -> str:
+    function_name, *names = rng.sample(NAMES, 4)
+    rendered = ["def {}({}, {}):".format(function_name, names[0], names[1])]
+    for template, function in program:
+        line = "    " + template.format(a=names[0], b=names[1], c=names[2], n=rng.randint(0, 99), f=function)
+        if comments and rng.random() < 0.3:
+            line += "  # " + rng.choice(["note", "update value", "TODO"])
+        rendered.append(line.replace("    ", " " * rng.choice((4, 2)) if comments else "    "))
+    return "\n".join(rendered) + "\n"
+
+
+def seed(rows: int, rng: random.Random):
+    create_tables()
+    index = NearDuplicateIndex(min_tokens=1)
+    db = SessionLocal()
+    programs = []
+    try:
+        db.execute(text("DELETE FROM code_explanations"))
+        db.commit()
+        for i in range(rows):
+            program = random_program(rng)
+            programs.append(program)
+            code = render(program, rng)
+            explanation_id = db.execute(
+                text("INSERT INTO code_explanations (code_snippet, language, explanation, complexity_level, "
+                     "created_at, is_favorite) VALUES (:code, 'python', :text, 'intermediate', "
+                     "CURRENT_TIMESTAMP, 0)"),
+                {"code": code, "text": f"Explanation {i}"}
+            ).lastrowid
+            index.add(db, explanation_id, index.fingerprint(code, "python"), "python", "intermediate", commit=False)
+            if i % 5000 == 4999:
+                db.commit()
+        db.commit()
+    finally:
+        db.close()
+    return programs
+
+
+def run_queries(index: NearDuplicateIndex, snippets):
+    db = SessionLocal()
+    latencies, found = [], 0
+    try:
+        for code in snippets:
+            start = time.perf_counter()
+            fingerprint = index.fingerprint(code, "python")
+            match = index.find(db, fingerprint, "python", "intermediate") if fingerprint else None
+            latencies.append(time.perf_counter() - start)
+            found += match is not None
+    finally:
+        db.close()
+    latencies.sort()
+    return found / len(snippets), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="объяснений в индексе")
+    parser.add_argument("--queries", type=int, default=300, help="запросов каждого вида")
+    parser.add_argument("--threshold", type=float, default=0.9, help="порог сходства")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    programs = seed(args.rows, rng)
+    print(f"Индекс: {args.rows} объяснений за {time.perf_counter() - started:.1f} с")
+
+    index = NearDuplicateIndex(threshold=args.threshold)
+    sample = rng.sample(programs, min(args.queries, len(programs)))
+    renamed = [render(program, rng, comments=True) for program in sample]
+    edited = []
+    for program in sample:
+        program = list(program)
+        program[rng.randrange(len(program))] = (rng.choice(LINE_TEMPLATES), rng.choice(FUNCTIONS))
+        edited.append(render(program, rng))
+    fresh = [render(random_program(rng), rng) for _ in range(args.queries)]
+
+    print(f"Порог сходства {args.threshold}:")
+    for title, snippets in (("переименование, литералы, комментарии", renamed),
+                            ("изменена одна строка из 12", edited),
+                            ("новые фрагменты (ложные совпадения)", fresh)):
+        rate, latencies = run_queries(index, snippets)
+        print(f"  {title:<40} найдено {rate:6.1%}, поиск p50={percentile(latencies, 50) * 1000:.3f} мс, "
+              f"p99={percentile(latencies, 99) * 1000:.3f} мс")
+
+
+if __name__ == "__main__":
+    main()
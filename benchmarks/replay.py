@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Анализ и воспроизведение журнала трафика /code/explain (TRAFFIC_CAPTURE_FILE).
+
+Читает журналы всех воркеров (traffic.<pid>.jsonl) вместе с ротированными частями
+(traffic.<pid>.jsonl.N) и упорядочивает записи по времени, описывает нагрузку (частота, пиковая параллельность, рабочий набор кэша, время этапов)
+и повторяет запросы против тестового стенда с исходными интервалами,
+ускоренными в --speed раз.
+
+Запуск из корня проекта:
+    python -m benchmarks.replay --capture logs/traffic.jsonl --analyze
+    python -m benchmarks.replay --capture logs/traffic.jsonl --url http://staging:8000 --speed 1
+    python -m benchmarks.replay --capture logs/traffic.jsonl --url http://staging:8000 --speed 10
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from benchmarks.load_test import HttpTarget, percentile
+
+
+def capture_files(path: str) -> List[str]:
+    """
+    Файлы журнала: traffic.jsonl (журнал до разделения по процессам), traffic.<pid>.jsonl
+    каждого воркера и их ротированные части .1, .2, ... Записи затем сортируются по времени,
+    поэтому порядок файлов не важен.
+    """
+    root, ext = os.path.splitext(path)
+    pattern = re.compile(re.escape(root) + r"(\.\d+)?" + re.escape(ext) + r"(\.\d+)?")
+    candidates = glob.glob(f"{glob.escape(root)}*{glob.escape(ext)}*")
+    return sorted(p for p in candidates if pattern.fullmatch(p))
+
+
+def load_capture(path: str, limit: int = 0) -> List[Dict[str, Any]]:
+    entries = []
+    for file_path in capture_files(path):
+        with open(file_path, encoding="utf-8") as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    entries.sort(key=lambda e: e["timestamp"])
+    return entries[:limit] if limit else entries
+
+
+def peak_concurrency(intervals: List[tuple]) -> int:
+    """
+    Максимальное число одновременно обрабатываемых запросов по интервалам (начало, конец)
+    """
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    current = peak = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def analyze(entries: List[Dict[str, Any]]):
+    """
+    Профиль нагрузки и ориентиры для настройки параллельности LLM, кэша и SQLite
+    """
+    if not entries:
+        print("Журнал пуст")
+        return
+    span = max(entries[-1]["timestamp"] - entries[0]["timestamp"], 1e-9)
+    per_second = Counter(int(e["timestamp"]) for e in entries)
+    ok = [e for e in entries if e["status_code"] < 400]
+    llm_calls = [e for e in ok if e.get("cache") == "miss"]
+    llm_ms = sorted(e["stage_ms"].get("llm", 0.0) for e in llm_calls)
+    total_ms = sorted(e["duration_ms"] for e in entries)
+    cache_keys = {(e["snippet_hash"], e["language"], e["complexity_level"]) for e in ok}
+    hits = sum(1 for e in ok if e.get("cache") == "hit")
+
+    print(f"Запросов: {len(entries)} за {span:.1f} с (средняя частота {len(entries) / span:.2f}/с, пиковая {max(per_second.values())}/с)")
+    print(f"Коды ответов: {dict(Counter(e['status_code'] for e in entries))}")
+    print(f"Языки: {dict(Counter(e['language'] for e in entries).most_common(8))}")
+    print(f"Уровни: {dict(Counter(e['complexity_level'] for e in entries))}, all_levels: {sum(e['all_levels'] for e in entries)}")
+    print(f"Длительность запроса: p50={percentile(total_ms, 50):.1f} мс, p95={percentile(total_ms, 95):.1f} мс, p99={percentile(total_ms, 99):.1f} мс")
+    stages = sorted({stage for e in entries for stage in e["stage_ms"]})
+    for stage in stages:
+        values = sorted(e["stage_ms"][stage] for e in entries if stage in e["stage_ms"])
+        print(f"  этап {stage}: p50={percentile(values, 50):.2f} мс, p95={percentile(values, 95):.2f} мс")
+
+    # Ориентиры по наблюдаемой нагрузке
+    print("Ориентиры:")
+    llm_peak = peak_concurrency([(e["timestamp"], e["timestamp"] + e["stage_ms"].get("llm", 0.0) / 1000) for e in llm_calls])
+    print(f"  параллельных вызовов LLM в пике: {llm_peak} (p95 вызова {percentile(llm_ms, 95):.0f} мс)")
+    print(f"  параллельных запросов в пике: {peak_concurrency([(e['timestamp'], e['timestamp'] + e['duration_ms'] / 1000) for e in entries])}")
+    print(f"  уникальных ключей кэша (фрагмент, язык, уровень): {len(cache_keys)}; "
+          f"доля попаданий {hits / len(ok):.1%}" if ok else "  успешных запросов нет")
+    print(f"  записей в историю: {len(ok) / span:.2f}/с в среднем, {max(Counter(int(e['timestamp']) for e in ok).values(), default=0)}/с в пике")
+
+
+def replay(entries: List[Dict[str, Any]], url: str, speed: float, max_concurrency: int):
+    """
+    Повторяет запросы с исходными интервалами, делёнными на speed (0 — без пауз).
+    Нагрузка открытая: запрос отправляется по расписанию, не дожидаясь предыдущих.
+    """
+    latencies: List[float] = []
+    lags: List[float] = []
+    statuses = Counter()
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def send(entry, scheduled):
+        started = time.perf_counter()
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        try:
+            status = target.send(entry)
+        except Exception:
+            status = 599
+        elapsed = time.perf_counter() - started
+        with lock:
+            in_flight[0] -= 1
+            latencies.append(elapsed)
+            lags.append(max(0.0, started - scheduled))
+            statuses[status] += 1
+
+    with HttpTarget({}, url) as target, ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        origin = entries[0]["timestamp"]
+        start = time.perf_counter()
+        for entry in entries:
+            scheduled = start + ((entry["timestamp"] - origin) / speed if speed > 0 else 0.0)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, entry, scheduled)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    lags.sort()
+    print(f"Воспроизведено {len(entries)} запросов за {elapsed:.1f} с ({len(entries) / elapsed:.2f}/с, ускорение x{speed:g})")
+    print(f"Коды ответов: {dict(statuses)}")
+    print(f"Задержка: p50={percentile(latencies, 50) * 1000:.1f} мс, p95={percentile(latencies, 95) * 1000:.1f} мс, "
+          f"p99={percentile(latencies, 99) * 1000:.1f} мс, max={latencies[-1] * 1000:.1f} мс")
+    print(f"Отставание от расписания: p95={percentile(lags, 95) * 1000:.1f} мс; одновременно в работе до {in_flight[1]}")
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capture", default=os.getenv("TRAFFIC_CAPTURE_FILE"), help="журнал трафика (TRAFFIC_CAPTURE_FILE)")
+    parser.add_argument("--url", help="адрес тестового стенда для воспроизведения")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение относительно исходного темпа (0 — без пауз)")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="предел одновременно отправленных запросов")
+    parser.add_argument("--limit", type=int, default=0, help="воспроизвести только первые N запросов")
+    parser.add_argument("--analyze", action="store_true", help="только профиль нагрузки, без воспроизведения")
+    args = parser.parse_args()
+
+    if not args.capture:
+        parser.error("укажите --capture или TRAFFIC_CAPTURE_FILE")
+    entries = load_capture(args.capture, args.limit)
+    analyze(entries)
+    if args.analyze or not entries:
+        return
+    if not args.url:
+        parser.error("для воспроизведения укажите --url тестового стенда")
+    statuses = replay(entries, args.url, args.speed, args.max_concurrency)
+    if statuses.get(599):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
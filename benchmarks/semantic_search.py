@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска по смыслу (/history/semantic-search).
+
+1. Качество: история из --rows синтетических объяснений на разные темы (связные списки,
+   сортировка, HTTP-запросы, ...); запросы сформулированы другими словоформами.
+   Считается точность top-10 — доля результатов той же темы — и время полного поиска
+   с фильтрацией по базе.
+2. Масштаб: файл векторов на 10 тыс., 100 тыс. и 1 млн строк (--max-rows); время
+   инкрементального дописывания пачки, загрузки индекса и поиска top-10 (NumPy и
+   запасной путь на array из stdlib — до --fallback-max-rows).
+
+Запуск из корня проекта:
+    python -m benchmarks.semantic_search
+    python -m benchmarks.semantic_search --rows 20000 --max-rows 1000000 --dim 256
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_DIR", tempfile.mkdtemp(prefix="code_explainer_bench_"))
+
+from sqlalchemy import text
+
+from backend.database import SessionLocal, create_tables
+from backend.services import semantic_index
+from backend.services.semantic_index import SemanticIndex, embed_text
+from benchmarks.load_test import percentile
+
+# Тема: слова объяснения, идентификаторы кода, запрос другими словоформами
+TOPICS = [
+    ("linked list node deletion pointer", "delete_node head next prev", "deleting nodes from a linked list"),
+    ("sorting array pivot partition recursion", "quicksort pivot partition arr", "sort an array around a pivot"),
+    ("http request response json fetch", "fetchUser response json url", "fetching json over http"),
+    ("binary tree traversal inorder recursion", "inorder_traversal root left right", "traversing a binary tree"),
+    ("database query transaction commit rollback", "session commit rollback query", "committing database transactions"),
+    ("file reading lines encoding buffer", "read_file lines encoding open", "reading lines of a file"),
+    ("regular expression pattern matching groups", "re_match pattern groups compile", "matching regex patterns"),
+    ("thread lock concurrency mutex race", "worker_thread lock acquire release", "locking shared state between threads"),
+    ("hash map dictionary key lookup collision", "hash_table bucket key lookup", "looking up keys in a hash table"),
+    ("graph breadth first search queue visited", "bfs graph queue visited", "searching a graph breadth first"),
+    ("string formatting template interpolation", "format_string template values", "formatting strings with templates"),
+    ("matrix multiplication rows columns product", "matmul rows cols product", "multiplying two matrices"),
+    ("caching memoization decorator results", "memoize cache wrapper results", "memoizing function results"),
+    ("date time parsing timezone conversion", "parse_date timezone utc format", "converting dates between timezones"),
+    ("password hashing salt verification security", "hash_password salt verify bcrypt", "verifying salted password hashes"),
+    ("event listener click handler dom", "addEventListener click handler element", "handling click events in the dom"),
+]
+FILLER = ("this function takes the input and returns the value after processing each element in order "
+          "the variable stores intermediate state which is updated inside the loop the result is then "
+          "returned to the caller note that edge cases such as empty input are handled early").split()
+
+
+def synthetic_explanation(topic: int, rng: random.Random):
+    words, identifiers, _ = TOPICS[topic]
+    words = words.split()
+    body = [rng.choice(words) if rng.random() < 0.15 else rng.choice(FILLER) for _ in range(120)]
+    code = " ".join(f"{rng.choice(identifiers.split())}({rng.choice(FILLER)})" for _ in range(8))
+    return " ".join(body), code
+
+
+def seed(rows: int, rng: random.Random):
+    create_tables()
+    db = SessionLocal()
+    topics = {}
+    try:
+        db.execute(text("DELETE FROM code_explanations"))
+        for i in range(rows):
+            topic = i % len(TOPICS)
+            explanation, code = synthetic_explanation(topic, rng)
+            explanation_id = db.execute(
+                text("INSERT INTO code_explanations (code_snippet, language, explanation, complexity_level, "
+                     "created_at, is_favorite) VALUES (:code, 'python', :text, 'intermediate', "
+                     "CURRENT_TIMESTAMP, 0)"),
+                {"code": code, "text": explanation}
+            ).lastrowid
+            topics[explanation_id] = topic
+        db.commit()
+    finally:
+        db.close()
+    return topics
+
+
+def bench_quality(rows: int, dim: int, queries: int, rng: random.Random):
+    topics = seed(rows, rng)
+    index = SemanticIndex(os.path.join(os.environ["DATABASE_DIR"], f"bench_quality_{dim}"), dim=dim, batch_size=1000)
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        index.rebuild(db)
+        build = time.perf_counter() - start
+        latencies, precision = [], []
+        for _ in range(queries):
+            topic = rng.randrange(len(TOPICS))
+            start = time.perf_counter()
+            results = index.search(db, TOPICS[topic][2], limit=10)
+            latencies.append(time.perf_counter() - start)
+            precision.append(sum(topics[i] == topic for i, _ in results) / 10)
+    finally:
+        db.close()
+    latencies.sort()
+    print(f"Качество, dim={dim}: {rows} объяснений проиндексировано за {build:.1f} с "
+          f"({rows / build:.0f} в секунду), точность top-10 {sum(precision) / len(precision):.1%}, "
+          f"поиск p50={percentile(latencies, 50) * 1000:.2f} мс, p99={percentile(latencies, 99) * 1000:.2f} мс")
+
+
+def bench_scale(max_rows: int, fallback_max_rows: int, dim: int, queries: int, rng: random.Random):
+    # Векторы считаются один раз для набора уникальных текстов и повторяются до нужного числа строк
+    unique = []
+    for i in range(2000):
+        explanation, code = synthetic_explanation(i % len(TOPICS), rng)
+        unique.append(embed_text(explanation, dim, code))
+    query_vectors = [embed_text(topic[2], dim) for topic in TOPICS]
+    index = SemanticIndex(os.path.join(os.environ["DATABASE_DIR"], f"bench_scale_{dim}"), dim=dim)
+    index._reset_files()
+    numpy = semantic_index.np
+    rows = 0
+    print(f"Масштаб, dim={dim} (NumPy {'есть' if numpy is not None else 'не установлен'}):")
+    for size in (10_000, 100_000, 1_000_000):
+        if size > max_rows:
+            break
+        start = time.perf_counter()
+        while rows < size:
+            batch = min(10_000, size - rows)
+            index._append(list(range(rows + 1, rows + batch + 1)), [unique[(rows + i) % len(unique)] for i in range(batch)])
+            rows += batch
+        append = (time.perf_counter() - start) / (size // 10_000 or 1)
+        line = f"  {size:>9} строк ({os.path.getsize(index.vectors_path) / 2 ** 20:6.1f} МБ): дописывание 10 тыс. {append * 1000:6.1f} мс"
+        for title, module in (("NumPy", numpy), ("array", None)):
+            if title == "NumPy" and numpy is None or title == "array" and size > fallback_max_rows:
+                continue
+            semantic_index.np = module
+            index._stamp = None
+            start = time.perf_counter()
+            index.nearest(query_vectors[0], 10)
+            load = time.perf_counter() - start
+            latencies = []
+            for i in range(queries if module is not None else max(queries // 10, 3)):
+                start = time.perf_counter()
+                index.nearest(query_vectors[i % len(query_vectors)], 10)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            line += (f"; {title}: загрузка {load * 1000:.0f} мс, top-10 p50={percentile(latencies, 50) * 1000:.1f} мс, "
+                     f"p99={percentile(latencies, 99) * 1000:.1f} мс")
+        semantic_index.np = numpy
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="объяснений в истории для оценки качества")
+    parser.add_argument("--queries", type=int, default=100, help="запросов каждого замера")
+    parser.add_argument("--max-rows", type=int, default=1_000_000, help="наибольший размер индекса")
+    parser.add_argument("--fallback-max-rows", type=int, default=100_000, help="наибольший размер для пути без NumPy")
+    parser.add_argument("--dim", type=int, default=128, help="размерность векторов")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bench_quality(args.rows, args.dim, args.queries, rng)
+    bench_scale(args.max_rows, args.fallback_max_rows, args.dim, args.queries, rng)
+
+
+if __name__ == "__main__":
+    main()
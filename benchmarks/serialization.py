@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сериализации и сжатия страницы истории (100 объяснений).
+
+1. Процессорное время построения тела страницы из базы: прежний путь (строки ORM,
+   HistoryResponse с from_attributes, model_dump_json) и путь /history/explanations
+   (кортежи выбранных столбцов и теги страницы одним запросом сразу в JSON); затем только
+   сериализация уже прочитанной страницы: проверка HistoryResponse, jsonable_encoder +
+   json.dumps (стандартный путь FastAPI), ORJSONResponse, model_dump_json и dumps словарей.
+2. Размер ответа /history/explanations?per_page=100 на проводе без сжатия («до»),
+   с gzip и brotli («после») и задержка запроса; время сжатия при разных уровнях.
+
+Запуск из корня проекта:
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --items 100 --iterations 300
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import zlib
+
+# Изолированная база; кэш ответов истории выключен, чтобы каждый запрос сериализовал страницу
+os.environ.setdefault("DATABASE_DIR", tempfile.mkdtemp(prefix="code_explainer_bench_"))
+os.environ["USE_MOCK_LLM"] = "true"
+os.environ["HISTORY_RESPONSE_CACHE_SIZE"] = "0"
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from backend.api.history import query_explanations
+from backend.app import app
+from backend.database import CodeExplanation, SessionLocal, create_tables
+from backend.middleware import brotli
+from backend.models import HistoryResponse
+from backend.serialization import dumps, orjson
+from backend.services.code_analyzer import CodeAnalyzer
+from backend.services.explanation_cache import COMPLEXITY_LEVELS
+from backend.services.llm_service import LLMService
+from backend.services.tag_index import explanation_tags, set_tags
+from benchmarks.mock_render import SNIPPETS
+
+
+def seed(items: int):
+    """
+    Заполняет историю мок-объяснениями фрагментов из golden-набора
+    """
+    create_tables()
+    llm = LLMService()
+    db = SessionLocal()
+    try:
+        db.query(CodeExplanation).delete()
+        for i in range(items):
+            language, snippet = SNIPPETS[i % len(SNIPPETS)]
+            level = COMPLEXITY_LEVELS[i % len(COMPLEXITY_LEVELS)]
+            summary = CodeAnalyzer.extract_code_summary(snippet, language)
+            result = llm.explain_code(snippet, language, level, summary)
+            explanation = CodeExplanation(code_snippet=snippet, language=language,
+                                          explanation=result["explanation"], complexity_level=level)
+            db.add(explanation)
+            db.flush()
+            set_tags(db, explanation.id, CodeAnalyzer().suggest_tags(summary) + [language])
+        db.commit()
+    finally:
+        db.close()
+
+
+def _median_us(func, iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+
+def orm_page(db, items: int) -> bytes:
+    """
+    Прежний путь страницы истории: объекты ORM, проверка HistoryResponse (from_attributes)
+    и model_dump_json
+    """
+    query = db.query(CodeExplanation)
+    total_count = query.count()
+    rows = query.order_by(CodeExplanation.created_at.desc(), CodeExplanation.id.desc()).limit(items).all()
+    tags = explanation_tags(db, [row.id for row in rows])
+    for row in rows:
+        row.tags = tags.get(row.id, [])
+    return HistoryResponse(
+        success=True, explanations=rows, total_count=total_count, page=1, per_page=items,
+        total_pages=(total_count + items - 1) // items
+    ).model_dump_json().encode("utf-8")
+
+
+def bench_serialization(items: int, iterations: int) -> bytes:
+    db = SessionLocal()
+    try:
+        before = _median_us(lambda: orm_page(db, items), iterations)
+        after = _median_us(lambda: query_explanations([db], None, None, None, None, 1, items), iterations)
+        body = query_explanations([db], None, None, None, None, 1, items)
+        assert body == orm_page(db, items), "тела страниц различаются"
+        page = json.loads(body)
+        rows = db.query(CodeExplanation).order_by(CodeExplanation.created_at.desc()).limit(items).all()
+        tags = explanation_tags(db, [row.id for row in rows])
+        for row in rows:
+            row.tags = tags.get(row.id, [])
+        orm = dict(page, explanations=rows)
+        model = HistoryResponse(**orm)
+    finally:
+        db.close()
+
+    print(f"Страница из {items} объяснений ({len(body) / 1024:.1f} КБ JSON), медиана {iterations} повторов:")
+    print(f"  {'до: строки ORM + HistoryResponse + model_dump_json':<52} {before:9.0f} мкс")
+    print(f"  {'после: кортежи столбцов + dumps':<52} {after:9.0f} мкс (x{before / after:.1f})")
+    cases = [
+        ("проверка HistoryResponse из строк ORM", lambda: HistoryResponse(**orm)),
+        ("jsonable_encoder + json.dumps", lambda: json.dumps(
+            jsonable_encoder(model), ensure_ascii=False, separators=(",", ":")).encode("utf-8")),
+    ]
+    if orjson is not None:
+        cases.append(("ORJSONResponse: jsonable_encoder + orjson", lambda: orjson.dumps(jsonable_encoder(model))))
+    cases.append(("model_dump_json", lambda: model.model_dump_json().encode("utf-8")))
+    cases.append(("dumps словарей страницы", lambda: dumps(page)))
+    print("Только сериализация прочитанной страницы:")
+    for title, func in cases:
+        print(f"  {title:<52} {_median_us(func, iterations):9.0f} мкс")
+    return body
+
+
+def bench_compression(body: bytes, iterations: int):
+    print("Сжатие тела страницы:")
+    for level in (1, 6, 9):
+        def gzip_body():
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            return compressor.compress(body) + compressor.flush()
+        size = len(gzip_body())
+        print(f"  gzip {level}: {size / 1024:7.1f} КБ (x{len(body) / size:4.1f}), {_median_us(gzip_body, iterations):7.0f} мкс")
+    if brotli is None:
+        print("  brotli: пакет не установлен")
+        return
+    for quality in (1, 4, 6, 11):
+        size = len(brotli.compress(body, quality=quality))
+        us = _median_us(lambda: brotli.compress(body, quality=quality), max(iterations // 10, 5))
+        print(f"  br {quality:>2}: {size / 1024:7.1f} КБ (x{len(body) / size:4.1f}), {us:7.0f} мкс")
+
+
+def bench_wire(items: int, iterations: int):
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    print(f"GET /history/explanations?per_page={items} ({iterations} запросов в процессе):")
+    with TestClient(app) as client:
+        for encoding in encodings:
+            latencies = []
+            size = 0
+            for _ in range(iterations):
+                start = time.perf_counter()
+                response = client.get(f"/history/explanations?per_page={items}", headers={"Accept-Encoding": encoding})
+                latencies.append(time.perf_counter() - start)
+                size = len(response.content) if encoding == "identity" else int(response.headers["content-length"])
+            title = "до (без сжатия)" if encoding == "identity" else f"после ({encoding})"
+            print(f"  {title:<18} {size / 1024:7.1f} КБ на проводе, p50={statistics.median(latencies) * 1000:6.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100, help="объяснений на странице")
+    parser.add_argument("--iterations", type=int, default=200, help="повторов каждого замера")
+    args = parser.parse_args()
+
+    seed(args.items)
+    body = bench_serialization(args.items, args.iterations)
+    bench_compression(body, args.iterations)
+    bench_wire(args.items, max(args.iterations // 4, 10))
+
+
+if __name__ == "__main__":
+    main()
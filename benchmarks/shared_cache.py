@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк общего SQLite-кэша воркеров в сравнении с LRU в памяти процесса.
+
+1. Стоимость операций: чтение (попадание/промах) и запись для каждого уровня.
+2. Несколько процессов-воркеров обслуживают один поток запросов с распределением Ципфа;
+   промах стоит --miss-cost-ms (имитация вызова LLM). Сравниваются число промахов
+   и общее время при кэше только в памяти процесса и при двухуровневом кэше.
+
+Запуск из корня проекта:
+    python -m benchmarks.shared_cache
+    python -m benchmarks.shared_cache --workers 8 --keys 2000 --requests 3000 --miss-cost-ms 20
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from backend.services.shared_cache import LocalLRUCache, SharedSQLiteCache, TieredCache
+
+VALUE = {"explanation": "## Обзор\n" + "Подробное объяснение фрагмента кода. " * 60}
+
+
+def _per_op_us(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_operations(path: str, iterations: int):
+    local = LocalLRUCache(iterations * 2)
+    shared = SharedSQLiteCache(path, "bench-ops", max_entries=iterations * 4)
+    tiered = TieredCache(LocalLRUCache(iterations * 2), SharedSQLiteCache(path, "bench-ops"))
+    cold = TieredCache(LocalLRUCache(iterations * 2), SharedSQLiteCache(path, "bench-ops"))
+
+    rows = [
+        ("LRU процесса: запись", _per_op_us(lambda i: local.set(f"k{i}", VALUE), iterations)),
+        ("LRU процесса: попадание", _per_op_us(lambda i: local.get(f"k{i}"), iterations)),
+        ("SQLite: запись", _per_op_us(lambda i: shared.set(f"k{i}", VALUE), iterations)),
+        ("SQLite: попадание", _per_op_us(lambda i: shared.get(f"k{i}"), iterations)),
+        ("SQLite: промах", _per_op_us(lambda i: shared.get(f"missing{i}"), iterations)),
+        ("Двухуровневый: запись", _per_op_us(lambda i: tiered.set(f"t{i}", VALUE), iterations)),
+        ("Двухуровневый: попадание в память", _per_op_us(lambda i: tiered.get(f"t{i}"), iterations)),
+        ("Двухуровневый: попадание в SQLite", _per_op_us(lambda i: cold.get(f"t{i}"), iterations)),
+    ]
+    print(f"Стоимость операций ({iterations} итераций, значение {len(str(VALUE))} символов):")
+    for name, us in rows:
+        print(f"  {name:<36} {us:8.1f} мкс")
+    for cache in (shared, tiered, cold):
+        cache.close()
+
+
+def _zipf_keys(count: int, keys: int, seed: int):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return [f"snippet-{k}" for k in rng.choices(range(keys), weights=weights, k=count)]
+
+
+def _worker(args):
+    worker_id, mode, path, local_size, keys, requests, miss_cost = args
+    shared = SharedSQLiteCache(path, "bench-workers", max_entries=keys * 2) if mode == "shared" else None
+    cache = TieredCache(LocalLRUCache(local_size), shared)
+    misses = 0
+    start = time.perf_counter()
+    for key in _zipf_keys(requests, keys, seed=worker_id):
+        if cache.get(key) is None:
+            misses += 1
+            time.sleep(miss_cost)
+            cache.set(key, VALUE)
+    elapsed = time.perf_counter() - start
+    cache.close()
+    return misses, elapsed
+
+
+def bench_workers(path: str, workers: int, local_size: int, keys: int, requests: int, miss_cost_ms: float):
+    print(f"\n{workers} воркеров x {requests} запросов, {keys} ключей (Ципф), LRU процесса {local_size}, "
+          f"промах {miss_cost_ms:g} мс:")
+    for mode, title in (("local", "только LRU процесса"), ("shared", "LRU процесса + SQLite")):
+        jobs = [(i, mode, path, local_size, keys, requests, miss_cost_ms / 1000) for i in range(workers)]
+        started = time.perf_counter()
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_worker, jobs)
+        wall = time.perf_counter() - started
+        misses = sum(m for m, _ in results)
+        total = workers * requests
+        print(f"  {title:<24} промахов {misses:6d} ({misses / total:6.1%}), попаданий {1 - misses / total:6.1%}, "
+              f"время {wall:6.2f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="итераций при замере операций")
+    parser.add_argument("--workers", type=int, default=4, help="число процессов-воркеров")
+    parser.add_argument("--local-size", type=int, default=256, help="размер LRU в памяти каждого воркера")
+    parser.add_argument("--keys", type=int, default=1000, help="число различных фрагментов")
+    parser.add_argument("--requests", type=int, default=1500, help="запросов на воркер")
+    parser.add_argument("--miss-cost-ms", type=float, default=5.0, help="стоимость промаха (вызов LLM), мс")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="code_explainer_cache_bench_") as directory:
+        path = os.path.join(directory, "shared_cache.db")
+        bench_operations(path, args.iterations)
+        bench_workers(path, args.workers, args.local_size, args.keys, args.requests, args.miss_cost_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Холодный старт приложения.
+
+1. Время импорта backend.app по данным python -X importtime: итог,
+   самые тяжёлые пакеты верхнего уровня и модули по собственному времени.
+2. Время от запуска uvicorn до первого успешного /health/ready (медиана по --runs запускам).
+3. Стоимость вызова справочников /code/languages и /code/complexity-levels
+   (полный ответ и 304 по If-None-Match).
+
+Запуск из корня проекта:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 5 --top 15
+    python -m benchmarks.startup --skip-server
+"""
+
+import argparse
+import http.client
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from benchmarks.load_test import ROOT_DIR, _free_port
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+CATALOG_PATHS = ["/code/languages", "/code/complexity-levels"]
+
+
+def import_times(module: str, env: Dict[str, str]) -> List[Tuple[str, int, int]]:
+    """
+    Строки -X importtime: (модуль, собственное время мкс, накопленное мкс)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR, env={**os.environ, **env}, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report_imports(module: str, env: Dict[str, str], top: int):
+    rows = import_times(module, env)
+    total = sum(self_us for _, self_us, _ in rows)
+    packages: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    print(f"Импорт {module}: {total / 1000:.1f} мс, модулей {len(rows)}")
+    print("  Пакеты верхнего уровня (сумма собственного времени модулей):")
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"    {name:<32} {self_us / 1000:8.1f} мс ({self_us / total:5.1%})")
+    print("  Модули по собственному времени:")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: -row[1])[:top]:
+        print(f"    {name:<48} {self_us / 1000:8.1f} мс (с зависимостями {cumulative_us / 1000:.1f} мс)")
+
+
+def _spawn_server(env: Dict[str, str], port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT_DIR, env={**os.environ, **env}
+    )
+
+
+def _stop_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _wait_ready(process: subprocess.Popen, port: int, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn завершился при запуске")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health/ready")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"Сервер не стал готов за {timeout} с")
+
+
+def time_to_ready(env: Dict[str, str]) -> float:
+    """
+    Секунды от запуска процесса uvicorn до первого ответа 200 на /health/ready
+    """
+    port = _free_port()
+    started = time.perf_counter()
+    process = _spawn_server(env, port)
+    try:
+        _wait_ready(process, port)
+        return time.perf_counter() - started
+    finally:
+        _stop_server(process)
+
+
+def bench_catalogs(env: Dict[str, str], iterations: int):
+    port = _free_port()
+    process = _spawn_server(env, port)
+    try:
+        _wait_ready(process, port)
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        print(f"Справочники ({iterations} запросов на одном соединении):")
+        for path in CATALOG_PATHS:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            size = len(response.read())
+            etag = response.getheader("ETag")
+            for status, headers in ((200, {}), (304, {"If-None-Match": etag})):
+                latencies = []
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    connection.request("GET", path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    latencies.append(time.perf_counter() - start)
+                    if response.status != status:
+                        raise RuntimeError(f"{path}: ожидался {status}, получен {response.status}")
+                print(f"  {path:<26} {status}: p50={statistics.median(latencies) * 1e6:7.0f} мкс "
+                      f"({size if status == 200 else 0} байт тела)")
+    finally:
+        _stop_server(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="backend.app", help="модуль для замера импорта")
+    parser.add_argument("--top", type=int, default=10, help="строк в отчёте об импорте")
+    parser.add_argument("--runs", type=int, default=3, help="запусков для замера готовности")
+    parser.add_argument("--iterations", type=int, default=500, help="запросов к каждому справочнику")
+    parser.add_argument("--skip-server", action="store_true", help="только отчёт об импорте")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="code_explainer_startup_") as directory:
+        env = {"DATABASE_DIR": directory, "USE_MOCK_LLM": "true"}
+        report_imports(args.module, env, args.top)
+        if args.skip_server:
+            return
+        runs = [time_to_ready(env) for _ in range(args.runs)]
+        print(f"Запуск до /health/ready: медиана {statistics.median(runs) * 1000:.0f} мс "
+              f"(мин {min(runs) * 1000:.0f}, макс {max(runs) * 1000:.0f}; {args.runs} запусков)")
+        bench_catalogs(env, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк тегов истории (/history/explanations?tag=...&facets=true, /history/tags).
+
+История из --rows синтетических объяснений, у каждого 1–4 тега из --tags возможных
+(частоты по закону Ципфа, как у реальных тегов). Сравниваются:
+- прежний поиск подстроки в строке тегов через запятую (LIKE '%тег%', полный просмотр
+  и ложные совпадения вроде «sort» в «sorting»);
+- фильтр по тегу через таблицу связей;
+- страница истории с фильтром по тегу и счётчиками тегов (facets);
+- счётчики тегов всей истории (/history/tags) и с фильтром по языку.
+
+Сервер для бенчмарка не нужен. Запуск из корня проекта:
+    python -m benchmarks.tags
+    python -m benchmarks.tags --rows 500000 --tags 300
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_DIR", tempfile.mkdtemp(prefix="code_explainer_bench_"))
+
+from sqlalchemy import text
+
+from backend.api.history import query_explanations
+from backend.database import SessionLocal, create_tables
+from backend.services.tag_index import set_tags, tag_facets
+from benchmarks.load_test import percentile
+
+LANGUAGES = ["python", "javascript", "java", "cpp", "go"]
+
+
+def seed(rows: int, tag_count: int, rng: random.Random):
+    create_tables()
+    names = [f"tag-{i}" for i in range(tag_count)]
+    weights = [1 / (i + 1) for i in range(tag_count)]
+    db = SessionLocal()
+    try:
+        db.execute(text("DELETE FROM code_explanations"))
+        # Прежнее представление тегов — для сравнения с поиском подстроки
+        db.execute(text("DROP TABLE IF EXISTS legacy_tags"))
+        db.execute(text("CREATE TABLE legacy_tags (id INTEGER PRIMARY KEY, tags VARCHAR(500))"))
+        start = time.perf_counter()
+        for i in range(rows):
+            explanation_id = db.execute(
+                text("INSERT INTO code_explanations (code_snippet, language, explanation, complexity_level, "
+                     "created_at, is_favorite) VALUES (:code, :language, :text, 'intermediate', "
+                     "CURRENT_TIMESTAMP, 0)"),
+                {"code": f"def f_{i}(): pass", "language": LANGUAGES[i % len(LANGUAGES)], "text": f"Explanation {i}"}
+            ).lastrowid
+            tags = set_tags(db, explanation_id, rng.choices(names, weights, k=rng.randint(1, 4)))
+            db.execute(text("INSERT INTO legacy_tags (id, tags) VALUES (:id, :tags)"),
+                       {"id": explanation_id, "tags": ",".join(tags)})
+        db.commit()
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+    print(f"История: {rows} объяснений, {tag_count} тегов; заполнена за {elapsed:.1f} с "
+          f"({rows / elapsed:.0f} объяснений с тегами в секунду)")
+    return names
+
+
+def measure(label: str, queries: int, call):
+    latencies = []
+    for i in range(queries):
+        start = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"  {label:<44} p50={percentile(latencies, 50) * 1000:8.2f} мс, p99={percentile(latencies, 99) * 1000:8.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="объяснений в истории")
+    parser.add_argument("--tags", type=int, default=200, help="различных тегов")
+    parser.add_argument("--queries", type=int, default=50, help="запросов каждого замера")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = seed(args.rows, args.tags, rng)
+    # Запросы к частым, средним и редким тегам
+    picked = [names[rng.randrange(min(len(names), 10 ** rng.randint(0, 3)))] for _ in range(args.queries)]
+
+    db = SessionLocal()
+    try:
+        measure("подстрока LIKE (прежний способ), число", args.queries, lambda i: db.execute(
+            text("SELECT count(*) FROM legacy_tags WHERE tags LIKE :pattern"), {"pattern": f"%{picked[i]}%"}
+        ).scalar())
+        measure("тег через связи, число", args.queries, lambda i: db.execute(
+            text("SELECT count(*) FROM explanation_tags WHERE tag_id = (SELECT id FROM tags WHERE name = :name)"),
+            {"name": picked[i]}
+        ).scalar())
+        measure("страница с фильтром по тегу", args.queries, lambda i: query_explanations(
+            [db], None, None, None, None, 1, 10, [picked[i]], False
+        ))
+        measure("страница с фильтром по тегу и счётчиками", args.queries, lambda i: query_explanations(
+            [db], None, None, None, None, 1, 10, [picked[i]], True
+        ))
+        measure("счётчики всей истории (/history/tags)", args.queries, lambda i: tag_facets(db, limit=100))
+        measure("страница с фильтром по языку и счётчиками", args.queries, lambda i: query_explanations(
+            [db], LANGUAGES[i % len(LANGUAGES)], None, None, None, 1, 10, None, True
+        ))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
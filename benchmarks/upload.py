@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конвейера загрузки проекта (POST /code/upload).
+
+Собирается zip-архив из --files синтетических файлов Python и JavaScript по --functions
+функций, который проходит через UploadAnalyzer с мок-LLM при разном числе процессов
+анализа (--workers). Выводятся время до первого события, общее время и число файлов
+в секунду. Мок-объяснения не кэшируются между прогонами: кэш создаётся заново.
+
+Сервер для бенчмарка не нужен. Запуск из корня проекта:
+    python -m benchmarks.upload
+    python -m benchmarks.upload --files 400 --functions 30 --workers 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+import zipfile
+
+os.environ.setdefault("USE_MOCK_LLM", "true")
+os.environ.setdefault("SHARED_CACHE_ENABLED", "false")
+
+from backend.services.explanation_cache import ExplanationCache
+from backend.services.llm_service import LLMService
+from backend.services.upload_analysis import UploadAnalyzer
+from benchmarks.live_analysis import javascript_function, python_function
+
+
+def build_archive(files: int, functions: int, rng: random.Random) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for i in range(files):
+            if i % 2:
+                code = "\n\n".join(javascript_function(i * functions + j, rng) for j in range(functions))
+                archive.writestr(f"project/web/module_{i}.js", code + "\n")
+            else:
+                code = "\n\n".join(python_function(i * functions + j, rng) for j in range(functions))
+                archive.writestr(f"project/core/module_{i}.py", code + "\n")
+    return buffer.getvalue()
+
+
+async def run_once(data: bytes, workers: int, root: str):
+    uploads = UploadAnalyzer(root, analysis_workers=workers)
+    # Процессы пула запускаются по мере надобности — все запускаются до замера
+    list(uploads.pool.map(time.sleep, [0.1] * workers))
+    directory = tempfile.mkdtemp(dir=root)
+    path = os.path.join(directory, "project.zip")
+    with open(path, "wb") as f:
+        f.write(data)
+    start = time.perf_counter()
+    first_event = None
+    done = None
+    async for event in uploads.run(path, "project.zip", "intermediate", LLMService(), ExplanationCache(max_size=0)):
+        if first_event is None:
+            first_event = time.perf_counter() - start
+        if event["type"] in ("done", "error"):
+            done = event
+    elapsed = time.perf_counter() - start
+    uploads.close()
+    if done["type"] == "error":
+        raise RuntimeError(done["detail"])
+    return first_event, elapsed, done["files"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200, help="Число файлов в архиве")
+    parser.add_argument("--functions", type=int, default=20, help="Число функций в файле")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1],
+                        help="Число процессов анализа")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    data = build_archive(args.files, args.functions, random.Random(args.seed))
+    print(f"Архив: {args.files} файлов по {args.functions} функций, {len(data) // 1024} КБ")
+    root = tempfile.mkdtemp(prefix="code_explainer_upload_bench_")
+    try:
+        for workers in args.workers:
+            first_event, elapsed, files = asyncio.run(run_once(data, workers, root))
+            print(f"  процессов {workers:>2}: первое событие {first_event * 1000:7.1f} мс, "
+                  f"всего {elapsed:6.2f} с, {files / elapsed:7.1f} файлов/с")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
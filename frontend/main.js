@@ -3,8 +3,26 @@ let editor = null;
 let currentPage = 1;
 let perPage = 12;
 let currentFilters = {};
+let currentTag = null;
 let currentExplanationId = null;
 
+// Объяснения последнего фрагмента по уровням сложности (для мгновенного переключения)
+let levelCache = { key: null, data: null, explanations: {} };
+
+// SHA-256 последнего объяснённого фрагмента: после правки бэкенд объясняет заново
+// только изменённые функции и классы
+let lastExplainedHash = null;
+
+// Живой анализ: правки редактора отправляются по WebSocket пачками после паузы в наборе,
+// сервер отвечает языком, предупреждениями и кратким описанием
+let liveSocket = null;
+let liveVersion = 0;
+let livePendingChanges = [];
+let liveTimer = null;
+let livePendingExplain = null;
+const LIVE_DEBOUNCE_MS = 150;
+const LIVE_RECONNECT_MS = 3000;
+
 // Базовый URL API
 const API_BASE_URL = 'http://localhost:8000';
 
@@ -46,6 +64,9 @@ async function initializeMainPage() {
         // Загружаем пример кода
         loadExampleCode();
         
+        // Подключаем живой анализ (при недоступности работает обычный режим по кнопке)
+        connectLiveAnalysis();
+        
     } catch (error) {
         console.error('Error initializing main page:', error);
     }
@@ -95,12 +116,25 @@ function setupMainPageEventListeners() {
     // Кнопка «Explain Code»
     document.getElementById('explainButton').addEventListener('click', explainCode);
     
+    // Объяснение загруженного файла или архива проекта
+    document.getElementById('uploadButton').addEventListener('click', uploadProject);
+    
     // Кнопка очистки кода
     document.getElementById('clearCode').addEventListener('click', clearCode);
     
     // Кнопка загрузки примера
     document.getElementById('loadExample').addEventListener('click', loadExampleCode);
     
+    // Переключение уровня сложности берёт готовое объяснение из кэша
+    document.getElementById('complexitySelect').addEventListener('change', switchComplexityLevel);
+    
+    // Правки и смена языка уходят в соединение живого анализа
+    editor.onDidChangeModelContent(queueLiveChanges);
+    document.getElementById('languageSelect').addEventListener('change', () => {
+        flushLiveChanges();
+        sendLive({ type: 'language', language: getLiveLanguage() });
+    });
+    
     // Кнопка копирования объяснения
     document.getElementById('copyExplanation').addEventListener('click', copyExplanation);
     
@@ -122,21 +156,16 @@ async function explainCode() {
     showLoadingState();
     
     try {
-        const response = await fetch(`${API_BASE_URL}/code/explain`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                code_snippet: code,
-                language: language === 'auto' ? null : language,
-                complexity_level: complexity
-            })
-        });
-        
-        const data = await response.json();
+        // По открытому соединению живого анализа код не отправляется повторно
+        const data = await explainOverLiveSocket(complexity) || await explainOverHttp(code, language, complexity);
         
         if (data.success) {
+            levelCache = {
+                key: getLevelCacheKey(code, language),
+                data: data,
+                explanations: data.explanations || { [data.complexity_level]: data.explanation }
+            };
+            lastExplainedHash = await sha256Hex(code);
             displayExplanation(data);
             showNotification('Explanation generated successfully!', 'success');
         } else {
@@ -150,6 +179,261 @@ async function explainCode() {
     }
 }
 
+async function sha256Hex(text) {
+    // crypto.subtle доступен только в защищённом контексте (https или localhost)
+    if (!window.crypto || !window.crypto.subtle) {
+        return null;
+    }
+    const digest = await window.crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+    return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+async function explainOverHttp(code, language, complexity) {
+    const response = await fetch(`${API_BASE_URL}/code/explain`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            code_snippet: code,
+            language: language === 'auto' ? null : language,
+            complexity_level: complexity,
+            all_levels: true,
+            previous_snippet_hash: lastExplainedHash
+        })
+    });
+    return response.json();
+}
+
+function explainOverLiveSocket(complexity) {
+    flushLiveChanges();
+    if (livePendingExplain) {
+        return Promise.resolve(null);
+    }
+    return new Promise((resolve) => {
+        livePendingExplain = resolve;
+        const sent = sendLive({
+            type: 'explain',
+            complexity_level: complexity,
+            all_levels: true,
+            previous_snippet_hash: lastExplainedHash
+        });
+        if (!sent) {
+            livePendingExplain = null;
+            resolve(null);
+        }
+    });
+}
+
+function connectLiveAnalysis() {
+    if (!window.WebSocket) {
+        return;
+    }
+    const socket = new WebSocket(`${API_BASE_URL.replace(/^http/, 'ws')}/code/live`);
+    socket.onopen = () => {
+        liveSocket = socket;
+        sendLiveReset();
+    };
+    socket.onmessage = (event) => handleLiveMessage(JSON.parse(event.data));
+    socket.onclose = () => {
+        liveSocket = null;
+        // Объяснение, ожидавшее ответа по сокету, запрашивается по HTTP
+        if (livePendingExplain) {
+            livePendingExplain(null);
+            livePendingExplain = null;
+        }
+        setTimeout(connectLiveAnalysis, LIVE_RECONNECT_MS);
+    };
+}
+
+function getLiveLanguage() {
+    const language = document.getElementById('languageSelect').value;
+    return language === 'auto' ? null : language;
+}
+
+function sendLive(message) {
+    if (!liveSocket || liveSocket.readyState !== WebSocket.OPEN) {
+        return false;
+    }
+    liveSocket.send(JSON.stringify(message));
+    return true;
+}
+
+function sendLiveReset() {
+    clearTimeout(liveTimer);
+    livePendingChanges = [];
+    liveVersion = 0;
+    sendLive({ type: 'reset', code: editor.getValue(), language: getLiveLanguage(), version: 0 });
+}
+
+function queueLiveChanges(event) {
+    // Правки одного события заданы относительно текста до события, поэтому применяются с конца
+    const changes = [...event.changes].sort((a, b) => b.rangeOffset - a.rangeOffset);
+    changes.forEach(change => livePendingChanges.push({
+        offset: change.rangeOffset,
+        length: change.rangeLength,
+        text: change.text
+    }));
+    clearTimeout(liveTimer);
+    liveTimer = setTimeout(flushLiveChanges, LIVE_DEBOUNCE_MS);
+}
+
+function flushLiveChanges() {
+    clearTimeout(liveTimer);
+    if (!livePendingChanges.length) {
+        return;
+    }
+    // Без соединения правки не копятся: после переподключения текст отправляется целиком
+    if (sendLive({ type: 'edit', version: liveVersion + 1, changes: livePendingChanges })) {
+        liveVersion += 1;
+    }
+    livePendingChanges = [];
+}
+
+function handleLiveMessage(message) {
+    if (message.type === 'analysis') {
+        displayLiveAnalysis(message);
+    } else if (message.type === 'explanation' && livePendingExplain) {
+        livePendingExplain(message.result);
+        livePendingExplain = null;
+    } else if (message.type === 'error') {
+        if (message.resync) {
+            sendLiveReset();
+        } else if (livePendingExplain) {
+            livePendingExplain({ success: false, detail: message.detail });
+            livePendingExplain = null;
+        }
+    }
+}
+
+function displayLiveAnalysis(analysis) {
+    const container = document.getElementById('liveAnalysis');
+    const validation = analysis.validation || {};
+    const messages = [...(validation.errors || []), ...(validation.warnings || [])];
+    const functions = analysis.summary ? analysis.summary.key_functions : [];
+    container.innerHTML = `
+        <span class="mr-4"><i class="fas fa-language mr-1"></i>${escapeHtml(analysis.language)}</span>
+        ${functions.length ? `<span class="mr-4"><i class="fas fa-cubes mr-1"></i>${functions.map(escapeHtml).join(', ')}</span>` : ''}
+        ${messages.map(text => `<div class="text-yellow-700"><i class="fas fa-exclamation-triangle mr-1"></i>${escapeHtml(text)}</div>`).join('')}
+    `;
+    container.classList.remove('hidden');
+}
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text == null ? '' : String(text);
+    return div.innerHTML;
+}
+
+async function uploadProject() {
+    const input = document.getElementById('uploadInput');
+    if (!input.files.length) {
+        alert('Please choose a file or an archive to upload');
+        return;
+    }
+    const progress = document.getElementById('uploadProgress');
+    const form = new FormData();
+    form.append('file', input.files[0]);
+    form.append('complexity_level', document.getElementById('complexitySelect').value);
+    
+    const files = new Map();
+    let skipped = 0;
+    const showProgress = () => {
+        const explained = [...files.values()].filter(file => file.explanation).length;
+        progress.textContent = `Analyzed: ${files.size}, explained: ${explained}, skipped: ${skipped}`;
+    };
+    progress.classList.remove('hidden');
+    progress.textContent = 'Uploading...';
+    showLoadingState();
+    
+    try {
+        const response = await fetch(`${API_BASE_URL}/code/upload`, { method: 'POST', body: form });
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || `HTTP ${response.status}`);
+        }
+        // Поток Server-Sent Events: события разделены пустой строкой
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let done = null;
+        while (!done) {
+            const chunk = await reader.read();
+            if (chunk.done) {
+                break;
+            }
+            buffer += decoder.decode(chunk.value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                const dataLine = block.split('\n').find(line => line.startsWith('data: '));
+                if (!dataLine) {
+                    continue;
+                }
+                const event = JSON.parse(dataLine.slice(6));
+                if (event.type === 'file') {
+                    files.set(event.path, { ...(files.get(event.path) || {}), ...event });
+                } else if (event.type === 'skipped') {
+                    skipped += 1;
+                } else if (event.type === 'done' || event.type === 'error') {
+                    done = event;
+                }
+                showProgress();
+            }
+        }
+        if (!done || done.type === 'error') {
+            throw new Error(done ? done.detail : 'Upload stream ended unexpectedly');
+        }
+        displayUploadResult(done, [...files.values()]);
+    } catch (error) {
+        console.error('Error uploading code:', error);
+        hideLoadingState();
+        alert(`Failed to explain the upload: ${error.message}`);
+    }
+}
+
+function displayUploadResult(summary, files) {
+    hideLoadingState();
+    const sections = files
+        .sort((a, b) => a.path.localeCompare(b.path))
+        .map(file => `
+            <details class="mb-2">
+                <summary class="cursor-pointer font-medium">${escapeHtml(file.path)} <span class="text-gray-500">(${escapeHtml(file.language)})</span></summary>
+                <div class="mt-2">${file.explanation || '<em>Code contains errors and was not explained</em>'}</div>
+            </details>
+        `).join('');
+    document.getElementById('explanationContent').innerHTML = `
+        <div class="fade-in">
+            ${summary.overview || ''}
+            ${sections}
+        </div>
+    `;
+    document.getElementById('processingTime').textContent = `${summary.processing_time}s`;
+    document.getElementById('languageDetected').textContent = Object.keys(summary.languages).join(', ');
+}
+
+function getLevelCacheKey(code, language) {
+    return `${language}\u0000${code}`;
+}
+
+function switchComplexityLevel() {
+    const complexity = document.getElementById('complexitySelect').value;
+    const key = getLevelCacheKey(editor.getValue(), document.getElementById('languageSelect').value);
+    
+    // Код или язык изменились — нужен новый запрос по кнопке «Explain Code»
+    if (levelCache.key !== key || !levelCache.explanations[complexity]) {
+        return;
+    }
+    
+    displayExplanation({
+        ...levelCache.data,
+        explanation: levelCache.explanations[complexity],
+        complexity_level: complexity,
+        processing_time: 0
+    });
+}
+
 function showLoadingState() {
     document.getElementById('loadingState').classList.remove('hidden');
     document.getElementById('explanationContent').classList.add('hidden');
@@ -462,6 +746,12 @@ function createHistoryCard(item) {
             ${stripHtml(item.explanation.substring(0, 300))}${item.explanation.length > 300 ? '...' : ''}
         </div>
         
+        ${(item.tags || []).length ? `<div class="flex flex-wrap gap-1 mb-4">${item.tags.map(tag => `
+            <button onclick="event.stopPropagation(); filterByTag('${escapeHtml(tag)}')"
+                    class="px-2 py-0.5 rounded-full text-xs ${tag === currentTag ? 'bg-indigo-600 text-white' : 'bg-indigo-100 text-indigo-700 hover:bg-indigo-200'}">
+                #${escapeHtml(tag)}
+            </button>`).join('')}</div>` : ''}
+        
         <div class="flex justify-between items-center text-sm text-gray-500">
             <span>${formatDate(item.created_at)}</span>
             <div class="space-x-2">
@@ -541,11 +831,18 @@ async function applyFilters() {
     if (complexity) currentFilters.complexity_level = complexity;
     if (favorite !== '') currentFilters.is_favorite = favorite;
     if (search) currentFilters.search_term = search;
+    if (currentTag) currentFilters.tag = currentTag;
     
     currentPage = 1;
     await loadHistory();
 }
 
+async function filterByTag(tag) {
+    // Повторный клик по выбранному тегу снимает фильтр
+    currentTag = currentTag === tag ? null : tag;
+    await applyFilters();
+}
+
 function clearFilters() {
     document.getElementById('languageFilter').value = '';
     document.getElementById('complexityFilter').value = '';
@@ -553,6 +850,7 @@ function clearFilters() {
     document.getElementById('searchInput').value = '';
     
     currentFilters = {};
+    currentTag = null;
     currentPage = 1;
     loadHistory();
 }
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 """
 Простой скрипт для запуска API Code Explainer
+
+    python run.py                 # разработка: один процесс с автоперезагрузкой
+    python run.py --prod          # продуктив: несколько воркеров по числу CPU
+    python run.py --prod --workers 4 --port 8080
 """
 
+import argparse
+import importlib.util
 import sys
 import os
 import subprocess
@@ -19,7 +25,80 @@ if sys.platform == 'win32':
         sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
         sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
+def default_workers() -> int:
+    """
+    Число воркеров: WEB_CONCURRENCY или число доступных процессу CPU
+    """
+    if os.getenv("WEB_CONCURRENCY"):
+        return int(os.environ["WEB_CONCURRENCY"])
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+def production_command(args) -> list:
+    """
+    Команда продуктивного запуска: gunicorn с воркерами uvicorn (плавный перезапуск по SIGHUP),
+    а где gunicorn недоступен (Windows) — uvicorn --workers.
+    uvloop и httptools используются, если установлены.
+    """
+    bind = f"{args.host}:{args.port}"
+    if sys.platform != "win32" and has_module("gunicorn"):
+        return [
+            sys.executable, '-m', 'gunicorn', 'backend.app:app',
+            '--worker-class', 'uvicorn.workers.UvicornWorker',
+            '--workers', str(args.workers),
+            '--bind', bind,
+            '--graceful-timeout', str(args.graceful_timeout),
+            '--timeout', '120',
+            '--keep-alive', '5',
+        ]
+    cmd = [
+        sys.executable, '-m', 'uvicorn', 'backend.app:app',
+        '--host', args.host, '--port', str(args.port),
+        '--workers', str(args.workers),
+        '--timeout-graceful-shutdown', str(args.graceful_timeout),
+    ]
+    if has_module("uvloop"):
+        cmd += ['--loop', 'uvloop']
+    if has_module("httptools"):
+        cmd += ['--http', 'httptools']
+    return cmd
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Запуск API Code Explainer")
+    parser.add_argument('--prod', action='store_true', default=os.getenv("RUN_MODE") == "production",
+                        help="продуктивный режим: несколько воркеров без автоперезагрузки (или RUN_MODE=production)")
+    parser.add_argument('--workers', type=int, default=default_workers(), help="число воркеров (по умолчанию: WEB_CONCURRENCY или число CPU)")
+    parser.add_argument('--host', default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument('--port', type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+                        help="сколько секунд ждать завершения запросов при остановке воркера")
+    return parser.parse_args()
+
+def run_production(args):
+    from backend.prestart import run_prestart
+
+    # Схема БД и режим WAL настраиваются один раз, до запуска воркеров
+    journal_mode = run_prestart()
+    print(f"Подготовка БД завершена (журнал SQLite: {journal_mode})")
+
+    cmd = production_command(args)
+    print(f"Команда запуска: {' '.join(cmd)}")
+    print(f"Воркеров: {args.workers}")
+    print("\n" + "=" * 50)
+    sys.stdout.flush()
+
+    if sys.platform == 'win32':
+        subprocess.run(cmd)
+    else:
+        # Заменяем процесс, чтобы сигналы оркестратора (SIGTERM, SIGHUP) доходили до сервера напрямую
+        os.execv(sys.executable, cmd)
+
 def main():
+    args = parse_args()
     print("Запуск API Code Explainer...")
     print("=" * 50)
     
@@ -32,13 +111,17 @@ def main():
         sys.path.insert(0, project_root)
     
     try:
+        if args.prod:
+            run_production(args)
+            return
+        
         # Запускаем из корня проекта, используя backend.app:app в качестве модуля приложения
-        cmd = [sys.executable, '-m', 'uvicorn', 'backend.app:app', '--reload', '--host', '0.0.0.0', '--port', '8000']
+        cmd = [sys.executable, '-m', 'uvicorn', 'backend.app:app', '--reload', '--host', args.host, '--port', str(args.port)]
         print(f"Команда запуска: {' '.join(cmd)}")
-        print("\nAPI будет доступно по адресу: http://localhost:8000")
-        print("Документация API: http://localhost:8000/docs")
-        print("Веб-интерфейс: http://localhost:8000/static/index.html")
-        print("Страница истории: http://localhost:8000/static/history.html")
+        print(f"\nAPI будет доступно по адресу: http://localhost:{args.port}")
+        print(f"Документация API: http://localhost:{args.port}/docs")
+        print(f"Веб-интерфейс: http://localhost:{args.port}/static/index.html")
+        print(f"Страница истории: http://localhost:{args.port}/static/history.html")
         print("\n" + "=" * 50)
         
         subprocess.run(cmd)
@@ -48,7 +131,7 @@ def main():
     except Exception as e:
         print(f"Ошибка при запуске приложения: {e}")
         print("\nУбедитесь, что установлены все зависимости:")
-        print("   pip install -r backend/requirements.txt")
+        print("   pip install -r requirements.txt")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file